@@ -0,0 +1,109 @@
+"""Benchmark of the lookups that check for a duplicate submission, and the
+lookup of a submission's guesses, as the number of submissions grows.
+
+With the models' indexes the latency stays flat. Run with `--no-indexes`
+to compare against the table scans of the old schema.
+
+Run from the top level musicrecs directory:
+    python -m benchmarks.submission_lookups --submissions 1000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+
+from musicrecs import db
+from musicrecs.database.models import Guess, Round, Submission
+from musicrecs.enums import MusicType, SnoozinRecType
+
+
+SUBMISSIONS_PER_ROUND = 10
+INSERT_CHUNK_SIZE = 50000
+LOOKUPS_PER_CHECKPOINT = 1000
+SPOTIFY_LINK = "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=1000000, help="number of submissions to grow to")
+    parser.add_argument("--checkpoints", type=int, default=4, help="number of sizes to measure at (powers of 10)")
+    parser.add_argument("--no-indexes", action="store_true", help="drop the indexes to compare with the old schema")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}")
+        db.metadata.create_all(engine)
+
+        if args.no_indexes:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(engine)
+
+        checkpoints = sorted(set(args.submissions // 10 ** i for i in range(args.checkpoints)))
+
+        print(f"{'submissions':>12} {'duplicate check (us)':>22} {'guesses (us)':>14}")
+        num_submissions = 0
+        for checkpoint in checkpoints:
+            _grow(engine, num_submissions, checkpoint)
+            num_submissions = checkpoint
+
+            duplicate_check, guesses = _time_lookups(engine, num_submissions)
+            print(f"{num_submissions:>12} {duplicate_check:>22.1f} {guesses:>14.1f}")
+
+        engine.dispose()
+
+
+def _grow(engine, start, stop):
+    """Add rounds with submissions (each with one guess) up to `stop` submissions"""
+    with engine.begin() as conn:
+        for chunk_start in range(start, stop, INSERT_CHUNK_SIZE):
+            chunk = range(chunk_start, min(chunk_start + INSERT_CHUNK_SIZE, stop))
+
+            conn.execute(Round.__table__.insert(), [
+                dict(id=i // SUBMISSIONS_PER_ROUND + 1, long_id=f"round{i}", description="benchmark",
+                     music_type=MusicType.album, snoozin_rec_type=SnoozinRecType.random)
+                for i in chunk if i % SUBMISSIONS_PER_ROUND == 0
+            ])
+            conn.execute(Submission.__table__.insert(), [
+                dict(id=i + 1, spotify_link=SPOTIFY_LINK, user_name=f"user{i % SUBMISSIONS_PER_ROUND}",
+                     user_id=i + 1, round_id=i // SUBMISSIONS_PER_ROUND + 1)
+                for i in chunk
+            ])
+            conn.execute(Guess.__table__.insert(), [
+                dict(user_name="user0", music_num=0, correct=False, submission_id=i + 1, user_id=i + 1)
+                for i in chunk
+            ])
+
+
+def _time_lookups(engine, num_submissions):
+    """Get the mean latency (in microseconds) of the duplicate submission
+    checks and of getting a submission's guesses
+    """
+    submission = Submission.__table__
+    guess = Guess.__table__
+    num_rounds = num_submissions // SUBMISSIONS_PER_ROUND
+
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        for _ in range(LOOKUPS_PER_CHECKPOINT):
+            round_id = random.randint(1, num_rounds)
+            conn.execute(select(submission.c.id).where(
+                submission.c.round_id == round_id, submission.c.user_name == "someone new")).first()
+            conn.execute(select(submission.c.id).where(
+                submission.c.round_id == round_id, submission.c.user_id == 0)).first()
+        duplicate_check = (time.perf_counter() - start) / LOOKUPS_PER_CHECKPOINT * 1e6
+
+        start = time.perf_counter()
+        for _ in range(LOOKUPS_PER_CHECKPOINT):
+            conn.execute(select(guess).where(guess.c.submission_id == random.randint(1, num_submissions))).all()
+        guesses = (time.perf_counter() - start) / LOOKUPS_PER_CHECKPOINT * 1e6
+
+    return duplicate_check, guesses
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,21 @@ import random
 import time
 
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_bootstrap import Bootstrap
 from flask_session import Session
 from flask_caching import Cache
 from flask_apscheduler import APScheduler
 
 from musicrecs.spotify.spotify import Spotify
+from musicrecs.spotify.async_spotify import AsyncSpotify
+from musicrecs.spotify.spotify_requests import spotify_requests
 from musicrecs.config import Config
+from musicrecs.file_storage import ShardedFileSystemCache, ShardedFileSystemSessionInterface
+from musicrecs.database.replica import RoutingSQLAlchemy, REPLICA_BIND
 
 
-# Create sqlalchemy database
-db = SQLAlchemy()
+# Create sqlalchemy database (whose reads can be routed to a replica)
+db = RoutingSQLAlchemy()
 
 # Create cache
 cache = Cache()
@@ -24,6 +27,9 @@ scheduler = APScheduler()
 # Create 'client credentials' spotify interface
 spotify_iface = Spotify()
 
+# Create asyncio interface on top of it, for making many spotify calls at once
+async_spotify_iface = AsyncSpotify(spotify_iface)
+
 # Seed random
 random.seed(time.time())
 
@@ -33,22 +39,61 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # Initialize the request layer shared by every spotify instance
+    spotify_requests.init_app(app)
+
     # Initialize spotify as long as we're not testing
     if not app.config["TESTING"]:
         spotify_iface.init_sp()
 
-    # Initialize database
+    # Initialize database, with the replica as a bind if there is one
+    if app.config["SQLALCHEMY_REPLICA_URI"]:
+        app.config["SQLALCHEMY_BINDS"] = dict(app.config.get("SQLALCHEMY_BINDS") or {},
+                                              **{REPLICA_BIND: app.config["SQLALCHEMY_REPLICA_URI"]})
     db.init_app(app)
 
+    # Keep spotify user tokens in the database, behind an in-process cache
+    from musicrecs.spotify.token_store import token_store
+    from musicrecs.database.spotify_tokens import SpotifyTokenTable
+    token_store.init_app(app, SpotifyTokenTable())
+
+    # Initialize the pool of logged in users' spotipy instances
+    from musicrecs.spotify.user_client_pool import user_client_pool
+    user_client_pool.init_app(app)
+
     # Initialize cache
     cache.init_app(app)
 
+    # Put a shared cache behind spotify's resolved music. Music is kept
+    # apart from the app's cache on the file system, so that the many
+    # music files don't slow down (or crowd out) the app's cache.
+    if app.config["CACHE_TYPE"] == "FileSystemCache":
+        shared_music_cache = ShardedFileSystemCache(app.config["SPOTIFY_MUSIC_CACHE_DIR"],
+                                                    default_timeout=app.config["SPOTIFY_MUSIC_CACHE_SHARED_TIMEOUT"])
+    else:
+        shared_music_cache = cache
+    spotify_iface.init_music_cache(
+        shared_cache=shared_music_cache,
+        size=app.config["SPOTIFY_MUSIC_CACHE_SIZE"],
+        local_timeout=app.config["SPOTIFY_MUSIC_CACHE_LOCAL_TIMEOUT"],
+        shared_timeout=app.config["SPOTIFY_MUSIC_CACHE_SHARED_TIMEOUT"]
+    )
+    spotify_iface.init_popularity_cache(
+        size=app.config["SPOTIFY_POPULARITY_CACHE_SIZE"],
+        timeout=app.config["SPOTIFY_POPULARITY_CACHE_TIMEOUT"]
+    )
+    async_spotify_iface.init_app(app)
+
     # Initialize scheduler and start background tasks
     scheduler.init_app(app)
 
     from musicrecs.main import background_tasks
     scheduler.start()
 
+    # Initialize the pool of snoozin recs that the background tasks fill
+    from musicrecs.round.snoozin_rec_pool import snoozin_rec_pool
+    snoozin_rec_pool.init_app(app)
+
     # Register blueprints
     from musicrecs.main import bp as main_bp
     app.register_blueprint(main_bp)
@@ -66,14 +111,24 @@ def create_app(config_class=Config):
         from musicrecs.test import bp as test_bp
         app.register_blueprint(test_bp)
 
+    # Register commands
+    from musicrecs.database.stats import backfill_player_stats_command
+    app.cli.add_command(backfill_player_stats_command)
+
     # Create bootstrap flask app
     Bootstrap(app)
 
-    # Create flask session
-    Session(app)
+    # Create flask session (with session files kept in subdirectories)
+    if app.config["SESSION_TYPE"] == "filesystem":
+        app.session_interface = ShardedFileSystemSessionInterface.from_app(app)
+    else:
+        Session(app)
 
-    # Create all tables in the database
+    # Create all tables in the database, and upgrade the existing ones
     with app.app_context():
         db.create_all()
 
+    from musicrecs.database.upgrade import upgrade_db
+    upgrade_db(app)
+
     return app
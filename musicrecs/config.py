@@ -8,12 +8,94 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Optional read-only replica of the database, that GET pages and
+    # background jobs read from
+    SQLALCHEMY_REPLICA_URI = os.environ.get('SQLALCHEMY_REPLICA_URI')
+
+    # Options of the database engines' connection pools. The pool size and
+    # overflow are only used if they're set, because some pools (like
+    # sqlite's) don't take them.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': os.environ.get('SQLALCHEMY_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', 60 * 60)),
+        **{
+            option: int(os.environ[env_var])
+            for option, env_var in [('pool_size', 'SQLALCHEMY_POOL_SIZE'),
+                                    ('max_overflow', 'SQLALCHEMY_MAX_OVERFLOW'),
+                                    ('pool_timeout', 'SQLALCHEMY_POOL_TIMEOUT')]
+            if env_var in os.environ
+        }
+    }
+
     CACHE_TYPE = 'FileSystemCache'
     CACHE_DIR = './.flask_caching/'
     CACHE_DEFAULT_TIMEOUT = 300
 
+    # The cache holds keys that never expire, which pruning the cache once it
+    # has too many files would throw away first, so it's never pruned
+    # (expired files are swept instead)
+    CACHE_THRESHOLD = 0
+
+    # Cache of music resolved from spotify links (timeouts in seconds). With
+    # a file system cache, the shared tier is kept in its own folder.
+    SPOTIFY_MUSIC_CACHE_DIR = './.spotify_music_cache/'
+    SPOTIFY_MUSIC_CACHE_SIZE = int(os.environ.get('SPOTIFY_MUSIC_CACHE_SIZE', 1024))
+    SPOTIFY_MUSIC_CACHE_LOCAL_TIMEOUT = int(os.environ.get('SPOTIFY_MUSIC_CACHE_LOCAL_TIMEOUT', 60 * 60))
+    SPOTIFY_MUSIC_CACHE_SHARED_TIMEOUT = int(os.environ.get('SPOTIFY_MUSIC_CACHE_SHARED_TIMEOUT', 60 * 60 * 24))
+
+    # Keep-alive connections kept open to spotify, and the most spotify
+    # calls that the async interface makes at once
+    SPOTIFY_HTTP_POOL_SIZE = int(os.environ.get('SPOTIFY_HTTP_POOL_SIZE', 10))
+    SPOTIFY_ASYNC_MAX_CONCURRENCY = int(os.environ.get('SPOTIFY_ASYNC_MAX_CONCURRENCY', 8))
+
+    # Rate limit of requests to spotify: requests per second, the burst
+    # allowed above that, and the longest a request waits (in seconds)
+    SPOTIFY_RATE_LIMIT = float(os.environ.get('SPOTIFY_RATE_LIMIT', 10))
+    SPOTIFY_RATE_LIMIT_BURST = int(os.environ.get('SPOTIFY_RATE_LIMIT_BURST', 20))
+    SPOTIFY_RATE_LIMIT_MAX_WAIT = float(os.environ.get('SPOTIFY_RATE_LIMIT_MAX_WAIT', 30))
+
+    # Cache of spotify artist popularity (timeout in seconds)
+    SPOTIFY_POPULARITY_CACHE_SIZE = int(os.environ.get('SPOTIFY_POPULARITY_CACHE_SIZE', 4096))
+    SPOTIFY_POPULARITY_CACHE_TIMEOUT = int(os.environ.get('SPOTIFY_POPULARITY_CACHE_TIMEOUT', 60 * 60 * 24))
+
+    # Snoozin's random rec searches: how many run at once, and how
+    # long to keep trying before giving up (in seconds)
+    SNOOZIN_REC_SEARCH_WORKERS = int(os.environ.get('SNOOZIN_REC_SEARCH_WORKERS', 4))
+    SNOOZIN_REC_SEARCH_TIMEOUT = float(os.environ.get('SNOOZIN_REC_SEARCH_TIMEOUT', 20))
+
+    # Pool of snoozin random recs found ahead of time: the number to fill each
+    # pool up to, the number to refill below, and how long they last (in seconds)
+    SNOOZIN_REC_POOL_SIZE = int(os.environ.get('SNOOZIN_REC_POOL_SIZE', 10))
+    SNOOZIN_REC_POOL_LOW_WATERMARK = int(os.environ.get('SNOOZIN_REC_POOL_LOW_WATERMARK', 5))
+    SNOOZIN_REC_POOL_TIMEOUT = int(os.environ.get('SNOOZIN_REC_POOL_TIMEOUT', 60 * 60 * 6))
+
+    # Revealed rounds older than this (in days) are moved to the archive
+    ROUND_ARCHIVE_AGE_DAYS = int(os.environ.get('ROUND_ARCHIVE_AGE_DAYS', 180))
+
     SCHEDULER_API_ENABLED = True
 
     SESSION_TYPE = 'filesystem'
     SESSION_FILE_DIR = './.flask_session/'
+
+    # How long the logged in user's identity is cached in their session
+    # before spotify is asked who they are again (in seconds)
+    USER_IDENTITY_TTL = int(os.environ.get('USER_IDENTITY_TTL', 60 * 60))
+
+    # Spotify user tokens (and old token files) that haven't been used for
+    # this long (in seconds) belong to abandoned sessions, and are removed
+    SPOTIFY_USER_CACHE_TTL = int(os.environ.get('SPOTIFY_USER_CACHE_TTL', 60 * 60 * 24 * 31))
+
+    # Number of spotify user tokens kept in memory in front of the database,
+    # and how long (in seconds) they're kept for
+    SPOTIFY_TOKEN_CACHE_SIZE = int(os.environ.get('SPOTIFY_TOKEN_CACHE_SIZE', 1024))
+    SPOTIFY_TOKEN_CACHE_TIMEOUT = int(os.environ.get('SPOTIFY_TOKEN_CACHE_TIMEOUT', 60 * 5))
+
+    # Number of logged in users' spotipy instances kept for reuse, and how
+    # long (in seconds) they're kept for
+    SPOTIFY_USER_CLIENT_POOL_SIZE = int(os.environ.get('SPOTIFY_USER_CLIENT_POOL_SIZE', 1024))
+    SPOTIFY_USER_CLIENT_POOL_TIMEOUT = int(os.environ.get('SPOTIFY_USER_CLIENT_POOL_TIMEOUT', 60 * 60))
+
+    # Tokens of pooled users that expire within this long (in seconds) are
+    # refreshed in the background
+    SPOTIFY_TOKEN_REFRESH_MARGIN = int(os.environ.get('SPOTIFY_TOKEN_REFRESH_MARGIN', 60 * 5))
     SECRET_KEY = os.environ.get('FLASK_SECRET_KEY') or 'you-will-never-guess'
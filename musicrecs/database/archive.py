@@ -0,0 +1,248 @@
+"""Archive of old revealed rounds.
+
+Revealed rounds never change, so once they're old they're moved out of the
+round, submission, guess and music snapshot tables (keeping those tables and
+their indexes small) into `ArchivedRound`: one row per round, holding the
+round and everything in it as compressed json.
+
+Archived rounds are read back as `Round` objects (with their submissions,
+guesses and music snapshots) that aren't in the session, so pages show them
+just like the rounds that are still in the round tables. They're read-only:
+changes made to them aren't saved.
+"""
+
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Tuple, Union
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.orm import selectinload
+
+from musicrecs.database.models import ArchivedRound, ArchivedRoundUser, Guess, MusicSnapshot, Round, Submission
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+
+from musicrecs import db
+
+
+"""CONSTANTS"""
+
+
+# Version of the format of the archived data, for reading data archived
+# in an older format if the format ever changes
+ARCHIVE_FORMAT_VERSION = 1
+
+
+"""PUBLIC FUNCTIONS"""
+
+
+def archive_rounds(created_before: datetime, batch_size: int, max_rounds: int = None) -> int:
+    """Archive the revealed rounds that were created before `created_before`,
+    `batch_size` rounds per transaction, up to `max_rounds` of them.
+
+    Return the number of rounds that were archived
+    """
+    num_archived = 0
+    while max_rounds is None or num_archived < max_rounds:
+        limit = batch_size if max_rounds is None else min(batch_size, max_rounds - num_archived)
+        num_in_batch = _archive_batch(created_before, limit)
+        num_archived += num_in_batch
+        if num_in_batch < limit:
+            break
+
+    return num_archived
+
+
+def get_archived_round(long_id) -> Union[Round, None]:
+    """Get the archived round with the given long id"""
+    archived_round = ArchivedRound.query.filter_by(long_id=long_id).first()
+    if archived_round is None:
+        return None
+
+    return _unpack_round(archived_round.data)
+
+
+def get_archived_user_rounds(user_id,
+                             music_type: MusicType,
+                             page_size: int,
+                             before: Tuple[datetime, int] = None) -> List[Tuple[Round, Submission]]:
+    """Get a page of the archived rounds of the music type that the user has
+    submitted to, the same as `musicrecs.database.helpers.get_user_rounds`
+    does for the rounds that aren't archived.
+    """
+    query = db.session.query(ArchivedRound.data).join(
+        ArchivedRoundUser, ArchivedRoundUser.archived_round_id == ArchivedRound.id
+    ).filter(
+        ArchivedRoundUser.user_id == user_id,
+        ArchivedRoundUser.music_type == music_type
+    )
+
+    if before is not None:
+        before_created, before_id = before
+        query = query.filter(or_(
+            ArchivedRoundUser.created < before_created,
+            and_(ArchivedRoundUser.created == before_created, ArchivedRoundUser.archived_round_id < before_id)
+        ))
+
+    round_subs = []
+    for data, in query.order_by(ArchivedRoundUser.created.desc(), ArchivedRoundUser.archived_round_id.desc()).limit(
+            page_size):
+        round = _unpack_round(data)
+        round_subs.append((round, next(sub for sub in round.submissions if sub.user_id == user_id)))
+
+    return round_subs
+
+
+def iter_archived_rounds(batch_size: int) -> Iterator[Round]:
+    """Iterate over every archived round, fetching `batch_size` at a time.
+    Close the iterator if stopping early, to release the database cursor.
+    """
+    result = db.session.execute(
+        select(ArchivedRound.data).order_by(ArchivedRound.id).execution_options(yield_per=batch_size)
+    )
+
+    try:
+        for data in result.scalars():
+            yield _unpack_round(data)
+    finally:
+        result.close()
+
+
+"""PRIVATE FUNCTIONS"""
+
+
+def _archive_batch(created_before: datetime, limit: int) -> int:
+    """Archive up to `limit` rounds in one transaction.
+
+    The newest round is never archived, even if it is old enough, so that
+    sqlite (which can reuse the id of the newest row once it's deleted)
+    never gives a new round the id of an archived one.
+    """
+    newest_round_id = db.session.query(func.max(Round.id)).scalar()
+
+    rounds = Round.query.filter(
+        Round.status == RoundStatus.revealed,
+        Round.created < created_before,
+        Round.id != newest_round_id
+    ).order_by(Round.created, Round.id).options(
+        selectinload(Round.submissions).options(
+            selectinload(Submission.guesses),
+            selectinload(Submission.music_snapshot),
+        )
+    ).limit(limit).all()
+    if not rounds:
+        return 0
+
+    for round in rounds:
+        db.session.add(ArchivedRound(
+            id=round.id,
+            long_id=round.long_id,
+            music_type=round.music_type,
+            created=round.created,
+            data=_pack_round(round),
+            users=[
+                ArchivedRoundUser(user_id=user_id, music_type=round.music_type, created=round.created)
+                for user_id in set(sub.user_id for sub in round.submissions if sub.user_id is not None)
+            ]
+        ))
+
+    # Delete the rounds from the round tables (and from the session), in the
+    # same transaction
+    round_ids = [round.id for round in rounds]
+    submission_ids = select(Submission.id).where(Submission.round_id.in_(round_ids)).scalar_subquery()
+    for statement in [
+        delete(Guess).where(Guess.submission_id.in_(submission_ids)),
+        delete(MusicSnapshot).where(MusicSnapshot.submission_id.in_(submission_ids)),
+        delete(Submission).where(Submission.round_id.in_(round_ids)),
+        delete(Round).where(Round.id.in_(round_ids)),
+    ]:
+        db.session.execute(statement.execution_options(synchronize_session="fetch"))
+
+    db.session.commit()
+
+    return len(rounds)
+
+
+def _pack_round(round: Round) -> bytes:
+    return zlib.compress(json.dumps({
+        "version": ARCHIVE_FORMAT_VERSION,
+        "round": {
+            "id": round.id,
+            "long_id": round.long_id,
+            "description": round.description,
+            "music_type": round.music_type.name,
+            "status": round.status.name,
+            "snoozin_rec_type": round.snoozin_rec_type.name,
+            "snoozin_rec_search_term": round.snoozin_rec_search_term,
+            "playlist_link": round.playlist_link,
+            "created": round.created.isoformat(),
+        },
+        "submissions": [
+            {
+                "id": submission.id,
+                "spotify_link": submission.spotify_link,
+                "user_name": submission.user_name,
+                "shuffled_pos": submission.shuffled_pos,
+                "user_id": submission.user_id,
+                "guesses": [
+                    {
+                        "id": guess.id,
+                        "user_name": guess.user_name,
+                        "music_num": guess.music_num,
+                        "correct": guess.correct,
+                        "user_id": guess.user_id,
+                    }
+                    for guess in submission.guesses
+                ],
+                "music_snapshot": {
+                    "id": submission.music_snapshot.id,
+                    "music_type": submission.music_snapshot.music_type.name,
+                    "spotify_data": submission.music_snapshot.spotify_data,
+                    "updated": submission.music_snapshot.updated.isoformat(),
+                } if submission.music_snapshot is not None and not submission.music_snapshot.unavailable else None,
+            }
+            for submission in round.submissions
+        ],
+    }, separators=(",", ":")).encode(), level=9)
+
+
+def _unpack_round(data: bytes) -> Round:
+    """Make the round (with its submissions, guesses and music snapshots)
+    out of archived data. None of them are added to the session.
+    """
+    archive = json.loads(zlib.decompress(data))
+
+    round_data = archive["round"]
+    round = Round(
+        id=round_data["id"],
+        long_id=round_data["long_id"],
+        description=round_data["description"],
+        music_type=MusicType[round_data["music_type"]],
+        status=RoundStatus[round_data["status"]],
+        snoozin_rec_type=SnoozinRecType[round_data["snoozin_rec_type"]],
+        snoozin_rec_search_term=round_data["snoozin_rec_search_term"],
+        playlist_link=round_data["playlist_link"],
+        created=datetime.fromisoformat(round_data["created"]),
+    )
+
+    for submission_data in archive["submissions"]:
+        snapshot_data = submission_data["music_snapshot"]
+        round.submissions.append(Submission(
+            id=submission_data["id"],
+            spotify_link=submission_data["spotify_link"],
+            user_name=submission_data["user_name"],
+            shuffled_pos=submission_data["shuffled_pos"],
+            user_id=submission_data["user_id"],
+            round_id=round.id,
+            guesses=[Guess(submission_id=submission_data["id"], **guess_data)
+                     for guess_data in submission_data["guesses"]],
+            music_snapshot=MusicSnapshot(
+                id=snapshot_data["id"],
+                music_type=MusicType[snapshot_data["music_type"]],
+                spotify_data=snapshot_data["spotify_data"],
+                updated=datetime.fromisoformat(snapshot_data["updated"]),
+                submission_id=submission_data["id"],
+            ) if snapshot_data is not None else None,
+        ))
+
+    return round
@@ -1,12 +1,34 @@
 import secrets
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple, Union
 
+from flask import g
 from flask.helpers import url_for
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 
-from musicrecs.database.models import Guess, Round, Submission, User
-from musicrecs.enums import RoundStatus
+from musicrecs.database.archive import get_archived_round, get_archived_user_rounds
+from musicrecs.database.models import Guess, MusicSnapshot, Round, Submission, User
+from musicrecs.database.stats import record_guesses, record_round_revealed
+from musicrecs.enums import MusicType, RoundStatus
 from musicrecs.errors.exceptions import MusicrecsAlert
+from musicrecs.spotify.item.spotify_music import SpotifyMusic
 
 from musicrecs import db
+from musicrecs import spotify_iface
+from musicrecs import cache
+
+
+"""CONSTANTS"""
+
+
+# A round transition that was claimed this long ago is assumed to have
+# been abandoned (by a request that died), and can be claimed again
+ROUND_TRANSITION_TIMEOUT = timedelta(minutes=1)
+
+
+"""PUBLIC FUNCTIONS"""
 
 
 def add_round_to_db(description, music_type, snoozin_rec_type, status=RoundStatus.submit):
@@ -28,16 +50,94 @@ def add_round_to_db(description, music_type, snoozin_rec_type, status=RoundStatu
     return round
 
 
-def add_submission_to_db(round_id, user_id, user_name, spotify_link):
-    """Add a submission to the database with the given properties
+def get_round(long_id) -> Union[Round, None]:
+    """Get the round with the given long id, along with everything that is
+    shown about it (its submissions, and their guesses, users and music
+    snapshots). Each of those is loaded with one query for the whole round,
+    rather than one query per submission.
+
+    Rounds that have been archived are read from the archive.
+    """
+    round = Round.query.filter_by(long_id=long_id).options(
+        selectinload(Round.submissions).options(
+            selectinload(Submission.guesses),
+            selectinload(Submission.music_snapshot),
+            joinedload(Submission.user),
+        )
+    ).first()
+    if round is None:
+        round = get_archived_round(long_id)
+
+    return round
+
+
+def get_user_rounds(user_id,
+                    music_type: MusicType,
+                    page_size: int,
+                    before: Tuple[datetime, int] = None) -> List[Tuple[Round, Submission]]:
+    """Get a page of the rounds of the music type that the user has submitted
+    to, newest first, paired with the user's submission to each round.
+
+    Pages are found by keyset: pass the (created, id) of the last round of a
+    page as `before` to get the next page. The rounds' submissions (and the
+    user's music snapshots) are loaded along with them.
+
+    The user's archived rounds are paged through along with the rest.
+    """
+    query = db.session.query(Round, Submission).join(Submission, Submission.round_id == Round.id).filter(
+        Submission.user_id == user_id,
+        Round.music_type == music_type
+    )
+
+    if before is not None:
+        before_created, before_id = before
+        query = query.filter(or_(
+            Round.created < before_created,
+            and_(Round.created == before_created, Round.id < before_id)
+        ))
+
+    round_subs = query.options(
+        selectinload(Round.submissions),
+        selectinload(Submission.music_snapshot)
+    ).order_by(Round.created.desc(), Round.id.desc()).limit(page_size).all()
+
+    # Merge in the page of archived rounds, and keep the newest of both
+    round_subs.extend(get_archived_user_rounds(user_id, music_type, page_size, before=before))
+    round_subs.sort(key=lambda round_sub: (round_sub[0].created, round_sub[0].id), reverse=True)
+
+    return round_subs[:page_size]
+
+
+def iter_rounds_newest_first(status: RoundStatus, batch_size: int) -> Iterator[Round]:
+    """Iterate over the rounds with the status, newest first.
+
+    Rounds are streamed from the database in batches of `batch_size` (with
+    each batch's submissions and music snapshots loaded together), so only
+    the rounds that are iterated over are fetched. Close the iterator if
+    stopping early, to release the database cursor.
+    """
+    result = db.session.execute(
+        select(Round).filter_by(status=status).order_by(Round.created.desc(), Round.id.desc()).options(
+            selectinload(Round.submissions).selectinload(Submission.music_snapshot)
+        ).execution_options(yield_per=batch_size)
+    )
+
+    try:
+        yield from result.scalars()
+    finally:
+        result.close()
+
+
+def add_submission_to_db(round_id, user_id, user_name, spotify_link, music: SpotifyMusic = None):
+    """Add a submission to the database with the given properties. If the
+    `music` at the spotify link is given, a snapshot of it is saved along
+    with the submission.
 
     Return the newly added submission object
     """
-    if Submission.query.filter_by(user_name=user_name, round_id=round_id).first() or \
-            (user_id is not None and Submission.query.filter_by(user_id=user_id, round_id=round_id).first()):
-        round = Round.query.filter_by(id=round_id).first()
-        raise MusicrecsAlert("You've already submitted!",
-                             redirect_location=url_for(f'round.{round.status.name}', long_id=round.long_id))
+    if Submission.query.filter_by(round_id=round_id, user_name=user_name).first() or \
+            (user_id is not None and Submission.query.filter_by(round_id=round_id, user_id=user_id).first()):
+        _raise_already_submitted(round_id)
 
     submission = Submission(
         spotify_link=spotify_link,
@@ -45,12 +145,74 @@ def add_submission_to_db(round_id, user_id, user_name, spotify_link):
         user_name=user_name,
         round_id=round_id,
     )
+    if music is not None:
+        submission.music_snapshot = MusicSnapshot(music=music)
     db.session.add(submission)
-    db.session.commit()
+
+    # The round's unique indexes catch a submission made at the
+    # same time as this one
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        _raise_already_submitted(round_id)
+
+    bump_round_version(round_id)
 
     return submission
 
 
+def update_music_snapshots(submissions: List[Submission], musics: List[SpotifyMusic]):
+    """Save snapshots of the music for each of the submissions, replacing
+    any snapshots they already have
+    """
+    for submission, music in zip(submissions, musics):
+        if submission.music_snapshot is None:
+            submission.music_snapshot = MusicSnapshot(music=music)
+        else:
+            submission.music_snapshot.music = music
+    db.session.commit()
+
+    for round_id in set(submission.round_id for submission in submissions):
+        bump_round_version(round_id)
+
+
+def mark_music_unavailable(music_type: MusicType, submissions: List[Submission]):
+    """Record that the music of the submissions couldn't be found in
+    spotify, so that they aren't looked for again until their snapshots
+    are stale. Submissions that already have a snapshot keep its music.
+    """
+    for submission in submissions:
+        if submission.music_snapshot is None:
+            submission.music_snapshot = MusicSnapshot(music_type=music_type, spotify_data="null", unavailable=True)
+        else:
+            submission.music_snapshot.updated = datetime.utcnow()
+    db.session.commit()
+
+
+def get_submissions_music(music_type: MusicType, submissions: List[Submission]) -> List[Union[SpotifyMusic, None]]:
+    """Get the music of each of the submissions, in the same order.
+
+    Music comes from the submission's music snapshot, so only submissions
+    that don't have one yet are looked up in spotify. Music that couldn't
+    be found is None.
+    """
+    musics = [
+        submission.music_snapshot.music if submission.music_snapshot is not None else None
+        for submission in submissions
+    ]
+
+    # Look up the music of submissions without snapshots all at once
+    missing_positions = [pos for pos, music in enumerate(musics) if music is None]
+    if missing_positions:
+        missing_musics = spotify_iface.get_musics_from_links(
+            music_type, [submissions[pos].spotify_link for pos in missing_positions])
+        for pos, music in zip(missing_positions, missing_musics):
+            musics[pos] = music
+
+    return musics
+
+
 def add_guess_to_db(submission_id, user_name, music_num, correct):
     """Add the guess to the database"""
     guess = Guess(
@@ -60,11 +222,52 @@ def add_guess_to_db(submission_id, user_name, music_num, correct):
         correct=correct
     )
     db.session.add(guess)
+    record_guesses(Submission.query.filter_by(id=submission_id).first(), {user_name: correct})
     db.session.commit()
 
+    bump_round_version(guess.submission.round_id)
+
     return guess
 
 
+def add_guesses_to_db(submission_id, guesses: Dict[str, Tuple[int, bool]]) -> int:
+    """Add all of a guesser's guesses to the database at once. `guesses`
+    maps each guessed user name to the music number that was guessed
+    and whether it was correct.
+
+    Guesses that were already added (by a double submitted form) are
+    skipped, so this can be called more than once with the same guesses.
+    The players' stats are updated in the same transaction.
+
+    Return the number of guesses that were added
+    """
+    # Skip the users that have already been guessed
+    guessed = set(user_name for user_name, in db.session.query(Guess.user_name).filter_by(submission_id=submission_id))
+    rows = [
+        dict(submission_id=submission_id, user_name=user_name, music_num=music_num, correct=correct)
+        for user_name, (music_num, correct) in guesses.items()
+        if user_name not in guessed
+    ]
+    if not rows:
+        return 0
+
+    # Insert all of the guesses in one statement and transaction. If the
+    # same guesses were added at the same time, the unique index stops
+    # them being added twice (and their stats being counted twice).
+    submission = Submission.query.filter_by(id=submission_id).first()
+    try:
+        db.session.execute(Guess.__table__.insert(), rows)
+        record_guesses(submission, {row["user_name"]: row["correct"] for row in rows})
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return 0
+
+    bump_round_version(submission.round_id)
+
+    return len(rows)
+
+
 def add_user_to_db(spotify_user_id, display_name):
     user = User(
         spotify_user_id=spotify_user_id,
@@ -80,8 +283,105 @@ def lookup_user_in_db(spotify_user_id) -> User:
     return User.query.filter_by(spotify_user_id=spotify_user_id).first()
 
 
+def claim_round_transition(round_id, from_status: RoundStatus) -> bool:
+    """Claim the transition of the round out of `from_status`, so that only
+    one request does the work of the transition. This is a conditional
+    update, so when requests race, exactly one of them wins.
+
+    Return whether the claim was won. The winner must either call
+    `transition_round` or `release_round_transition`.
+    """
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(Round).where(
+            Round.id == round_id,
+            Round.status == from_status,
+            or_(Round.transition_started.is_(None), Round.transition_started < now - ROUND_TRANSITION_TIMEOUT)
+        ).values(transition_started=now).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return result.rowcount == 1
+
+
+def release_round_transition(round_id):
+    """Give up a claimed transition, so that it can be tried again"""
+    db.session.rollback()
+    db.session.execute(
+        update(Round).where(Round.id == round_id).values(transition_started=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def transition_round(round_id, from_status: RoundStatus, to_status: RoundStatus) -> bool:
+    """Change the round's status from `from_status` to `to_status`, along
+    with anything else added to the session, as long as the round is still
+    in `from_status` (conditional update). The transition's claim is
+    released, and a round that is revealed is added to the players' stats.
+
+    Return whether the round's status was changed.
+    """
+    result = db.session.execute(
+        update(Round).where(Round.id == round_id, Round.status == from_status)
+        .values(status=to_status, transition_started=None).execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return False
+
+    if to_status == RoundStatus.revealed:
+        record_round_revealed(round_id)
+
+    db.session.commit()
+    bump_round_version(round_id)
+
+    return True
+
+
+def get_round_version(round_id) -> str:
+    """Get the version of the round's submissions and guesses, to be used in
+    the keys of anything cached about them. The version changes every time
+    `bump_round_version` is called.
+    """
+    versions = g.setdefault("round_versions", {})
+    if round_id not in versions:
+        version = cache.get(_round_version_key(round_id))
+        if version is None:
+            version = _new_round_version(round_id)
+        versions[round_id] = version
+
+    return versions[round_id]
+
+
+def bump_round_version(round_id):
+    """Give the round a new version, which invalidates everything that
+    was cached about it
+    """
+    g.setdefault("round_versions", {})[round_id] = _new_round_version(round_id)
+
+
 """PRIVATE FUNCTIONS"""
 
 
+def _raise_already_submitted(round_id):
+    round = Round.query.filter_by(id=round_id).first()
+    raise MusicrecsAlert("You've already submitted!",
+                         redirect_location=url_for(f'round.{round.status.name}', long_id=round.long_id))
+
+
 def _create_round_long_id():
     return secrets.token_urlsafe(16)
+
+
+def _round_version_key(round_id):
+    return f"round_version/{round_id}"
+
+
+def _new_round_version(round_id):
+    """Versions are random rather than counted, so that a version evicted
+    from the cache can never come back and match stale cached data
+    """
+    version = secrets.token_hex(8)
+    cache.set(_round_version_key(round_id), version, timeout=0)
+    return version
@@ -1,9 +1,13 @@
+import json
 from datetime import datetime
+from typing import Union
+
 from sqlalchemy.orm import validates
 
 from musicrecs import db
 from musicrecs.enums import MusicType, SnoozinRecType, RoundStatus
 from musicrecs.errors.exceptions import MusicrecsError
+from musicrecs.spotify.item.spotify_music import SpotifyAlbum, SpotifyMusic, SpotifyTrack
 
 
 '''Storage Constants'''
@@ -12,6 +16,7 @@ MAX_SPOTIFY_LINK_LENGTH = 100
 MAX_SPOTIFY_USER_ID_LENGTH = 50
 MAX_NAME_LENGTH = 50
 MAX_LONG_ID_LENGTH = 50
+MAX_SESSION_ID_LENGTH = 64
 
 
 '''SQL Classes'''
@@ -30,15 +35,24 @@ class User(db.Model):
 
 
 class Submission(db.Model):
+    # A user (by name, and by account if they're logged in) can
+    # only submit once per round
+    __table_args__ = (
+        db.Index('ix_submission_round_id_user_name', 'round_id', 'user_name', unique=True),
+        db.Index('ix_submission_round_id_user_id', 'round_id', 'user_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     spotify_link = db.Column(db.String(MAX_SPOTIFY_LINK_LENGTH), nullable=False)
     user_name = db.Column(db.String(MAX_NAME_LENGTH))
     shuffled_pos = db.Column(db.Integer)
 
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     round_id = db.Column(db.Integer, db.ForeignKey('round.id'), nullable=False)
 
     guesses = db.relationship('Guess', backref=db.backref('submission', lazy=True))
+    music_snapshot = db.relationship('MusicSnapshot', uselist=False, cascade="all, delete-orphan",
+                                     backref=db.backref('submission', lazy=True))
 
     @validates('spotify_link')
     def validate_spotify_link(self, key, spotify_link):
@@ -57,13 +71,18 @@ class Submission(db.Model):
 
 
 class Guess(db.Model):
+    # A guesser (by their submission) only guesses each user once
+    __table_args__ = (
+        db.Index('ix_guess_submission_id_user_name', 'submission_id', 'user_name', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_name = db.Column(db.String(MAX_NAME_LENGTH), nullable=False)
     music_num = db.Column(db.Integer, nullable=False)
     correct = db.Column(db.Boolean, nullable=False)
 
     submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
 
     @validates('user_name')
     def validate_user_name(self, key, user_name):
@@ -75,6 +94,79 @@ class Guess(db.Model):
         return '<Guess %r>' % self.id
 
 
+class MusicSnapshot(db.Model):
+    """Spotify information about a submission's music, saved when the
+    submission is made so that rounds can be shown without asking spotify.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    music_type = db.Column(db.Enum(MusicType), nullable=False)
+    spotify_data = db.Column(db.Text, nullable=False)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Set when the music couldn't be found in spotify the last time it was
+    # looked for, so that it isn't looked for again until the snapshot is stale
+    unavailable = db.Column(db.Boolean)
+
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, unique=True)
+
+    @property
+    def music(self) -> Union[SpotifyMusic, None]:
+        """Get the snapshot as a `SpotifyMusic` object (None if the
+        music is unavailable)
+        """
+        if self.unavailable:
+            return None
+        elif self.music_type == MusicType.album:
+            return SpotifyAlbum(json.loads(self.spotify_data))
+        elif self.music_type == MusicType.track:
+            return SpotifyTrack(json.loads(self.spotify_data))
+
+    @music.setter
+    def music(self, music: SpotifyMusic):
+        self.music_type = MusicType.album if isinstance(music, SpotifyAlbum) else MusicType.track
+        self.spotify_data = json.dumps(music.to_dict())
+        self.unavailable = False
+        self.updated = datetime.utcnow()
+
+    def __repr__(self):
+        return '<MusicSnapshot %r>' % self.id
+
+
+class PlayerStatsMixin:
+    """Running totals of a player's games, kept up to date as guesses are
+    made and rounds are revealed (see `musicrecs.database.stats`)
+    """
+    # Revealed rounds that the player submitted to
+    rounds_played = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Guesses the player made, and how many of them were correct
+    guesses_made = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    guesses_correct = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Wrong guesses that other players made about the player's recs
+    times_fooled = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+class UserStats(PlayerStatsMixin, db.Model):
+    """Stats of a logged in user, across every name they've played as"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
+    def __repr__(self):
+        return '<UserStats %r>' % self.user_id
+
+
+class UserNameStats(PlayerStatsMixin, db.Model):
+    """Stats of everyone who has played under a user name"""
+    __table_args__ = (
+        db.Index('ix_user_name_stats_guesses_correct', 'guesses_correct'),
+    )
+
+    user_name = db.Column(db.String(MAX_NAME_LENGTH), primary_key=True)
+
+    def __repr__(self):
+        return '<UserNameStats %r>' % self.user_name
+
+
 class Round(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     long_id = db.Column(db.String(MAX_LONG_ID_LENGTH), unique=True)
@@ -89,6 +181,15 @@ class Round(db.Model):
 
     created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    # When a request claimed the round's transition to its next status
+    # (None if no transition is underway)
+    transition_started = db.Column(db.DateTime)
+
+    # Rounds of a status are looked up newest first
+    __table_args__ = (
+        db.Index('ix_round_status_created', status, created.desc()),
+    )
+
     @validates('long_id')
     def validate_long_id(self, key, long_id):
         if len(long_id) > MAX_LONG_ID_LENGTH:
@@ -103,3 +204,58 @@ class Round(db.Model):
 
     def __repr__(self):
         return '<Round %r>' % self.id
+
+
+class ArchivedRound(db.Model):
+    """A revealed round that was moved out of the round, submission and guess
+    tables once it got old (see `musicrecs.database.archive`). The round,
+    its submissions, guesses and music snapshots are kept together in
+    `data`, compressed.
+    """
+    # The same id and long id as the round had
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    long_id = db.Column(db.String(MAX_LONG_ID_LENGTH), unique=True, nullable=False)
+
+    music_type = db.Column(db.Enum(MusicType), nullable=False)
+    created = db.Column(db.DateTime, nullable=False)
+    archived = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    users = db.relationship('ArchivedRoundUser', cascade="all, delete-orphan",
+                            backref=db.backref('archived_round', lazy=True))
+
+    def __repr__(self):
+        return '<ArchivedRound %r>' % self.id
+
+
+class ArchivedRoundUser(db.Model):
+    """A logged in user that submitted to an archived round, so that a user's
+    archived rounds can be paged through without unpacking any others
+    """
+    # A user's rounds of a music type are looked up newest first
+    __table_args__ = (
+        db.Index('ix_archived_round_user_user_id_music_type_created', 'user_id', 'music_type', 'created'),
+    )
+
+    archived_round_id = db.Column(db.Integer, db.ForeignKey('archived_round.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
+    # Copied from the archived round
+    music_type = db.Column(db.Enum(MusicType), nullable=False)
+    created = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return '<ArchivedRoundUser %r %r>' % (self.archived_round_id, self.user_id)
+
+
+class SpotifyToken(db.Model):
+    """The spotify authorization token of a browser session (see
+    `musicrecs.spotify.token_store`)
+    """
+    session_id = db.Column(db.String(MAX_SESSION_ID_LENGTH), primary_key=True)
+    token_info = db.Column(db.Text, nullable=False)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return '<SpotifyToken %r>' % self.session_id
@@ -0,0 +1,69 @@
+"""Routing of reads to an optional read-only replica of the database.
+
+The replica is the `replica` bind (set from `SQLALCHEMY_REPLICA_URI`). Reads
+only go to it inside `read_from_replica` (or views decorated with
+`reads_from_replica`), and even then only plain SELECTs do: flushes and any
+other statements always go to the primary. Without a replica configured,
+everything goes to the primary.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
+
+
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends SELECTs to the replica while reading from it"""
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, Select) and not self._flushing and _is_reading_from_replica(self.app):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@contextmanager
+def read_from_replica(use_replica=True):
+    """Read from the replica (if there is one) for the rest of the block.
+    Pass `use_replica=False` to read from the primary instead, for reads
+    that can't be behind the primary.
+    """
+    previous = g.get("read_from_replica", False)
+    g.read_from_replica = use_replica
+    try:
+        yield
+    finally:
+        g.read_from_replica = previous
+
+
+def reads_from_replica(view):
+    """Decorate a view so that its GET requests read from the replica"""
+    @wraps(view)
+    def decorated_view(*args, **kwargs):
+        if request.method != "GET":
+            return view(*args, **kwargs)
+
+        with read_from_replica():
+            return view(*args, **kwargs)
+
+    return decorated_view
+
+
+def _is_reading_from_replica(app) -> bool:
+    return (
+        has_app_context()
+        and g.get("read_from_replica", False)
+        and REPLICA_BIND in (app.config["SQLALCHEMY_BINDS"] or {})
+    )
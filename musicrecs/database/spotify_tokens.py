@@ -0,0 +1,62 @@
+"""Backend of the spotify token store (`musicrecs.spotify.token_store`)
+that keeps the tokens in the `SpotifyToken` table.
+
+Tokens are always read from the primary database, since a token that
+was just saved has to be found by the next request. Tokens are written in
+their own transactions, since they can be saved (when they're refreshed)
+in the middle of a request that has changes of its own under way.
+"""
+
+from datetime import datetime
+from typing import Union
+
+from sqlalchemy import delete, update
+
+from musicrecs.database.models import SpotifyToken
+from musicrecs.database.replica import read_from_replica
+from musicrecs.database.stats import UPSERT_INSERTS
+
+from musicrecs import db
+
+
+class SpotifyTokenTable:
+    def get(self, session_id) -> Union[str, None]:
+        with read_from_replica(False):
+            token_info, = db.session.query(SpotifyToken.token_info).filter_by(session_id=session_id).first() or (None,)
+
+        return token_info
+
+    def set(self, session_id, token_info: str):
+        row = dict(session_id=session_id, token_info=token_info, updated=datetime.utcnow())
+
+        with db.engine.begin() as conn:
+            insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+            if insert is not None:
+                stmt = insert(SpotifyToken.__table__)
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=["session_id"],
+                    set_=dict(token_info=stmt.excluded.token_info, updated=stmt.excluded.updated)
+                ), row)
+                return
+
+            # Otherwise update the token if it exists, and insert it if not
+            result = conn.execute(update(SpotifyToken.__table__).where(
+                SpotifyToken.__table__.c.session_id == session_id
+            ).values(token_info=token_info, updated=row["updated"]))
+            if result.rowcount == 0:
+                conn.execute(SpotifyToken.__table__.insert(), row)
+
+    def delete(self, session_id):
+        with db.engine.begin() as conn:
+            conn.execute(delete(SpotifyToken.__table__).where(SpotifyToken.__table__.c.session_id == session_id))
+
+    def delete_updated_before(self, updated_before: datetime) -> int:
+        """Delete the tokens of abandoned sessions: the ones that haven't
+        been saved (or refreshed) since `updated_before`. Return the number
+        of tokens deleted.
+        """
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(SpotifyToken.__table__).where(
+                SpotifyToken.__table__.c.updated < updated_before))
+
+        return result.rowcount
@@ -0,0 +1,247 @@
+"""Players' stats, kept as running totals in the `UserStats` (per logged in
+user) and `UserNameStats` (per user name) tables.
+
+The totals are incremented in the same transaction that adds guesses
+(`record_guesses`) and reveals rounds (`record_round_revealed`), so profile
+and leaderboard pages read one row per player rather than counting up every
+round. `backfill_player_stats` recounts them from scratch, for databases
+that had rounds before the tables existed.
+"""
+
+from collections import Counter, defaultdict
+from contextlib import closing
+from typing import Dict, List, Union
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import aliased
+
+from musicrecs.database.archive import iter_archived_rounds
+from musicrecs.database.models import Guess, Round, Submission, UserNameStats, UserStats
+from musicrecs.enums import RoundStatus
+
+from musicrecs import db
+
+
+"""CONSTANTS"""
+
+
+STAT_NAMES = ("rounds_played", "guesses_made", "guesses_correct", "times_fooled")
+
+# User name of the bot that submits a rec to every round, which isn't a player
+SNOOZIN_USER_NAME = "snoozin"
+
+# Number of archived rounds unpacked at a time when recounting stats
+ARCHIVED_ROUND_BATCH_SIZE = 100
+
+# Dialects that can increment a row or insert it in one statement (upsert)
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+"""PUBLIC FUNCTIONS"""
+
+
+def record_guesses(guesser_submission: Submission, guesses: Dict[str, bool]):
+    """Add a guesser's new guesses to the stats. `guesses` maps each guessed
+    user name to whether the guess was correct.
+
+    Only adds to the session: the caller commits along with the guesses.
+    """
+    increments = _StatIncrements()
+    increments.add(guesser_submission.user_id, guesser_submission.user_name,
+                   guesses_made=len(guesses),
+                   guesses_correct=sum(1 for correct in guesses.values() if correct))
+
+    # Every wrong guess about someone else's rec fooled them (snoozin
+    # doesn't count)
+    fooled = [
+        user_name for user_name, correct in guesses.items()
+        if not correct and user_name not in (guesser_submission.user_name, SNOOZIN_USER_NAME)
+    ]
+    if fooled:
+        for user_id, user_name in db.session.query(Submission.user_id, Submission.user_name).filter(
+                Submission.round_id == guesser_submission.round_id, Submission.user_name.in_(fooled)):
+            increments.add(user_id, user_name, times_fooled=1)
+
+    increments.apply()
+
+
+def record_round_revealed(round_id):
+    """Add a round that was just revealed to the stats of everyone who
+    submitted to it.
+
+    Only adds to the session: the caller commits along with the round's
+    new status.
+    """
+    increments = _StatIncrements()
+    for user_id, user_name in db.session.query(Submission.user_id, Submission.user_name).filter(
+            Submission.round_id == round_id, Submission.user_name != SNOOZIN_USER_NAME):
+        increments.add(user_id, user_name, rounds_played=1)
+
+    increments.apply()
+
+
+def get_user_stats(user_id) -> Union[UserStats, None]:
+    return UserStats.query.filter_by(user_id=user_id).first()
+
+
+def get_leaderboard(limit: int) -> List[UserNameStats]:
+    """Get the stats of the user names with the most correct guesses"""
+    return UserNameStats.query.order_by(
+        UserNameStats.guesses_correct.desc(), UserNameStats.user_name
+    ).limit(limit).all()
+
+
+def backfill_player_stats() -> int:
+    """Recount every player's stats from their rounds and guesses (archived
+    or not), replacing the running totals.
+
+    Return the number of user names with stats.
+    """
+    guesser = aliased(Submission)
+    guessed = aliased(Submission)
+
+    # Archived rounds can't be counted up by the database
+    archived_stats = _count_archived_stats()
+
+    for model, key_column in ((UserStats, "user_id"), (UserNameStats, "user_name")):
+        stats = archived_stats[key_column]
+
+        # Revealed rounds submitted to
+        for key, rounds_played in db.session.execute(
+                select(getattr(Submission, key_column), func.count(Submission.id))
+                .join(Round, Round.id == Submission.round_id)
+                .where(Round.status == RoundStatus.revealed)
+                .group_by(getattr(Submission, key_column))):
+            stats[key]["rounds_played"] += rounds_played
+
+        # Guesses made, by the guesser's submission
+        for key, guesses_made, guesses_correct in db.session.execute(
+                select(getattr(Submission, key_column), func.count(Guess.id),
+                       func.sum(case((Guess.correct.is_(True), 1), else_=0)))
+                .join(Guess, Guess.submission_id == Submission.id)
+                .group_by(getattr(Submission, key_column))):
+            stats[key]["guesses_made"] += guesses_made
+            stats[key]["guesses_correct"] += guesses_correct
+
+        # Wrong guesses about the guessed user's rec (in the same round)
+        for key, times_fooled in db.session.execute(
+                select(getattr(guessed, key_column), func.count(Guess.id))
+                .select_from(Guess)
+                .join(guesser, guesser.id == Guess.submission_id)
+                .join(guessed, and_(guessed.round_id == guesser.round_id, guessed.user_name == Guess.user_name))
+                .where(Guess.correct.is_(False), Guess.user_name != guesser.user_name)
+                .group_by(getattr(guessed, key_column))):
+            stats[key]["times_fooled"] += times_fooled
+
+        # Users that aren't logged in don't have user stats, and snoozin
+        # isn't a player
+        stats.pop(None, None)
+        stats.pop(SNOOZIN_USER_NAME, None)
+
+        db.session.execute(model.__table__.delete())
+        if stats:
+            db.session.execute(model.__table__.insert(), [
+                dict({key_column: key}, **{stat_name: counts[stat_name] for stat_name in STAT_NAMES})
+                for key, counts in stats.items()
+            ])
+
+    db.session.commit()
+
+    return UserNameStats.query.count()
+
+
+@click.command("backfill-player-stats")
+@with_appcontext
+def backfill_player_stats_command():
+    """Recount every player's stats from their rounds and guesses."""
+    num_players = backfill_player_stats()
+    click.echo(f"Backfilled the stats of {num_players} players")
+
+
+"""PRIVATE FUNCTIONS"""
+
+
+class _StatIncrements:
+    """Increments to players' stats, collected so that each table's
+    increments are applied with one statement
+    """
+
+    def __init__(self):
+        self._user_increments = defaultdict(Counter)
+        self._user_name_increments = defaultdict(Counter)
+
+    def add(self, user_id, user_name, **increments):
+        self._user_name_increments[user_name].update(increments)
+        if user_id is not None:
+            self._user_increments[user_id].update(increments)
+
+    def apply(self):
+        _increment_stats(UserStats, "user_id", self._user_increments)
+        _increment_stats(UserNameStats, "user_name", self._user_name_increments)
+
+
+def _count_archived_stats() -> Dict[str, Dict[object, Counter]]:
+    """Count the stats of the archived rounds, by user id and by user name"""
+    stats = {"user_id": defaultdict(Counter), "user_name": defaultdict(Counter)}
+
+    with closing(iter_archived_rounds(ARCHIVED_ROUND_BATCH_SIZE)) as rounds:
+        for round in rounds:
+            submissions_by_name = {submission.user_name: submission for submission in round.submissions}
+
+            for submission in round.submissions:
+                counts = Counter(
+                    rounds_played=1 if round.status == RoundStatus.revealed else 0,
+                    guesses_made=len(submission.guesses),
+                    guesses_correct=sum(1 for guess in submission.guesses if guess.correct)
+                )
+                fooled = [
+                    submissions_by_name[guess.user_name] for guess in submission.guesses
+                    if not guess.correct and guess.user_name != submission.user_name
+                    and guess.user_name in submissions_by_name
+                ]
+
+                for key_column in stats:
+                    stats[key_column][getattr(submission, key_column)].update(counts)
+                    for fooled_submission in fooled:
+                        stats[key_column][getattr(fooled_submission, key_column)]["times_fooled"] += 1
+
+    return stats
+
+
+def _increment_stats(model, key_column: str, increments: Dict[object, Counter]):
+    """Add the increments to each row of the model's stats (keyed by the
+    `key_column` value), creating the rows that don't exist yet
+    """
+    if not increments:
+        return
+
+    rows = [
+        dict({key_column: key}, **{stat_name: counts[stat_name] for stat_name in STAT_NAMES})
+        for key, counts in increments.items()
+    ]
+
+    insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+    if insert is not None:
+        stmt = insert(model.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key_column],
+            set_={stat_name: getattr(model, stat_name) + stmt.excluded[stat_name] for stat_name in STAT_NAMES}
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    # Otherwise update the rows that exist, and insert the rest
+    for row in rows:
+        result = db.session.execute(
+            update(model).where(getattr(model, key_column) == row[key_column]).values({
+                stat_name: getattr(model, stat_name) + row[stat_name] for stat_name in STAT_NAMES
+            }).execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.execute(model.__table__.insert(), row)
@@ -0,0 +1,97 @@
+"""Upgrade the schema of an existing database to match the models.
+
+`db.create_all` creates missing tables, but it doesn't touch tables that
+already exist, so columns and indexes added to the models later are
+created here. Only nullable columns can be added to an existing table.
+Unique indexes can't be created while the table breaks them, so duplicate
+rows are reported (and the rest of the upgrade carries on) rather than
+being deleted.
+
+Every worker upgrades the database as it starts, so workers that start at
+the same time can race to create the same column or index. The ones that
+lose find it already created, and carry on.
+"""
+
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn
+
+from musicrecs import db
+
+
+"""PUBLIC FUNCTIONS"""
+
+
+def upgrade_db(app) -> List[str]:
+    """Create the columns and indexes of the models that are missing
+    from the database.
+
+    Return the names of the columns and indexes that were created.
+    """
+    created = []
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+
+        for table in db.metadata.sorted_tables:
+            existing_columns = set(column["name"] for column in inspector.get_columns(table.name))
+
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                if not column.nullable:
+                    app.logger.error(f"Couldn't add column {table.name}.{column.name}: it isn't nullable")
+                    continue
+
+                table_name = db.engine.dialect.identifier_preparer.format_table(table)
+                column_spec = CreateColumn(column).compile(dialect=db.engine.dialect)
+                try:
+                    with db.engine.begin() as conn:
+                        conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_spec}")
+                except (OperationalError, ProgrammingError):
+                    # Another worker may have just added it
+                    if _column_exists(table.name, column.name):
+                        continue
+                    raise
+
+                created.append(f"{table.name}.{column.name}")
+
+            existing_indexes = set(index["name"] for index in inspector.get_indexes(table.name))
+
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+
+                try:
+                    index.create(db.engine)
+                except IntegrityError:
+                    app.logger.error(
+                        f"Couldn't create unique index {index.name}: "
+                        f"table {table.name} has duplicate {', '.join(column.name for column in index.columns)}")
+                    continue
+                except (OperationalError, ProgrammingError):
+                    # Another worker may have just created it
+                    if _index_exists(table.name, index.name):
+                        continue
+                    raise
+
+                created.append(index.name)
+
+    if created:
+        app.logger.info(f"Upgraded database: created {', '.join(created)}")
+
+    return created
+
+
+"""PRIVATE FUNCTIONS"""
+
+
+def _column_exists(table_name, column_name) -> bool:
+    return any(column["name"] == column_name for column in inspect(db.engine).get_columns(table_name))
+
+
+def _index_exists(table_name, index_name) -> bool:
+    return any(index["name"] == index_name for index in inspect(db.engine).get_indexes(table_name))
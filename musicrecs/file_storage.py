@@ -0,0 +1,229 @@
+"""Storage of the files that musicrecs keeps per browser session (the flask
+session files and the spotify user token files) and of its file caches.
+
+Files are spread over hash prefix subdirectories (`<root>/ab/cd/abcd...`)
+rather than kept in one flat directory, so that no directory gets big
+enough to slow down opening a file. Files that aren't used any more (for
+sessions that were abandoned) are removed by `sweep_files`, which also
+moves files left in the flat layout into their subdirectory.
+"""
+
+import hashlib
+import os
+import struct
+import time
+from typing import Callable, Dict
+
+from cachelib.file import FileSystemCache
+from flask_session.sessions import FileSystemSessionInterface
+
+
+"""CONSTANTS"""
+
+
+# Number of levels of subdirectories, and the length of each one's name
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+
+"""PUBLIC FUNCTIONS"""
+
+
+def sharded_path(root: str, name: str) -> str:
+    """Get the path of the file with the name, in its subdirectory of `root`.
+    Names that aren't already hex hashes are hashed to pick the subdirectory.
+    """
+    shard_key = name if _is_hex_hash(name) else hashlib.sha256(name.encode()).hexdigest()
+    shards = [shard_key[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+    return os.path.join(root, *shards, name)
+
+
+def sweep_files(root: str, is_expired: Callable[[os.DirEntry, float], bool], shard=True) -> Dict[str, int]:
+    """Remove the files under `root` that `is_expired` (given the file's
+    directory entry and the current time) says have expired. Files that
+    are in the flat layout are moved into their subdirectory, unless
+    `shard` is False (for folders that are meant to be flat).
+
+    Return counts of the files and bytes that were kept and removed
+    """
+    stats = dict(files=0, bytes=0, files_removed=0, bytes_removed=0, files_moved=0)
+    if not os.path.isdir(root):
+        return stats
+
+    now = time.time()
+
+    # Move the files in the flat layout into their subdirectories (unless
+    # the file has already been written again in its subdirectory)
+    for entry in _iter_files(root):
+        try:
+            size = entry.stat().st_size
+            if is_expired(entry, now):
+                os.remove(entry.path)
+                stats["files_removed"] += 1
+                stats["bytes_removed"] += size
+                continue
+
+            if not shard:
+                stats["files"] += 1
+                stats["bytes"] += size
+                continue
+
+            new_path = sharded_path(root, entry.name)
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            if os.path.exists(new_path):
+                os.remove(entry.path)
+            else:
+                os.replace(entry.path, new_path)
+            stats["files_moved"] += 1
+        except FileNotFoundError:
+            # Removed by someone else during the sweep
+            continue
+
+    for entry in _iter_sharded_files(root):
+        try:
+            size = entry.stat().st_size
+            if is_expired(entry, now):
+                os.remove(entry.path)
+                stats["files_removed"] += 1
+                stats["bytes_removed"] += size
+                continue
+        except FileNotFoundError:
+            continue
+
+        stats["files"] += 1
+        stats["bytes"] += size
+
+    return stats
+
+
+def modified_before(max_age: float) -> Callable[[os.DirEntry, float], bool]:
+    """Make an expiry check for files that haven't been written to for
+    `max_age` seconds
+    """
+    def is_expired(entry: os.DirEntry, now: float) -> bool:
+        return entry.stat().st_mtime < now - max_age
+
+    return is_expired
+
+
+def session_file_expired(entry: os.DirEntry, now: float) -> bool:
+    """Check whether a session file (or any cachelib file system cache
+    file) has passed the expiry time that's written at the start of it
+    """
+    with open(entry.path, "rb") as f:
+        header = f.read(4)
+
+    if len(header) < 4:
+        return True
+
+    expires = struct.unpack("I", header)[0]
+    return expires != 0 and expires < now
+
+
+class ShardedFileSystemCache(FileSystemCache):
+    """cachelib's file system cache, with the files in subdirectories.
+
+    There's no threshold, so setting a value never has to count (or prune)
+    the files: expired files are left for `sweep_files` to remove. A file
+    that's still in the flat layout (because it hasn't been swept yet) is
+    moved into its subdirectory when its key is read.
+    """
+
+    def __init__(self, cache_dir, mode=None, default_timeout=300):
+        super().__init__(cache_dir, threshold=0, default_timeout=default_timeout, mode=mode)
+
+    def _get_filename(self, key) -> str:
+        return sharded_path(self._path, os.path.basename(self._get_flat_filename(key)))
+
+    def _list_dir(self):
+        return (entry.path for entry in _iter_sharded_files(self._path) if not self._is_mgmt(entry.name))
+
+    def get(self, key):
+        self._move_flat_file(key)
+        return super().get(key)
+
+    def has(self, key) -> bool:
+        self._move_flat_file(key)
+        return super().has(key)
+
+    def set(self, key, value, timeout=None, mgmt_element=False) -> bool:
+        os.makedirs(os.path.dirname(self._get_filename(key)), exist_ok=True)
+        return super().set(key, value, timeout=timeout, mgmt_element=mgmt_element)
+
+    def delete(self, key, mgmt_element=False) -> bool:
+        # Make sure that a flat file can't be swept back in after the delete
+        try:
+            os.remove(self._get_flat_filename(key))
+        except FileNotFoundError:
+            pass
+
+        return super().delete(key, mgmt_element=mgmt_element)
+
+    def _get_flat_filename(self, key) -> str:
+        return super()._get_filename(key)
+
+    def _move_flat_file(self, key):
+        """Move the key's file from the flat layout into its subdirectory,
+        unless the key has already been written in its subdirectory
+        """
+        flat_filename = self._get_flat_filename(key)
+        if not os.path.exists(flat_filename):
+            return
+
+        filename = self._get_filename(key)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            if os.path.exists(filename):
+                os.remove(flat_filename)
+            else:
+                os.replace(flat_filename, filename)
+        except FileNotFoundError:
+            # Moved by someone else (another request or the sweep)
+            pass
+
+
+class ShardedFileSystemSessionInterface(FileSystemSessionInterface):
+    """Flask-Session's file system sessions, with the session files in
+    subdirectories
+    """
+
+    def __init__(self, cache_dir, mode, key_prefix, use_signer=False, permanent=True):
+        super().__init__(cache_dir, 0, mode, key_prefix, use_signer=use_signer, permanent=permanent)
+        self.cache = ShardedFileSystemCache(cache_dir, mode=mode)
+
+    @classmethod
+    def from_app(cls, app):
+        """Make the session interface from the app's Flask-Session config"""
+        return cls(app.config["SESSION_FILE_DIR"],
+                   app.config.get("SESSION_FILE_MODE", 0o600),
+                   app.config.get("SESSION_KEY_PREFIX", "session:"),
+                   use_signer=app.config.get("SESSION_USE_SIGNER", False),
+                   permanent=app.config.get("SESSION_PERMANENT", True))
+
+
+"""PRIVATE FUNCTIONS"""
+
+
+def _is_hex_hash(name: str) -> bool:
+    return len(name) >= SHARD_DEPTH * SHARD_WIDTH and all(c in "0123456789abcdef" for c in name)
+
+
+def _iter_files(dir_path: str):
+    """Iterate over the directory entries of the files in the directory,
+    skipping files that are still being written
+    """
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and \
+                    not entry.name.endswith(FileSystemCache._fs_transaction_suffix):
+                yield entry
+
+
+def _iter_sharded_files(root: str):
+    """Iterate over the directory entries of the files in the subdirectories"""
+    with os.scandir(root) as entries:
+        dir_paths = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+    for dir_path in dir_paths:
+        yield from _iter_files(dir_path)
+        yield from _iter_sharded_files(dir_path)
@@ -1,10 +1,23 @@
 import random
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
 
 from musicrecs.spotify.item.spotify_music import SpotifyTrack
-from musicrecs.database.models import Round
+from musicrecs.database.archive import archive_rounds
+from musicrecs.database.models import MusicSnapshot, Round, Submission
+from musicrecs.database.replica import read_from_replica
+from musicrecs.database.spotify_tokens import SpotifyTokenTable
+from musicrecs.database.helpers import (
+    get_submissions_music, iter_rounds_newest_first, mark_music_unavailable, update_music_snapshots)
 from musicrecs.enums import MusicType, RoundStatus
+from musicrecs.file_storage import modified_before, session_file_expired, sweep_files
+from musicrecs.round.helpers import search_for_random_rec
+from musicrecs.round.snoozin_rec_pool import snoozin_rec_pool
+from musicrecs.spotify import spotify_user
 
-from musicrecs import spotify_iface, scheduler, cache
+from musicrecs import spotify_iface, async_spotify_iface, scheduler, cache
 
 
 '''CONSTANTS'''
@@ -13,6 +26,19 @@ from musicrecs import spotify_iface, scheduler, cache
 # This is to create a 5 x 10 grid of imgs
 MAX_BG_IMGS = 50
 
+# Number of revealed rounds fetched at a time when sampling bg imgs
+BG_IMG_ROUND_BATCH_SIZE = 20
+
+# Music snapshots older than this are refreshed from spotify
+MUSIC_SNAPSHOT_MAX_AGE = timedelta(days=30)
+
+# Most snapshots of each music type to refresh in one run
+MAX_MUSIC_SNAPSHOT_REFRESHES = 500
+
+# Number of rounds archived per transaction, and the most archived in one run
+ROUND_ARCHIVE_BATCH_SIZE = 50
+MAX_ROUND_ARCHIVES = 5000
+
 
 '''TASKS'''
 
@@ -29,41 +55,207 @@ def update_bg_imgs():
 
     Schedule to occur once a day.
     """
-    with scheduler.app.app_context():
-        # Creat empty set to store images
-        music_bg_imgs = set()
+    with scheduler.app.app_context(), read_from_replica():
+        # Create empty lists to store the sampled submissions of each music type
+        sampled_subs = {music_type: [] for music_type in MusicType}
 
-        # Get revealed rounds
-        rounds = Round.query.filter_by(status=RoundStatus.revealed)
-
-        # Get imgs from recent revealed rounds
-        for round in reversed(list(rounds)):
-            # Get subs that aren't snoozin's (we're interested in what actual ppl are recommending!)
-            snoozinless_subs = [sub for sub in round.submissions if sub.user_name != "snoozin"]
+        # Sample submissions from recent revealed rounds (newest first, only
+        # fetching rounds from the database until there are enough). Rounds
+        # can share music, so keep sampling until there are enough different
+        # images (or the rounds run out).
+        music_bg_imgs = set()
+        num_sampled = 0
+        with closing(iter_rounds_newest_first(RoundStatus.revealed, BG_IMG_ROUND_BATCH_SIZE)) as rounds:
+            for round in rounds:
+                # Get subs that aren't snoozin's (we're interested in what actual ppl are recommending!)
+                snoozinless_subs = [sub for sub in round.submissions if sub.user_name != "snoozin"]
 
-            # Skip if round has less than two subs (means someone played alone with snoozin, so
-            # not really recommending to anyone now are you?)
-            if len(snoozinless_subs) < 2:
-                continue
+                # Skip if round has less than two subs (means someone played alone with snoozin, so
+                # not really recommending to anyone now are you?)
+                if len(snoozinless_subs) < 2:
+                    continue
 
-            # Get high quality imgs (obtained from album query) for two of the submissions for this round
-            for sub in random.sample(snoozinless_subs, 2):
-                music = spotify_iface.get_music_from_link(round.music_type, sub.spotify_link)
+                # Sample two of the submissions for this round
+                sampled_subs[round.music_type].extend(random.sample(snoozinless_subs, 2))
+                num_sampled += 2
 
-                if isinstance(music, SpotifyTrack):
-                    img_url = spotify_iface.get_music_from_link(MusicType.album, music.album_item.link).img_url
-                else:
-                    img_url = music.img_url
+                # Get the images of the samples once there could be enough of them
+                if num_sampled >= MAX_BG_IMGS - len(music_bg_imgs):
+                    _add_music_bg_imgs(music_bg_imgs, sampled_subs)
+                    num_sampled = 0
 
-                music_bg_imgs.add(img_url)
+                    # Exit once we have enough images
+                    if len(music_bg_imgs) >= MAX_BG_IMGS:
+                        break
 
-            # Exit once we have enough images
-            if len(music_bg_imgs) >= MAX_BG_IMGS:
-                break
+        # Get the images of the samples from the last rounds
+        _add_music_bg_imgs(music_bg_imgs, sampled_subs)
 
         # Make a shuffled list of the images
         music_bg_imgs = list(music_bg_imgs)
         random.shuffle(music_bg_imgs)
+        music_bg_imgs = music_bg_imgs[:MAX_BG_IMGS]
 
         # Save the list of images to the cache
         cache.set("main_music_bg_imgs", music_bg_imgs, timeout=0)
+
+
+@scheduler.task(
+    "cron",
+    id="refresh_music_snapshots",
+    hour="*",
+    max_instances=1
+)
+def refresh_music_snapshots():
+    """Save music snapshots for submissions that don't have one yet, and
+    refresh the snapshots that have gone stale.
+
+    Schedule to occur once an hour.
+    """
+    with scheduler.app.app_context():
+        stale_cutoff = datetime.utcnow() - MUSIC_SNAPSHOT_MAX_AGE
+
+        for music_type in MusicType:
+            # Get submissions of this music type with missing or stale
+            # snapshots, missing ones first and then the stalest
+            submissions = Submission.query.join(Round).outerjoin(MusicSnapshot).filter(
+                Round.music_type == music_type,
+                or_(MusicSnapshot.id.is_(None), MusicSnapshot.updated < stale_cutoff)
+            ).order_by(
+                MusicSnapshot.updated.asc().nullsfirst(), Submission.id
+            ).limit(MAX_MUSIC_SNAPSHOT_REFRESHES).all()
+
+            # Make sure stale music is requested from spotify again
+            # rather than taken from the music cache
+            for submission in submissions:
+                if submission.music_snapshot is not None:
+                    spotify_iface.invalidate_music(music_type, submission.spotify_link)
+
+            # Update the snapshots of the music that could be found (the
+            # batches of links are requested at the same time)
+            musics = async_spotify_iface.run(async_spotify_iface.get_musics_from_links(
+                music_type, [submission.spotify_link for submission in submissions]))
+            found = [(submission, music) for submission, music in zip(submissions, musics) if music is not None]
+            update_music_snapshots([submission for submission, _ in found], [music for _, music in found])
+
+            # Record the music that couldn't be found, so that it doesn't
+            # keep the rest from being refreshed
+            mark_music_unavailable(music_type, [
+                submission for submission, music in zip(submissions, musics) if music is None])
+
+
+@scheduler.task(
+    "cron",
+    id="archive_old_rounds",
+    day="*",
+    hour=4,
+    max_instances=1
+)
+def archive_old_rounds():
+    """Move revealed rounds that are older than `ROUND_ARCHIVE_AGE_DAYS`
+    to the archive.
+
+    Schedule to occur once a day.
+    """
+    with scheduler.app.app_context():
+        created_before = datetime.utcnow() - timedelta(days=scheduler.app.config["ROUND_ARCHIVE_AGE_DAYS"])
+        num_archived = archive_rounds(created_before, ROUND_ARCHIVE_BATCH_SIZE, max_rounds=MAX_ROUND_ARCHIVES)
+        if num_archived:
+            scheduler.app.logger.info(f"Archived {num_archived} rounds")
+
+
+@scheduler.task(
+    "cron",
+    id="sweep_session_files",
+    hour="*",
+    minute=30,
+    max_instances=1
+)
+def sweep_session_files():
+    """Remove the session files and spotify user tokens (and old token
+    files) of abandoned sessions, and the expired cache files, and save
+    the counts of the files kept and removed to the cache.
+
+    Schedule to occur once an hour.
+    """
+    with scheduler.app.app_context():
+        file_storage_stats = {
+            "sessions": sweep_files(scheduler.app.config["SESSION_FILE_DIR"], session_file_expired),
+            "spotify_music_cache": sweep_files(scheduler.app.config["SPOTIFY_MUSIC_CACHE_DIR"], session_file_expired),
+            "cache": sweep_files(scheduler.app.config["CACHE_DIR"], session_file_expired, shard=False),
+            "spotify_user_caches": sweep_files(
+                spotify_user.CACHE_FOLDER, modified_before(scheduler.app.config["SPOTIFY_USER_CACHE_TTL"])),
+        }
+
+        for name, stats in file_storage_stats.items():
+            scheduler.app.logger.info(
+                f"Swept {name}: kept {stats['files']} files ({stats['bytes']} bytes), "
+                f"removed {stats['files_removed']} files ({stats['bytes_removed']} bytes)")
+
+        cache.set("file_storage_stats", file_storage_stats, timeout=0)
+
+        token_ttl = timedelta(seconds=scheduler.app.config["SPOTIFY_USER_CACHE_TTL"])
+        num_deleted = SpotifyTokenTable().delete_updated_before(datetime.utcnow() - token_ttl)
+        if num_deleted:
+            scheduler.app.logger.info(f"Deleted {num_deleted} abandoned spotify user tokens")
+
+
+@scheduler.task(
+    "interval",
+    id="refill_snoozin_rec_pools",
+    minutes=1,
+    max_instances=1
+)
+def refill_snoozin_rec_pools():
+    """Find snoozin random recs ahead of time, so that advancing
+    a round doesn't have to wait on random searches. Pools are only
+    refilled once they fall below their low watermark.
+
+    Schedule to occur once a minute.
+    """
+    with scheduler.app.app_context():
+        for music_type in MusicType:
+            if not snoozin_rec_pool.needs_refill(music_type):
+                continue
+
+            while snoozin_rec_pool.count(music_type) < snoozin_rec_pool.size:
+                random_rec = search_for_random_rec(music_type)
+                if random_rec is None:
+                    break
+
+                snoozin_rec_pool.add(music_type, *random_rec)
+
+
+@scheduler.task(
+    "interval",
+    id="refresh_spotify_user_tokens",
+    minutes=1,
+    max_instances=1
+)
+def refresh_spotify_user_tokens():
+    """Refresh the spotify tokens of this process's pooled users before
+    they expire, so that the users' requests never have to refresh them.
+
+    Schedule to occur once a minute.
+    """
+    with scheduler.app.app_context():
+        num_refreshed = spotify_user.refresh_expiring_tokens(scheduler.app.config["SPOTIFY_TOKEN_REFRESH_MARGIN"])
+        if num_refreshed:
+            scheduler.app.logger.info(f"Refreshed {num_refreshed} spotify user tokens")
+
+
+'''PRIVATE FUNCTIONS'''
+
+
+def _add_music_bg_imgs(music_bg_imgs: set, sampled_subs: dict):
+    """Add high quality imgs (the album sized image) of the sampled
+    submissions' music to the set of imgs, and empty the samples
+    """
+    for music_type, subs in sampled_subs.items():
+        for music in get_submissions_music(music_type, subs):
+            if isinstance(music, SpotifyTrack):
+                music_bg_imgs.add(music.album_img_url)
+            elif music is not None:
+                music_bg_imgs.add(music.img_url)
+
+        subs.clear()
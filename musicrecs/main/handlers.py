@@ -2,11 +2,20 @@ from flask import render_template, redirect, url_for, flash
 
 
 from musicrecs.database.helpers import add_round_to_db
+from musicrecs.database.replica import reads_from_replica
+from musicrecs.database.stats import get_leaderboard
 
 from . import bp
 from .forms import NewRoundForm
 
 
+"""CONSTANTS"""
+
+
+# Number of players shown on the leaderboard
+LEADERBOARD_SIZE = 25
+
+
 @bp.route('/', methods=['GET', 'POST'])
 @bp.route('/index', methods=['GET', 'POST'])
 def index():
@@ -35,3 +44,9 @@ def create_round():
 @bp.route('/about', methods=['GET'])
 def about():
     return render_template('main/about.html')
+
+
+@bp.route('/leaderboard', methods=['GET'])
+@reads_from_replica
+def leaderboard():
+    return render_template('main/leaderboard.html', leaderboard=get_leaderboard(LEADERBOARD_SIZE))
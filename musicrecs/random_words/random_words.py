@@ -1,14 +1,66 @@
+"""Gets random words from dictionary.
+Dictionary taken from
+'http://svnweb.freebsd.org/csrg/share/dict/words?view=co&content-type=text/plain'
+
+The dictionary is loaded once per process. The file is memory-mapped (so
+its pages are shared by every worker process on the host) and indexed with
+a compact array of line offsets, rather than being read into a list of
+strings.
+"""
+import array
+import mmap
 import random
 import os
+import threading
 
 DICTIONARY_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "dictionary.txt")
 
 
+class _Dictionary:
+    """Memory-mapped dictionary file, with the offset of the start
+    of each word
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as dictionary:
+            self._buffer = mmap.mmap(dictionary.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Offsets of the start of each line, with the end of the buffer
+        # at the end (so word i is between offsets i and i + 1)
+        self._offsets = array.array('I', [0])
+        pos = self._buffer.find(b'\n')
+        while pos != -1:
+            self._offsets.append(pos + 1)
+            pos = self._buffer.find(b'\n', pos + 1)
+        if self._offsets[-1] != len(self._buffer):
+            self._offsets.append(len(self._buffer))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._buffer[self._offsets[i]:self._offsets[i + 1]].strip().decode()
+
+
+_dictionary = None
+_dictionary_lock = threading.Lock()
+
+
+def load_dictionary() -> _Dictionary:
+    """Get the dictionary, loading it if this process hasn't yet"""
+    global _dictionary
+
+    if _dictionary is None:
+        with _dictionary_lock:
+            if _dictionary is None:
+                _dictionary = _Dictionary(DICTIONARY_FILE)
+
+    return _dictionary
+
+
 class RandomWords:
     def __init__(self):
-        with open(DICTIONARY_FILE, 'r') as dictionary:
-            self.word_list = [line.strip() for line in dictionary.readlines()]
+        self.word_list = load_dictionary()
 
     def get_random_words(self, count):
         """Get 'count' random words"""
-        return random.sample(self.word_list, count)
+        return [self.word_list[i] for i in random.sample(range(len(self.word_list)), count)]
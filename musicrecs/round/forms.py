@@ -6,6 +6,7 @@ from wtforms.fields.choices import SelectField
 
 from wtforms.fields.simple import TextAreaField
 from wtforms.validators import DataRequired, Length, ValidationError
+from spotipy.exceptions import SpotifyException
 
 from musicrecs import spotify_iface
 
@@ -25,13 +26,17 @@ GUESSER_NAME_PLACEHOLDER = "Please select your name"
 class _SpotifyLink(object):
     """Validates that the field is a valid spotify link using the
     spotify interface.
+
+    The music at the link is kept in the form's `spotify_music` attribute.
     """
     def __call__(self, form, field):
-        if spotify_iface.spotify_link_invalid(form._round.music_type, field.data):
+        try:
+            form.spotify_music = spotify_iface.get_music_from_link(form._round.music_type, field.data)
+        except SpotifyException:
             raise ValidationError(f"Invalid spotify {form._round.music_type.name} link.")
 
         # Shorten the field to the base spotify link
-        field.data = spotify_iface.get_music_from_link(form._round.music_type, field.data).link
+        field.data = form.spotify_music.link
 
 
 class _NewUserName(object):
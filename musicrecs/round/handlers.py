@@ -5,8 +5,10 @@ from flask.globals import request
 
 from musicrecs import db
 from musicrecs import spotify_iface
-from musicrecs.database.models import Submission, Round
-from musicrecs.database.helpers import add_submission_to_db
+from musicrecs.database.models import MusicSnapshot, Submission
+from musicrecs.database.replica import reads_from_replica
+from musicrecs.database.helpers import add_submission_to_db, claim_round_transition, get_round, \
+    get_submissions_music, release_round_transition, transition_round, update_music_snapshots
 from musicrecs.enums import RoundStatus, MusicType
 from musicrecs.errors.exceptions import MusicrecsAlert, MusicrecsError
 
@@ -14,12 +16,14 @@ from . import bp
 from .forms import GuessForm, TrackrecForm, AlbumrecForm, PlaylistForm
 from .helpers import get_current_user_submission, process_guess_form, get_snoozin_rec, \
     create_playlist, get_user_names, get_guesser_names
+from .round_view import shuffle_submissions
 
 
 @bp.route('/round/<string:long_id>', methods=["GET", "POST"])
+@reads_from_replica
 def index(long_id):
     # Get the round from the long id
-    round = Round.query.filter_by(long_id=long_id).first()
+    round = get_round(long_id)
 
     if round.status == RoundStatus.submit:
         return redirect(url_for('round.submit', long_id=round.long_id))
@@ -32,9 +36,10 @@ def index(long_id):
 
 
 @bp.route('/round/<string:long_id>/submit', methods=["GET", "POST"])
+@reads_from_replica
 def submit(long_id):
     # Get the round from the long id
-    round = Round.query.filter_by(long_id=long_id).first()
+    round = get_round(long_id)
 
     # Make sure this is the correct handler for the round's current status
     if round.status != RoundStatus.submit:
@@ -58,15 +63,14 @@ def submit(long_id):
         if current_user_submission is not None:
             current_user_submission.user_name = rec_form.name.data
             current_user_submission.spotify_link = rec_form.spotify_link.data
-            db.session.commit()
+            update_music_snapshots([current_user_submission], [rec_form.spotify_music])
         # Add the submission to the database
         else:
-            add_submission_to_db(round.id, current_user_id(), rec_form.name.data, rec_form.spotify_link.data)
+            add_submission_to_db(round.id, current_user_id(), rec_form.name.data, rec_form.spotify_link.data,
+                                 music=rec_form.spotify_music)
 
         # Alert the user that the form was successfully submitted
-        flash("Successfully submitted your recommendation: "
-              f"{spotify_iface.get_music_from_link(round.music_type, rec_form.spotify_link.data)}",
-              "success")
+        flash(f"Successfully submitted your recommendation: {rec_form.spotify_music}", "success")
 
         # Redirect back to the round after successful submission
         return redirect(url_for('round.submit', long_id=long_id))
@@ -87,7 +91,7 @@ def submit(long_id):
     current_user_music = None
     if current_user_submission is not None:
         # Get music object for the user's submssion
-        current_user_music = spotify_iface.get_music_from_link(round.music_type, current_user_submission.spotify_link)
+        current_user_music = get_submissions_music(round.music_type, [current_user_submission])[0]
 
         # Change the submit button text to reflect that this will change their submission
         rec_form.submit_rec.label.text = rec_form.submit_rec.label.text.replace("Submit", "Change")
@@ -99,9 +103,10 @@ def submit(long_id):
 
 
 @bp.route('/round/<string:long_id>/listen', methods=["GET", "POST"])
+@reads_from_replica
 def listen(long_id):
     # Get the round from the long id
-    round = Round.query.filter_by(long_id=long_id).first()
+    round = get_round(long_id)
 
     # Make sure this is the correct handler for the round's current status
     if round.status != RoundStatus.listen:
@@ -165,9 +170,10 @@ def listen(long_id):
 
 
 @bp.route('/round/<string:long_id>/revealed', methods=["GET", "POST"])
+@reads_from_replica
 def revealed(long_id):
     # Get the round from the long id
-    round = Round.query.filter_by(long_id=long_id).first()
+    round = get_round(long_id)
 
     # Make sure this is the correct handler for the round's current status
     if round.status != RoundStatus.revealed:
@@ -188,25 +194,37 @@ def revealed(long_id):
 @bp.route('/round/<string:long_id>/advance', methods=['POST'])
 def advance(long_id):
     # Get the round from the long id
-    round = Round.query.filter_by(long_id=long_id).first()
-
-    # Perform actions that are round phase transition specific
-    if 'advance_to_listen' in request.form and round.status == RoundStatus.submit:
-        # Add snoozin's rec:
-        new_submission = Submission(
-            spotify_link=get_snoozin_rec(round).link,
-            user_name="snoozin",
-            round_id=round.id,
-        )
-        db.session.add(new_submission)
-
-        # Advance to 'listen' phase
-        round.status = RoundStatus.listen
-        db.session.commit()
-
-    elif 'advance_to_revealed' in request.form and round.status == RoundStatus.listen:
-        round.status = RoundStatus.revealed
-        db.session.commit()
+    round = get_round(long_id)
+
+    # Perform actions that are round phase transition specific. Transitions
+    # are conditional on the round's status, so if the round is advanced by
+    # more than one request at once, only one of them does the transition.
+    if 'advance_to_listen' in request.form:
+        # Only the request that claims the transition gets snoozin's rec
+        if claim_round_transition(round.id, RoundStatus.submit):
+            try:
+                # Add snoozin's rec:
+                snoozin_rec = get_snoozin_rec(round)
+                new_submission = Submission(
+                    spotify_link=snoozin_rec.link,
+                    user_name="snoozin",
+                    round_id=round.id,
+                    music_snapshot=MusicSnapshot(music=snoozin_rec)
+                )
+                submissions = list(round.submissions) + [new_submission]
+                db.session.add(new_submission)
+
+                # Shuffle the submissions once, along with the transition
+                shuffle_submissions(submissions)
+            except Exception:
+                release_round_transition(round.id)
+                raise
+
+            # Advance to 'listen' phase
+            transition_round(round.id, RoundStatus.submit, RoundStatus.listen)
+
+    elif 'advance_to_revealed' in request.form:
+        transition_round(round.id, RoundStatus.listen, RoundStatus.revealed)
 
     # Go back to the round page
     return redirect(url_for('round.index', long_id=long_id))
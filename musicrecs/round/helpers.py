@@ -1,22 +1,27 @@
 import random
 import re
-from typing import Dict, List, Set, Union
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Set, Tuple, Union
 
-from flask import flash, url_for
+from flask import current_app, flash, url_for
 from flask.globals import request
+from spotipy.exceptions import SpotifyException
 
 from musicrecs import db
 from musicrecs import spotify_iface
 from musicrecs.database.models import Round, Submission
 from musicrecs.spotify import spotify_user
-from musicrecs.database.helpers import add_guess_to_db
+from musicrecs.database.helpers import add_guesses_to_db, get_round, get_submissions_music
 import musicrecs.random_words.random_words as random_words
 from musicrecs.spotify.item.spotify_music import SpotifyMusic
 from musicrecs.spotify.item.spotify_playlist import SpotifyPlaylist
-from musicrecs.enums import SnoozinRecType
+from musicrecs.enums import MusicType, SnoozinRecType
 from musicrecs.errors.exceptions import MusicrecsAlert, MusicrecsError
 from musicrecs.user.decorators import retry_after_auth
-from musicrecs.user.helpers import current_user_id
+from musicrecs.user.helpers import current_user_id, get_user_identity
+from musicrecs.round.round_view import RoundView, get_round_view
+from musicrecs.round.snoozin_rec_pool import snoozin_rec_pool
 
 
 """CONSTANTS"""
@@ -30,15 +35,15 @@ GUESS_LINE_PATTERN = r' *(.+): *(\d+)'  # (user_name: music_num)
 
 
 def get_user_names(round: Round) -> Set[str]:
-    return set([submission.user_name for submission in round.submissions])
+    return set(get_round_view(round).user_names)
 
 
 def get_guesser_names(round: Round) -> Set[str]:
-    return set([submission.user_name for submission in round.submissions if submission.guesses])
+    return get_round_view(round).guesser_names
 
 
 def get_music_numbers(round: Round) -> Set[int]:
-    return set(range(len(round.submissions)))
+    return get_round_view(round).music_numbers
 
 
 def get_abs_round_link(round: Round):
@@ -62,19 +67,15 @@ def process_guess_form(round: Round, guess_form) -> Dict[str, int]:
     guesser_submission = next(
         submission for submission in round.submissions if submission.user_name == guess_form.name.data)
 
-    # In order of the original submissions, add all guesses to the database
+    # Determine whether each guess was correct (the music number is
+    # the submission's shuffled position)
+    guesses = {}
     for submission in round.submissions:
-        # Get the music number guess
         music_num = guess_field[submission.user_name]
+        guesses[submission.user_name] = (music_num, submission.shuffled_pos == music_num)
 
-        # Determine whether the guess was correct
-        if submission.user_name == get_shuffled_user_name_list(round)[music_num]:
-            correct = True
-        else:
-            correct = False
-
-        # Add a guess to the database
-        add_guess_to_db(guesser_submission.id, submission.user_name, music_num, correct)
+    # Add all of the guesses to the database at once
+    add_guesses_to_db(guesser_submission.id, guesses)
 
 
 @retry_after_auth()
@@ -87,13 +88,15 @@ def create_playlist(round_long_id, name) -> SpotifyPlaylist:
     become stale in some way by the time the function is retried.
     """
     # Get the round from the long id
-    round = Round.query.filter_by(long_id=round_long_id).first()
+    round = get_round(round_long_id)
 
     # Get a list of the tracks in the round (in the 'shuffled' order)
     tracks = get_shuffled_music_list(round)
 
-    # Make the playlist
-    new_playlist = spotify_user.create_playlist(name, tracks)
+    # Make the playlist (for the logged in user, if they're registered)
+    identity = get_user_identity()
+    new_playlist = spotify_user.create_playlist(
+        name, tracks, spotify_user_id=identity.spotify_user_id if identity is not None else None)
 
     # Add the playlist to the database
     round.playlist_link = new_playlist.link
@@ -114,24 +117,14 @@ def get_snoozin_rec(round: Round) -> SpotifyMusic:
     """
     snoozin_rec = None
     if round.snoozin_rec_type == SnoozinRecType.random:
-        rw_gen = random_words.RandomWords()
-        num_words = random.randint(1, 2)
-
-        search_term = ""
-        num_attempts = 0
-        while snoozin_rec is None:
-            if num_attempts > MAX_SNOOZIN_REC_SEARCH_ATTEMPTS:
-                raise MusicrecsAlert("We're having trouble getting a rec from snoozin...",
-                                     redirect_location=url_for("round.index", long_id=round.long_id))
-
-            search_term = " ".join(
-                rw_gen.get_random_words(num_words)
-            )
-            search_results = spotify_iface.search_for_music(
-                round.music_type, search_term, num_results=1, popularity_threshold=15)
-            if len(search_results):
-                snoozin_rec = search_results[0]
-            num_attempts += 1
+        # Use a rec from the pool of recs that were found ahead of time,
+        # and only search now if the pool is empty
+        random_rec = snoozin_rec_pool.pop(round.music_type) or search_for_random_rec(round.music_type)
+        if random_rec is None:
+            raise MusicrecsAlert("We're having trouble getting a rec from snoozin...",
+                                 redirect_location=url_for("round.index", long_id=round.long_id))
+
+        snoozin_rec, search_term = random_rec
 
         # Set the round's search term
         round.snoozin_rec_search_term = search_term
@@ -145,38 +138,74 @@ def get_snoozin_rec(round: Round) -> SpotifyMusic:
     return snoozin_rec
 
 
-def get_shuffled_music_submissions(round: Round) -> Dict[str, SpotifyMusic]:
-    """Get the shuffled dictionary of usernames paired with
-    the music they submitted for the round
-    """
-    # Make a list large enough to hold the submissions
-    shuffled_music_submissions = [None] * len(round.submissions)
+def search_for_random_rec(music_type: MusicType) -> Union[Tuple[SpotifyMusic, str], None]:
+    """Search random 1 or 2 word phrases in spotify until one of them finds
+    music that is popular enough. Return the music and its search term, or
+    None if nothing was found.
 
-    # Shuffle the submissions if they haven't been already
-    _shuffle_music_submissions(round)
+    Several searches run at once on a small pool of workers, and the first
+    one to find music wins. Searching gives up after too many attempts or
+    once the search timeout has passed.
+    """
+    rw_gen = random_words.RandomWords()
+    num_words = random.randint(1, 2)
+
+    num_workers = current_app.config["SNOOZIN_REC_SEARCH_WORKERS"]
+    deadline = time.monotonic() + current_app.config["SNOOZIN_REC_SEARCH_TIMEOUT"]
+
+    def search(search_term):
+        return search_term, spotify_iface.search_for_music(
+            music_type, search_term, num_results=1, popularity_threshold=15)
+
+    executor = ThreadPoolExecutor(max_workers=num_workers)
+    pending = set()
+    num_attempts = 0
+    try:
+        while True:
+            # Keep every worker busy with a search
+            while len(pending) < num_workers and num_attempts <= MAX_SNOOZIN_REC_SEARCH_ATTEMPTS:
+                pending.add(executor.submit(search, " ".join(rw_gen.get_random_words(num_words))))
+                num_attempts += 1
+
+            time_left = deadline - time.monotonic()
+            if not pending or time_left <= 0:
+                break
+
+            # Use the first search that found something
+            done, pending = wait(pending, timeout=time_left, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    search_term, search_results = future.result()
+                except SpotifyException:
+                    continue
+
+                if len(search_results):
+                    return search_results[0], search_term
+    finally:
+        # Drop the searches that haven't started, and let the running ones
+        # finish in the background
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
 
-    # Add a tuple of user_name and music at the 'shuffled position' of the new list
-    for submission in round.submissions:
-        shuffled_music_submissions[submission.shuffled_pos] = (
-            submission.user_name,
-            spotify_iface.get_music_from_link(round.music_type, submission.spotify_link)
-        )
+    return None
 
-    # Make sure that every spot in the list was filled
-    assert all(shuffled_music_submissions)
 
-    # Return as a dictionary of submissions in the shuffled order
-    return {user_name: music for user_name, music in shuffled_music_submissions}
+def get_shuffled_music_submissions(round: Round) -> Dict[str, SpotifyMusic]:
+    """Get the shuffled dictionary of usernames paired with
+    the music they submitted for the round
+    """
+    return dict(zip(get_shuffled_user_name_list(round), get_shuffled_music_list(round)))
 
 
 def get_shuffled_music_list(round: Round) -> List[SpotifyMusic]:
     """Get a list of the shuffled music"""
-    return list(get_shuffled_music_submissions(round).values())
+    return _get_shuffled_round_view(round).shuffled_musics
 
 
 def get_shuffled_user_name_list(round: Round) -> List[str]:
     """Get a list of the user names in the shuffled music order"""
-    return list(get_shuffled_music_submissions(round).keys())
+    return _get_shuffled_round_view(round).shuffled_user_names
 
 
 def is_current_user_in_round(round: Round) -> bool:
@@ -219,40 +248,15 @@ def round_created_date(round) -> str:
 """PRIVATE FUNCTIONS"""
 
 
-def _shuffle_music_submissions(round: Round, reshuffle=False):
-    """Shuffle the submissions in the round by storing a random
-    'shuffled_pos' in each db entry.
+def _get_shuffled_round_view(round: Round) -> RoundView:
+    round_view = get_round_view(round)
 
-    By default, this will have no effect if the submissions have
-    already been shuffled, but that behavior can be overridden by
-    passing `reshuffle=True`.
-    """
-    # Bail if we've already shuffled (unless `reshuffle` was specified)
-    if (round.submissions[0].shuffled_pos is not None) and (not reshuffle):
-        return
-
-    # Create a random order on integers from 0 to the number of submissions
-    # Ex for 6 submissions: `[4, 3, 5, 0, 1, 2]` (first submitted should be
-    # shuffled to the fourth spot, second submitted should be shuffled to
-    # the third spot etc.)
-    rand_order = list(range(len(round.submissions)))
-    random.shuffle(rand_order)
-
-    # Assign each submission a 'shuffled position' using the `rand_order`
-    for submission, rand_num in zip(
-        round.submissions,
-        rand_order
-    ):
-        submission.shuffled_pos = rand_num
-
-    # commit the shuffled possitions to the database
-    db.session.commit()
+    if round_view.shuffled_musics is None:
+        raise MusicrecsError("The round's music isn't shuffled until the submit phase is over")
+
+    return round_view
 
 
 def _get_music_list(round: Round) -> List[SpotifyMusic]:
     """Get a list of the music in the round in the order it was submitted"""
-    return [
-        spotify_iface.get_music_from_link(
-            round.music_type, submission.spotify_link
-        ) for submission in round.submissions
-    ]
+    return [music for music in get_submissions_music(round.music_type, round.submissions) if music is not None]
@@ -0,0 +1,161 @@
+"""A view of everything derived from a round's submissions that is
+needed to show and process the round.
+
+Building a view can mean shuffling the submissions and resolving their
+music, so views are memoized for the rest of the request and cached
+across requests under the round's version. Anything that changes the
+round's submissions or guesses bumps the version (see
+`musicrecs.database.helpers.bump_round_version`), so stale views are
+never used.
+"""
+
+import random
+from typing import List, Set, Union
+
+from flask import g
+from sqlalchemy import update
+
+from musicrecs import db
+from musicrecs import cache
+from musicrecs.database.models import Round, Submission
+from musicrecs.database.helpers import bump_round_version, get_round_version, get_submissions_music
+from musicrecs.database.replica import read_from_replica
+from musicrecs.enums import RoundStatus
+from musicrecs.errors.exceptions import MusicrecsError
+from musicrecs.spotify.item.spotify_music import SpotifyMusic
+
+
+class RoundView:
+    """Holds the user names, guessers and music numbers of a round, and once
+    the submit phase is over, the shuffled user names and music.
+    """
+
+    def __init__(self, round: Round):
+        # User names in the order they were submitted
+        self.user_names: List[str] = [submission.user_name for submission in round.submissions]
+
+        # User names of submitters that have guessed
+        self.guesser_names: Set[str] = set(
+            submission.user_name for submission in round.submissions if submission.guesses)
+
+        # The numbers that the music is labeled with
+        self.music_numbers: Set[int] = set(range(len(round.submissions)))
+
+        # User names and their music, in the shuffled order. Submissions
+        # aren't shuffled until everyone has submitted.
+        self.shuffled_user_names: Union[List[str], None] = None
+        self.shuffled_musics: Union[List[SpotifyMusic], None] = None
+        if round.status != RoundStatus.submit and round.submissions:
+            self._set_shuffled_music(round)
+
+    def _set_shuffled_music(self, round: Round):
+        # Shuffle the submissions if they haven't been already
+        _shuffle_music_submissions(round)
+
+        # Resolve the music of all the submissions at once
+        musics = get_submissions_music(round.music_type, round.submissions)
+
+        # Put the user names and music at the 'shuffled position' of the lists
+        self.shuffled_user_names = [None] * len(round.submissions)
+        self.shuffled_musics = [None] * len(round.submissions)
+        for submission, music in zip(round.submissions, musics):
+            if music is None:
+                raise MusicrecsError(
+                    f"Couldn't get the {round.music_type.name} {submission.spotify_link} from spotify")
+
+            self.shuffled_user_names[submission.shuffled_pos] = submission.user_name
+            self.shuffled_musics[submission.shuffled_pos] = music
+
+        # Make sure that every spot in the list was filled
+        assert all(self.shuffled_user_names)
+
+
+def get_round_view(round: Round) -> RoundView:
+    """Get the view of the round at its current version"""
+    key = f"round_view/{round.id}/{get_round_version(round.id)}"
+
+    # Check the views already used in this request
+    views = g.setdefault("round_views", {})
+    if key in views:
+        return views[key]
+
+    # Check the shared cache, and build the view if it isn't there
+    view = cache.get(key)
+    if view is None:
+        view = RoundView(round)
+
+        # Building the view may have shuffled the round, which gives it a
+        # new version
+        key = f"round_view/{round.id}/{get_round_version(round.id)}"
+        cache.set(key, view)
+
+    views[key] = view
+
+    return view
+
+
+def shuffle_submissions(submissions: List[Submission]):
+    """Give each of the submissions a random 'shuffled_pos', to be
+    committed along with the round leaving the submit phase
+    """
+    rand_order = list(range(len(submissions)))
+    random.shuffle(rand_order)
+
+    for submission, rand_num in zip(submissions, rand_order):
+        submission.shuffled_pos = rand_num
+
+
+"""PRIVATE FUNCTIONS"""
+
+
+def _shuffle_music_submissions(round: Round, reshuffle=False):
+    """Shuffle the submissions in the round by storing a random
+    'shuffled_pos' in each db entry.
+
+    By default, this will have no effect if the submissions have
+    already been shuffled, but that behavior can be overridden by
+    passing `reshuffle=True`.
+    """
+    # Bail if we've already shuffled (unless `reshuffle` was specified)
+    if (round.submissions[0].shuffled_pos is not None) and (not reshuffle):
+        return
+
+    # Create a random order on integers from 0 to the number of submissions
+    # Ex for 6 submissions: `[4, 3, 5, 0, 1, 2]` (first submitted should be
+    # shuffled to the fourth spot, second submitted should be shuffled to
+    # the third spot etc.)
+    rand_order = list(range(len(round.submissions)))
+    random.shuffle(rand_order)
+
+    # Assign each submission a 'shuffled position' using the `rand_order`.
+    # Unless reshuffling, the updates are conditional on the submission not
+    # being shuffled yet, so if requests race (or the round was read from a
+    # replica that hasn't caught up with a shuffle), only one shuffle is kept.
+    shuffled = True
+    for submission, rand_num in zip(
+        round.submissions,
+        rand_order
+    ):
+        stmt = update(Submission).where(Submission.id == submission.id)
+        if not reshuffle:
+            stmt = stmt.where(Submission.shuffled_pos.is_(None))
+        result = db.session.execute(
+            stmt.values(shuffled_pos=rand_num).execution_options(synchronize_session=False))
+        if result.rowcount != 1:
+            shuffled = False
+            break
+
+    if shuffled:
+        # commit the shuffled possitions to the database, and invalidate
+        # anything cached about the round
+        db.session.commit()
+        bump_round_version(round.id)
+    else:
+        # The submissions were already shuffled
+        db.session.rollback()
+
+    # Load the shuffled positions that were committed from the primary
+    # (a replica may not have them yet)
+    with read_from_replica(False):
+        for submission in round.submissions:
+            db.session.refresh(submission)
@@ -0,0 +1,80 @@
+"""Pools of snoozin random recs that have already been found,
+so that advancing a round doesn't have to wait on random searches.
+
+The pools are filled by the `refill_snoozin_rec_pools` background task,
+and emptied by `get_snoozin_rec`.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Tuple, Union
+
+from musicrecs.enums import MusicType
+from musicrecs.spotify.item.spotify_music import SpotifyMusic
+
+
+class SnoozinRecPool:
+    """A pool of random recs, along with the search term that found
+    them, for each music type.
+
+    - `size` is the number of recs to fill each pool up to
+    - `low_watermark` is the number of recs a pool has to fall below
+      before it needs refilling
+    - `timeout` is how long a rec can stay in the pool (in seconds)
+    """
+
+    def __init__(self, size=10, low_watermark=5, timeout=60 * 60 * 6):
+        self.size = size
+        self.low_watermark = low_watermark
+        self.timeout = timeout
+
+        self._pools = {music_type: deque() for music_type in MusicType}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.size = app.config["SNOOZIN_REC_POOL_SIZE"]
+        self.low_watermark = app.config["SNOOZIN_REC_POOL_LOW_WATERMARK"]
+        self.timeout = app.config["SNOOZIN_REC_POOL_TIMEOUT"]
+
+    def add(self, music_type: MusicType, music: SpotifyMusic, search_term: str):
+        with self._lock:
+            self._pools[music_type].append((music, search_term, time.monotonic()))
+
+    def pop(self, music_type: MusicType) -> Union[Tuple[SpotifyMusic, str], None]:
+        """Take the oldest unexpired rec and its search term out of the pool.
+        Return None if the pool is empty.
+        """
+        with self._lock:
+            self._remove_expired(music_type)
+
+            if self._pools[music_type]:
+                music, search_term, _ = self._pools[music_type].popleft()
+                return music, search_term
+
+        return None
+
+    def count(self, music_type: MusicType) -> int:
+        """Get the number of unexpired recs in the pool"""
+        with self._lock:
+            self._remove_expired(music_type)
+            return len(self._pools[music_type])
+
+    def needs_refill(self, music_type: MusicType) -> bool:
+        return self.count(music_type) < self.low_watermark
+
+    def clear(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.clear()
+
+    def _remove_expired(self, music_type: MusicType):
+        # Recs are added in order, so the expired ones are all at the front
+        pool = self._pools[music_type]
+        expired_before = time.monotonic() - self.timeout
+        while pool and pool[0][2] < expired_before:
+            pool.popleft()
+
+
+# The pool used by this process
+snoozin_rec_pool = SnoozinRecPool()
@@ -0,0 +1,165 @@
+"""Asyncio interface to spotify that uses the client credentials
+`Spotify` interface underneath. It has the same public functions as
+`Spotify`, as coroutines, so that paths that make many spotify calls can
+make them all at once instead of one after another.
+
+spotipy is synchronous, so the calls themselves run on a bounded pool of
+worker threads, sharing the keep-alive connections of the request layer
+(see `spotify_requests`). The coroutines run on an event loop in a
+background thread, and `run` is a sync facade to wait on them from flask
+views and tasks.
+
+Ex:
+    musics = async_spotify_iface.run(
+        async_spotify_iface.get_musics_from_links(MusicType.album, links))
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Union
+
+from .spotify import Spotify, MAX_ALBUMS_PER_REQUEST, MAX_TRACKS_PER_REQUEST
+from .item.spotify_music import SpotifyMusic
+from .item.spotify_playlist import SpotifyPlaylist
+from musicrecs.enums import MusicType
+
+
+"""Default number of spotify calls that can be in flight at once"""
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class AsyncSpotify:
+    """Class to interface with Spotify API through coroutines that
+    run the calls of a `Spotify` interface with bounded concurrency.
+
+    - `max_concurrency` is the most calls that can be in flight at once
+      across every call site. Each call can also pass its own (smaller)
+      `max_concurrency` to bound just the calls that it fans out to.
+    """
+
+    def __init__(self, spotify: Spotify, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.spotify = spotify
+        self.max_concurrency = max_concurrency
+
+        self._app = None
+        self._executor = None
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    """Public Functions"""
+
+    def init_app(self, app):
+        """Use the app's settings, and give the calls the app's context
+        (the spotify interface's shared cache needs it)
+        """
+        self.shutdown()
+        self._app = app
+        self.max_concurrency = app.config["SPOTIFY_ASYNC_MAX_CONCURRENCY"]
+
+    def run(self, coro, timeout=None):
+        """Sync facade: run the coroutine on the background event loop and
+        wait for its result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result(timeout)
+
+    def shutdown(self):
+        """Stop the background event loop and worker threads. They are
+        started again the next time they are needed.
+        """
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+                self._semaphore = None
+
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    async def search_for_music(self,
+                               music_type: MusicType,
+                               search_term: str,
+                               num_results: int = 1,
+                               popularity_threshold: int = None) -> List[SpotifyMusic]:
+        return await self._call(
+            self.spotify.search_for_music, music_type, search_term, num_results, popularity_threshold)
+
+    async def recommend_music(self, music_type: MusicType, music_list: List[SpotifyMusic]) -> SpotifyMusic:
+        return await self._call(self.spotify.recommend_music, music_type, music_list)
+
+    async def get_music_from_link(self, music_type: MusicType, link: str) -> SpotifyMusic:
+        return await self._call(self.spotify.get_music_from_link, music_type, link)
+
+    async def get_musics_from_links(self,
+                                    music_type: MusicType,
+                                    links: List[str],
+                                    max_concurrency: int = None) -> List[Union[SpotifyMusic, None]]:
+        """Use a list of spotify links to get a list of `SpotifyMusic` objects
+        in the same order, requesting each batch of links at the same time.
+        """
+        batch_size = MAX_ALBUMS_PER_REQUEST if music_type == MusicType.album else MAX_TRACKS_PER_REQUEST
+        batches = [links[start:start + batch_size] for start in range(0, len(links), batch_size)]
+
+        batch_musics = await self.gather(
+            [partial(self.spotify.get_musics_from_links, music_type, batch) for batch in batches],
+            max_concurrency=max_concurrency)
+
+        return [music for musics in batch_musics for music in musics]
+
+    async def get_playlist_from_link(self, link: str) -> SpotifyPlaylist:
+        return await self._call(self.spotify.get_playlist_from_link, link)
+
+    async def spotify_link_invalid(self, music_type: MusicType, spotify_link: str) -> bool:
+        return await self._call(self.spotify.spotify_link_invalid, music_type, spotify_link)
+
+    async def gather(self, calls, max_concurrency: int = None) -> list:
+        """Make the calls (functions that take no arguments) at the same time,
+        with at most `max_concurrency` of them in flight, and get their
+        results in the same order
+        """
+        call_site_semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        return await asyncio.gather(*(self._call(call, semaphore=call_site_semaphore) for call in calls))
+
+    """Private Functions"""
+
+    async def _call(self, func, *args, semaphore: asyncio.Semaphore = None):
+        """Make a spotify call on a worker thread, once there's room for it"""
+        if semaphore is not None:
+            async with semaphore:
+                return await self._call(func, *args)
+
+        # The semaphore is made on the event loop's thread, the first time it's needed
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(self._in_app_context, func, *args))
+
+    def _in_app_context(self, func, *args):
+        if self._app is None:
+            return func(*args)
+
+        with self._app.app_context():
+            return func(*args)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Get the background event loop, starting it if it isn't running"""
+        with self._lock:
+            if self._loop is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="async_spotify")
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._run_loop, args=(self._loop,), name="async_spotify_loop", daemon=True).start()
+
+            return self._loop
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop):
+        # Runs until `shutdown` stops the loop
+        loop.run_forever()
+        loop.close()
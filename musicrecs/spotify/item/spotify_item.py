@@ -16,8 +16,24 @@ class SpotifyItem():
         # url for image of item
         self.img_url = None
 
+    def to_dict(self):
+        """Get a dictionary shaped like the spotify api item that this
+        was made from, holding only the information kept by this object.
+        Passing it back to the constructor makes an equivalent object.
+        """
+        return {"name": self.name, "external_urls": {"spotify": self.link}, "id": self.id}
+
     def _set_image_url(self, images):
+        img_url = self._get_image_url(images, self.IMG_DIMEN)
+        if img_url is not None:
+            self.img_url = img_url
+
+    def _get_image_url(self, images, dimen):
         for img in images:
-            if img["height"] == self.IMG_DIMEN and img["width"] == self.IMG_DIMEN:
-                self.img_url = img["url"]
-                break
+            if img["height"] == dimen and img["width"] == dimen:
+                return img["url"]
+
+        return None
+
+    def _get_image_dicts(self, img_url, dimen):
+        return [{"url": img_url, "height": dimen, "width": dimen}] if img_url else []
@@ -23,6 +23,11 @@ class SpotifyMusic(SpotifyItem):
     def format_for_response_dict(self):
         return {"music_name": str(self), "music_img_url": self.img_url, "music_link": self.link}
 
+    def to_dict(self):
+        spotify_music = super().to_dict()
+        spotify_music["artists"] = [artist.to_dict() for artist in self.artists]
+        return spotify_music
+
     def get_primary_artist(self):
         return self.artists[0]
 
@@ -52,6 +57,12 @@ class SpotifyAlbum(SpotifyMusic):
         # Set the release year
         self._set_release_date(spotify_album["release_date"])
 
+    def to_dict(self):
+        spotify_album = super().to_dict()
+        spotify_album["images"] = self._get_image_dicts(self.img_url, self.IMG_DIMEN)
+        spotify_album["release_date"] = self.release_date
+        return spotify_album
+
 
 class SpotifyTrack(SpotifyMusic):
     """Class to hold selected information about a spotify track."""
@@ -68,5 +79,16 @@ class SpotifyTrack(SpotifyMusic):
         # Get image url with given IMG_DIMEN
         self._set_image_url(spotify_track["album"]["images"])
 
+        # Get the larger image url of the track's album
+        self.album_img_url = self._get_image_url(spotify_track["album"]["images"], SpotifyAlbum.IMG_DIMEN)
+
         # Set the release date (of the album)
         self._set_release_date(spotify_track["album"]["release_date"])
+
+    def to_dict(self):
+        spotify_track = super().to_dict()
+        spotify_track["album"] = self.album_item.to_dict()
+        spotify_track["album"]["images"] = (self._get_image_dicts(self.img_url, self.IMG_DIMEN)
+                                            + self._get_image_dicts(self.album_img_url, SpotifyAlbum.IMG_DIMEN))
+        spotify_track["album"]["release_date"] = self.release_date
+        return spotify_track
@@ -0,0 +1,117 @@
+"""Small, thread-safe, in-process LRU cache with optional
+expiration of entries.
+
+This is used as the fast 'first tier' in front of slower shared
+stores (like the flask cache) and spotify itself.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Least-recently-used cache holding at most `maxsize` entries.
+
+    If `timeout` is given (in seconds), entries older than the timeout
+    are treated as missing. A `timeout` of None or 0 means entries
+    never expire.
+    """
+
+    def __init__(self, maxsize=128, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    """Public Functions"""
+
+    def get(self, key, default=None):
+        """Get the value for `key`, marking it as most recently used.
+
+        Return `default` if the key is missing or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store `value` under `key`, evicting the least recently used
+        entries if the cache is full. `timeout` overrides the cache's
+        default timeout for this entry.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout else None
+
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def peek(self, key, default=None):
+        """Get the value for `key` without marking it as used (or counting
+        it in the stats). Return `default` if the key is missing or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+                return default
+
+            return entry[0]
+
+    def delete(self, key):
+        """Remove `key` from the cache. Return whether it was present."""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def keys(self):
+        """Get a snapshot of the keys, from least to most recently used"""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def stats(self):
+        """Get a dictionary of the cache's usage statistics"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
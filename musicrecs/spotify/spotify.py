@@ -7,8 +7,10 @@ spotify link.
 """
 
 import random
+import re
 import copy
-from typing import List
+import threading
+from typing import Dict, List, Union
 
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
@@ -16,6 +18,8 @@ from spotipy.exceptions import SpotifyException
 
 from .item.spotify_music import SpotifyMusic, SpotifyAlbum, SpotifyTrack
 from .item.spotify_playlist import SpotifyPlaylist
+from .lru_cache import LRUCache
+from .spotify_requests import spotify_requests
 from musicrecs.enums import MusicType
 
 
@@ -24,17 +28,86 @@ in spotipy's "recommendations" function
 """
 MAX_REC_SEEDS = 5
 
+"""Maximum number of ids that can be passed to spotipy's
+multi-get "tracks" and "albums" functions
+"""
+MAX_TRACKS_PER_REQUEST = 50
+MAX_ALBUMS_PER_REQUEST = 20
+MAX_ARTISTS_PER_REQUEST = 50
+
+"""Default settings of the resolved music cache. The local
+cache lives in each process, the shared cache is the flask cache
+passed in to `init_music_cache`. Timeouts are in seconds.
+"""
+DEFAULT_MUSIC_CACHE_SIZE = 1024
+DEFAULT_MUSIC_CACHE_LOCAL_TIMEOUT = 60 * 60
+DEFAULT_MUSIC_CACHE_SHARED_TIMEOUT = 60 * 60 * 24
+
+"""Default settings of the artist popularity cache. Popularity
+changes slowly, so it can be kept for a while.
+"""
+DEFAULT_POPULARITY_CACHE_SIZE = 4096
+DEFAULT_POPULARITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+"""Matches open.spotify links and spotify uris, capturing the
+item type and the item id
+"""
+SPOTIFY_LINK_PATTERN = re.compile(
+    r'^(?:https?://open\.spotify\.com/(\w+)/|spotify:(\w+):)([0-9A-Za-z]{22})(?:[?#].*)?$')
+
 
 class Spotify:
     """Class to interface with Spotify API through an
     instance of client credentials authenticated spotipy.
     """
 
+    def __init__(self):
+        self.sp = None
+
+        # Two tier cache of resolved music (local LRU, then shared store)
+        self._music_cache = LRUCache(DEFAULT_MUSIC_CACHE_SIZE, DEFAULT_MUSIC_CACHE_LOCAL_TIMEOUT)
+        self._shared_music_cache = None
+        self._shared_music_cache_timeout = DEFAULT_MUSIC_CACHE_SHARED_TIMEOUT
+        self._shared_music_cache_hits = 0
+        self._shared_music_cache_misses = 0
+        self._shared_music_cache_stats_lock = threading.Lock()
+
+        # Cache of artist popularity
+        self._popularity_cache = LRUCache(DEFAULT_POPULARITY_CACHE_SIZE, DEFAULT_POPULARITY_CACHE_TIMEOUT)
+
     """Public Functions"""
 
     def init_sp(self):
+        """Create the spotipy instance. Its requests go through the shared,
+        rate limited request layer (see `spotify_requests`).
+        """
         self.sp = spotipy.Spotify(
-            client_credentials_manager=SpotifyClientCredentials())
+            client_credentials_manager=SpotifyClientCredentials(),
+            requests_session=spotify_requests)
+
+    def init_music_cache(self,
+                         shared_cache=None,
+                         size=DEFAULT_MUSIC_CACHE_SIZE,
+                         local_timeout=DEFAULT_MUSIC_CACHE_LOCAL_TIMEOUT,
+                         shared_timeout=DEFAULT_MUSIC_CACHE_SHARED_TIMEOUT):
+        """Configure the cache that sits in front of `get_music_from_link`.
+
+        Resolved music is first looked up in a bounded in-process LRU cache
+        of `size` entries, and then in the `shared_cache` (any cache with
+        `get`/`set`/`delete`, like the flask cache), before asking spotify.
+        """
+        self._music_cache = LRUCache(size, local_timeout)
+        self._shared_music_cache = shared_cache
+        self._shared_music_cache_timeout = shared_timeout
+        with self._shared_music_cache_stats_lock:
+            self._shared_music_cache_hits = 0
+            self._shared_music_cache_misses = 0
+
+    def init_popularity_cache(self, size=DEFAULT_POPULARITY_CACHE_SIZE, timeout=DEFAULT_POPULARITY_CACHE_TIMEOUT):
+        """Configure the in-process cache of artist popularity used
+        when searching with a popularity threshold
+        """
+        self._popularity_cache = LRUCache(size, timeout)
 
     def search_for_music(self,
                          music_type: MusicType,
@@ -50,6 +123,11 @@ class Spotify:
         search = self.sp.search(search_term, type=music_type.name, limit=num_results)
         music_items = search[f'{music_type.name}s']['items']
 
+        # Get the popularity of all the artists in the search results at once
+        if popularity_threshold is not None:
+            artist_popularities = self._get_artist_popularities(
+                [artist['id'] for music_item in music_items for artist in music_item['artists']])
+
         # Go through the music items brought up in the search
         spotify_musics = []
         if len(music_items):
@@ -57,7 +135,8 @@ class Spotify:
                 # If the popularity is above the threshold, then return
                 # the item
                 if popularity_threshold is None or \
-                        self._get_artists_popularity(music_item['artists']) >= popularity_threshold:
+                        self._get_artists_popularity(music_item['artists'],
+                                                     artist_popularities) >= popularity_threshold:
                     if music_type == MusicType.album:
                         if music_item['album_type'] == "album":
                             spotify_musics.append(SpotifyAlbum(music_item))
@@ -80,13 +159,86 @@ class Spotify:
             return self._recommend_track(music_list)
 
     def get_music_from_link(self, music_type, link):
-        """Use spotify link to get `SpotifyMusic` object"""
-        if music_type == MusicType.album:
-            spotify_album = self.sp.album(link)
-            return SpotifyAlbum(spotify_album)
-        elif music_type == MusicType.track:
-            spotify_track = self.sp.track(link)
-            return SpotifyTrack(spotify_track)
+        """Use spotify link to get `SpotifyMusic` object
+
+        The music is taken from the music cache if it has been resolved
+        before, otherwise it is requested from spotify and cached.
+        """
+        music_id = self._get_music_id(music_type, link)
+
+        # Links we can't parse are left to spotify to accept or reject
+        if music_id is None:
+            return self._request_music(music_type, link)
+
+        music = self._get_cached_music(music_type, music_id)
+        if music is None:
+            music = self._request_music(music_type, music_id)
+            self._cache_music(music_type, music_id, music)
+
+        return music
+
+    def get_musics_from_links(self, music_type: MusicType, links: List[str]) -> List[Union[SpotifyMusic, None]]:
+        """Use a list of spotify links to get a list of `SpotifyMusic` objects
+        in the same order.
+
+        Music that isn't in the music cache is requested with spotify's
+        multi-get endpoints, so a whole round costs one or two requests. A link
+        that can't be resolved gets `None` in its place, instead of failing
+        the rest of the list.
+        """
+        musics = [None] * len(links)
+
+        # Fill in cached music, and keep track of the positions of the
+        # music that still needs to be requested
+        missing_positions = {}
+        for pos, link in enumerate(links):
+            music_id = self._get_music_id(music_type, link)
+
+            if music_id is None:
+                musics[pos] = self._try_get_music_from_link(music_type, link)
+                continue
+
+            music = self._get_cached_music(music_type, music_id)
+            if music is None:
+                missing_positions.setdefault(music_id, []).append(pos)
+            else:
+                musics[pos] = music
+
+        # Request the missing music in batches
+        missing_ids = list(missing_positions)
+        batch_size = MAX_ALBUMS_PER_REQUEST if music_type == MusicType.album else MAX_TRACKS_PER_REQUEST
+        for start in range(0, len(missing_ids), batch_size):
+            batch_ids = missing_ids[start:start + batch_size]
+
+            for music_id, music in zip(batch_ids, self._request_musics(music_type, batch_ids)):
+                if music is not None:
+                    self._cache_music(music_type, music_id, music)
+                    for pos in missing_positions[music_id]:
+                        musics[pos] = music
+
+        return musics
+
+    def invalidate_music(self, music_type: MusicType, link: str):
+        """Remove the music at the given link from both cache tiers"""
+        music_id = self._get_music_id(music_type, link)
+        if music_id is not None:
+            self._music_cache.delete((music_type, music_id))
+            if self._shared_music_cache is not None:
+                self._shared_music_cache.delete(self._shared_music_cache_key(music_type, music_id))
+
+    def clear_music_cache(self):
+        """Clear the local music cache. (The shared cache is left
+        alone, since it may be holding things other than music)
+        """
+        self._music_cache.clear()
+
+    def get_music_cache_stats(self):
+        """Get usage statistics of the music cache"""
+        stats = self._music_cache.stats()
+        with self._shared_music_cache_stats_lock:
+            stats["shared_hits"] = self._shared_music_cache_hits
+            stats["shared_misses"] = self._shared_music_cache_misses
+        return stats
 
     def get_playlist_from_link(self, link):
         """Use spotify playlist link to get `SpotifyPlaylist` object"""
@@ -103,6 +255,72 @@ class Spotify:
 
     """Private Functions"""
 
+    def _request_music(self, music_type: MusicType, link: str) -> SpotifyMusic:
+        if music_type == MusicType.album:
+            spotify_album = self.sp.album(link)
+            return SpotifyAlbum(spotify_album)
+        elif music_type == MusicType.track:
+            spotify_track = self.sp.track(link)
+            return SpotifyTrack(spotify_track)
+
+    def _request_musics(self, music_type: MusicType, music_ids: List[str]) -> List[Union[SpotifyMusic, None]]:
+        """Request a batch of music from spotify's multi-get endpoint. If
+        spotify rejects the batch, fall back to requesting each id on its own
+        so that one bad id only fails itself.
+        """
+        try:
+            if music_type == MusicType.album:
+                items = self.sp.albums(music_ids)["albums"]
+                return [SpotifyAlbum(item) if item else None for item in items]
+            elif music_type == MusicType.track:
+                items = self.sp.tracks(music_ids)["tracks"]
+                return [SpotifyTrack(item) if item else None for item in items]
+        except SpotifyException:
+            return [self._try_get_music_from_link(music_type, music_id) for music_id in music_ids]
+
+    def _try_get_music_from_link(self, music_type: MusicType, link: str) -> Union[SpotifyMusic, None]:
+        try:
+            return self.get_music_from_link(music_type, link)
+        except SpotifyException:
+            return None
+
+    def _get_cached_music(self, music_type: MusicType, music_id: str) -> Union[SpotifyMusic, None]:
+        music = self._music_cache.get((music_type, music_id))
+
+        if music is None and self._shared_music_cache is not None:
+            music = self._shared_music_cache.get(self._shared_music_cache_key(music_type, music_id))
+            # The music is looked up from several threads at once
+            with self._shared_music_cache_stats_lock:
+                if music is None:
+                    self._shared_music_cache_misses += 1
+                else:
+                    self._shared_music_cache_hits += 1
+
+            if music is not None:
+                self._music_cache.set((music_type, music_id), music)
+
+        return music
+
+    def _cache_music(self, music_type: MusicType, music_id: str, music: SpotifyMusic):
+        self._music_cache.set((music_type, music_id), music)
+        if self._shared_music_cache is not None:
+            self._shared_music_cache.set(self._shared_music_cache_key(music_type, music_id),
+                                         music,
+                                         timeout=self._shared_music_cache_timeout)
+
+    def _shared_music_cache_key(self, music_type: MusicType, music_id: str):
+        return f"spotify_music/{music_type.name}/{music_id}"
+
+    def _get_music_id(self, music_type: MusicType, link: str) -> Union[str, None]:
+        """Get the spotify id from a spotify link or uri of the given music
+        type. Return None if it isn't one.
+        """
+        match = SPOTIFY_LINK_PATTERN.match(link.strip())
+        if match and (match.group(1) or match.group(2)) == music_type.name:
+            return match.group(3)
+
+        return None
+
     def _recommend_album(self, human_album_recs: List[SpotifyAlbum]) -> SpotifyAlbum:
         # Get artist seeds from the album list passed in
         seed_artists = [album.get_primary_artist().id
@@ -179,7 +397,7 @@ class Spotify:
                 music_list.remove(music)
                 break
 
-    def _get_artists_popularity(self, artists):
+    def _get_artists_popularity(self, artists, artist_popularities):
         """Get the popularity of the most popular artist in the list
         of artists
 
@@ -189,11 +407,29 @@ class Spotify:
         popularity = 0
 
         for artist in artists:
-            artist_popularity = self._get_artist_popularity(artist['id'])
+            artist_popularity = artist_popularities.get(artist['id'], 0)
             if artist_popularity > popularity:
                 popularity = artist_popularity
 
         return popularity
 
-    def _get_artist_popularity(self, artist_id):
-        return self.sp.artist(artist_id)['popularity']
+    def _get_artist_popularities(self, artist_ids: List[str]) -> Dict[str, int]:
+        """Get a dictionary of the popularity of each artist id. Popularity
+        that isn't cached is requested from spotify in batches.
+        """
+        artist_popularities = {}
+        missing_ids = []
+        for artist_id in dict.fromkeys(artist_ids):
+            popularity = self._popularity_cache.get(artist_id)
+            if popularity is None:
+                missing_ids.append(artist_id)
+            else:
+                artist_popularities[artist_id] = popularity
+
+        for start in range(0, len(missing_ids), MAX_ARTISTS_PER_REQUEST):
+            for artist in self.sp.artists(missing_ids[start:start + MAX_ARTISTS_PER_REQUEST])["artists"]:
+                if artist is not None:
+                    self._popularity_cache.set(artist['id'], artist['popularity'])
+                    artist_popularities[artist['id']] = artist['popularity']
+
+        return artist_popularities
@@ -0,0 +1,261 @@
+"""The request layer under every spotipy instance in musicrecs (the
+client credentials `Spotify` interface and the `spotify_user` instances).
+
+It is a requests session that is shared by all of them, so they share:
+- one pool of keep-alive connections to spotify
+- one token bucket rate limit, which is paused for the `Retry-After`
+  of any rate limited (429) response, and then the request is retried
+- in-flight GET requests: identical requests made at the same time are
+  coalesced into one request to spotify (single-flight)
+
+When spotify's quota is approached, requests wait for their turn instead
+of failing. A request only fails with a 429 `SpotifyException` when it
+would have to wait longer than `max_wait` seconds.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from spotipy.exceptions import SpotifyException
+from urllib3.util.retry import Retry
+
+
+"""Default settings of the request layer. The rate is in requests per
+second, and the waits are in seconds.
+"""
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RATE = 10
+DEFAULT_BURST = 20
+DEFAULT_MAX_WAIT = 30
+DEFAULT_RATE_LIMIT_RETRIES = 3
+
+"""Wait used when a rate limited response doesn't say how long to wait"""
+DEFAULT_RETRY_AFTER = 1
+
+"""Retries of failed connections and server errors, the same as spotipy's
+own session. Rate limited responses are retried by the request layer instead.
+"""
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Token bucket rate limit. Tokens are added at `rate` per second, up to
+    `burst`, and each request takes one. The bucket can be paused, for when
+    spotify asks for requests to stop for a while.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=None) -> bool:
+        """Take a token, waiting until one is available. Return False
+        (without taking a token) if that would mean waiting longer
+        than `max_wait` seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            # Wait for the pause to end, and for the bucket to have a token
+            ready_at = max(now, self._paused_until)
+            if self._tokens < 1:
+                ready_at = max(ready_at, now + (1 - self._tokens) / self.rate)
+
+            wait = ready_at - now
+            if max_wait is not None and wait > max_wait:
+                return False
+
+            # Take the token now (the bucket can go negative), so that the
+            # requests that come after this one wait behind it
+            self._tokens -= 1
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return True
+
+    def pause(self, seconds: float):
+        """Don't give out tokens for `seconds`, and start empty after that"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = min(self._tokens, 0)
+
+    def paused_for(self) -> float:
+        """Get the number of seconds left in the pause"""
+        with self._lock:
+            return max(self._paused_until - time.monotonic(), 0)
+
+    def _refill(self, now: float):
+        # Don't add tokens for the time that the bucket was paused
+        refill_from = max(self._updated, min(self._paused_until, now))
+        self._tokens = min(self.burst, self._tokens + (now - refill_from) * self.rate)
+        self._updated = now
+
+
+class _InFlightRequest:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class SpotifyRequests(requests.Session):
+    """Requests session that rate limits, retries rate limited responses
+    and coalesces identical in-flight GET requests.
+
+    - `pool_size` is the number of keep-alive connections to keep open
+    - `rate` and `burst` are the token bucket's settings
+    - `max_wait` is the longest a request waits for its turn
+    - `rate_limit_retries` is the number of times a rate limited
+      request is retried
+    """
+
+    def __init__(self,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST,
+                 max_wait=DEFAULT_MAX_WAIT,
+                 rate_limit_retries=DEFAULT_RATE_LIMIT_RETRIES):
+        super().__init__()
+
+        self.bucket = TokenBucket(rate, burst)
+        self.max_wait = max_wait
+        self.rate_limit_retries = rate_limit_retries
+
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._stats = {"requests": 0, "coalesced": 0, "rate_limited": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+
+        self._mount_pool(pool_size)
+
+    """Public Functions"""
+
+    def init_app(self, app):
+        self._mount_pool(app.config["SPOTIFY_HTTP_POOL_SIZE"])
+        self.bucket.rate = app.config["SPOTIFY_RATE_LIMIT"]
+        self.bucket.burst = app.config["SPOTIFY_RATE_LIMIT_BURST"]
+        self.max_wait = app.config["SPOTIFY_RATE_LIMIT_MAX_WAIT"]
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:
+        if method.upper() != "GET":
+            return self._send(method, url, *args, **kwargs)
+
+        # Requests for the same url by the same user (authorization)
+        # are the same request
+        key = (
+            url,
+            repr(sorted((kwargs.get("params") or {}).items())),
+            (kwargs.get("headers") or {}).get("Authorization")
+        )
+
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(key)
+            is_leader = in_flight is None
+            if is_leader:
+                in_flight = self._in_flight[key] = _InFlightRequest()
+
+        # Wait for the identical request that is already in flight
+        if not is_leader:
+            self._count("coalesced")
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.response
+
+        try:
+            in_flight.response = self._send(method, url, *args, **kwargs)
+
+            # Read the body now, so the response can be shared by every
+            # request that waited on it
+            in_flight.response.content
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            in_flight.done.set()
+
+        return in_flight.response
+
+    def close(self):
+        """The session is shared by every spotipy instance, which close their
+        session when they're garbage collected, so don't close the connections
+        here. Use `shutdown` to really close them.
+        """
+
+    def shutdown(self):
+        super().close()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, paused_for=self.bucket.paused_for())
+
+    """Private Functions"""
+
+    def _send(self, method, url, *args, **kwargs) -> requests.Response:
+        """Send the request once it's the request's turn, retrying
+        if it is rate limited
+        """
+        for _ in range(self.rate_limit_retries + 1):
+            if not self.bucket.acquire(self.max_wait):
+                self._count("rejected")
+                raise SpotifyException(
+                    429, -1, f"{url}:\n Rate limited for another {self.bucket.paused_for():.0f}s",
+                    headers={"Retry-After": str(int(self.bucket.paused_for()) + 1)})
+
+            self._count("requests")
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code != 429:
+                return response
+
+            # Pause every request until spotify says it's ok to try again
+            self._count("rate_limited")
+            self.bucket.pause(self._get_retry_after(response))
+
+        return response
+
+    def _get_retry_after(self, response: requests.Response) -> float:
+        try:
+            return float(response.headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+        except ValueError:
+            return DEFAULT_RETRY_AFTER
+
+    def _mount_pool(self, pool_size: int):
+        retry = Retry(
+            total=MAX_RETRIES,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+            status=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUS_CODES)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        # Close the connections of the pool that's being replaced
+        for old_adapter in self.adapters.values():
+            old_adapter.close()
+
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+
+# The request layer used by this process
+spotify_requests = SpotifyRequests()
@@ -9,23 +9,44 @@ responsibility to catch this exception and redirect to the authorization
 url and then direct back towards what the user was trying to do.
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
-from typing import List
+import time
+from typing import Iterator, List, Union
 import uuid
 
+import requests
 import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+from spotipy.oauth2 import SpotifyOAuth, SpotifyOauthError
 
 from flask import session
 
+from musicrecs.file_storage import sharded_path
+
 from .item.spotify_music import SpotifyTrack
 from .item.spotify_playlist import SpotifyPlaylist
+from .spotify_requests import spotify_requests
+from .token_store import token_store
+from .user_client_pool import user_client_pool
 
 
 '''CONSTANTS'''
 
 
 SCOPE = 'playlist-modify-public'
+
+# Most playlists that spotify returns per page
+MAX_PLAYLISTS_PER_REQUEST = 50
+
+# Most tracks that can be added to a playlist per request
+MAX_PLAYLIST_TRACKS_PER_REQUEST = 100
+
+# Tokens used to be cached in files in this folder (they're now kept in
+# the token store). Any that are left are moved to the token store when
+# they're next used.
 CACHE_FOLDER = '.spotify_user_caches/'
 
 
@@ -64,13 +85,14 @@ def auth_new_user(code):
 
 
 def logout():
-    """Remove the cache code for this user. This doesn't 'unauthenticate'
+    """Remove the token of this user. This doesn't 'unauthenticate'
     the user, but it will force an `SpotifyUserAuthFailure` the next time
     that `_get_sp_instance` is called.
     """
-    # Remove cache code for this user
-    if os.path.exists(_session_cache_path()):
-        os.remove(_session_cache_path())
+    session_id = _get_session_id()
+    if session_id is not None:
+        user_client_pool.discard(session_id)
+        token_store.delete(session_id)
 
 
 '''PUBLIC FUNCTIONS'''
@@ -86,6 +108,50 @@ def is_authenticated():
     return True
 
 
+def get_token_fingerprint() -> Union[str, None]:
+    """Get a fingerprint of the user's spotify authorization, without asking
+    spotify, or None if the user hasn't authorized. The fingerprint stays the
+    same while the user stays logged in, even as their access token is
+    refreshed.
+    """
+    token_info = _read_cached_token()
+    if token_info is None or "refresh_token" not in token_info:
+        return None
+
+    return hashlib.sha256(token_info["refresh_token"].encode()).hexdigest()
+
+
+def refresh_expiring_tokens(margin: float) -> int:
+    """Refresh the tokens of the users in the pool of spotipy instances
+    that expire within `margin` seconds, so that their requests don't have
+    to wait for the token to be refreshed. Return the number refreshed.
+    """
+    num_refreshed = 0
+    for session_id, sp in user_client_pool.clients():
+        token_info = token_store.get(session_id)
+        if token_info is None:
+            # The user logged out on another host
+            user_client_pool.discard(session_id)
+            continue
+
+        if token_info["expires_at"] - time.time() > margin:
+            continue
+
+        try:
+            sp.auth_manager.refresh_access_token(token_info["refresh_token"])
+        except SpotifyOauthError:
+            # The user's authorization was revoked, so they'll have to log in again
+            user_client_pool.discard(session_id)
+            continue
+        except requests.RequestException:
+            # Try again next time (or when the user next makes a request)
+            continue
+
+        num_refreshed += 1
+
+    return num_refreshed
+
+
 def get_user_id():
     return _get_sp_instance().me()["id"]
 
@@ -103,44 +169,51 @@ def get_user_display_name():
     return _get_sp_instance().me()['display_name']
 
 
-def get_user_playlists():
+def get_user_playlists(max_concurrency: int = 1) -> Iterator[dict]:
+    """Yield the user's playlists (as spotify returns them), in order, as
+    the pages of them arrive. The user isn't checked for authentication
+    until the first playlist is asked for.
+
+    With `max_concurrency` greater than 1, the pages after the first one
+    are fetched at the same time, at most `max_concurrency` at once.
+    """
     sp = _get_sp_instance()
 
-    playlist_infos = sp.current_user_playlists()
+    playlist_infos = sp.current_user_playlists(limit=MAX_PLAYLISTS_PER_REQUEST)
+    yield from playlist_infos['items']
 
-    playlists = []
-    while playlist_infos:
-        for playlist in playlist_infos['items']:
-            playlists.append(playlist)
-        if playlist_infos['next']:
-            playlist_infos = sp.next(playlist_infos)
-        else:
-            playlist_infos = None
+    if max_concurrency > 1:
+        yield from _get_user_playlist_pages(sp, playlist_infos['total'], max_concurrency)
+        return
 
-    return playlists
+    while playlist_infos['next']:
+        playlist_infos = sp.next(playlist_infos)
+        yield from playlist_infos['items']
 
 
-def create_playlist(name: str, tracks: List[SpotifyTrack]) -> SpotifyPlaylist:
-    """Create a playlist of the passed in tracks with the given name
+def create_playlist(name: str, tracks: List[SpotifyTrack], spotify_user_id: str = None) -> SpotifyPlaylist:
+    """Create a playlist of the passed in tracks with the given name, for
+    the current user. Pass the user's `spotify_user_id` if it's known, to
+    save asking spotify for it.
 
     It will return the spotify link of the created playlist.
     """
     # Get the spotify user account instance
     sp = _get_sp_instance()
 
-    # Get the current user's id
-    user_id = sp.current_user()["id"]
+    if spotify_user_id is None:
+        spotify_user_id = sp.me()["id"]
 
     # Create the playlist with the given name, for the current user.
-    sp.user_playlist_create(user_id, name)
-
-    # Make a playlist object for the playlist that was just created
-    new_playlist = SpotifyPlaylist(sp.current_user_playlists()['items'][0])
+    new_playlist = SpotifyPlaylist(sp.user_playlist_create(spotify_user_id, name))
 
-    # Add the given tracks to the new playlist
-    sp.user_playlist_add_tracks(user_id,
-                                new_playlist.id,
-                                [track.id for track in tracks])
+    # Add the given tracks to the new playlist. Spotify only takes so many
+    # tracks at a time, and adds each request's tracks to the end of the
+    # playlist, so the requests are made one after another to keep the
+    # tracks in order.
+    track_ids = [track.id for track in tracks]
+    for start in range(0, len(track_ids), MAX_PLAYLIST_TRACKS_PER_REQUEST):
+        sp.playlist_add_items(new_playlist.id, track_ids[start:start + MAX_PLAYLIST_TRACKS_PER_REQUEST])
 
     # Return the new playlist
     return new_playlist
@@ -149,14 +222,109 @@ def create_playlist(name: str, tracks: List[SpotifyTrack]) -> SpotifyPlaylist:
 '''PRIVATE FUNCTIONS'''
 
 
-def _session_cache_path():
-    if not os.path.exists(CACHE_FOLDER):
-        os.makedirs(CACHE_FOLDER)
+class _StoredTokenOAuth(SpotifyOAuth):
+    """Spotipy's authorization code flow, with the session's token kept
+    in the token store rather than in a cache file
+    """
+
+    def __init__(self, session_id, **kwargs):
+        super().__init__(**kwargs)
+        self.session_id = session_id
+
+    def get_cached_token(self):
+        token_info = _load_token(self.session_id)
+        if token_info is None:
+            return None
+
+        # If scopes don't match, then bail
+        if "scope" not in token_info or not self._is_scope_subset(self.scope, token_info["scope"]):
+            return None
+
+        # Refreshing saves the new token to the store
+        if self.is_token_expired(token_info):
+            token_info = self.refresh_access_token(token_info["refresh_token"])
+
+        return token_info
 
-    if not session.get('uuid'):
+    def _save_token_info(self, token_info):
+        token_store.set(self.session_id, token_info)
+
+
+def _get_session_id(create=False) -> Union[str, None]:
+    """Get the id of the session that the user's token is kept under.
+    Sessions only get an id once the user starts to log in.
+    """
+    if create and not session.get('uuid'):
         session['uuid'] = str(uuid.uuid4())
 
-    return CACHE_FOLDER + session.get('uuid')
+    return session.get('uuid')
+
+
+def _load_token(session_id):
+    """Get the session's token from the token store (not refreshing it),
+    moving it there from its old cache file if it's still in one
+    """
+    token_info = token_store.get(session_id)
+    if token_info is None:
+        token_info = _import_token_file(session_id)
+
+    return token_info
+
+
+def _import_token_file(session_id):
+    for cache_path in [sharded_path(CACHE_FOLDER, session_id), os.path.join(CACHE_FOLDER, session_id)]:
+        try:
+            with open(cache_path) as f:
+                token_info = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        token_store.set(session_id, token_info)
+        os.remove(cache_path)
+        return token_info
+
+    return None
+
+
+def _read_cached_token():
+    """Read the user's cached token as it is (not refreshing it)"""
+    session_id = _get_session_id()
+    if session_id is None:
+        return None
+
+    return _load_token(session_id)
+
+
+def _get_user_playlist_pages(sp, total: int, max_concurrency: int) -> Iterator[dict]:
+    """Yield the playlists of the pages after the first one, fetching up
+    to `max_concurrency` pages at once, in order
+    """
+    # The workers use the user's current access token directly, since
+    # looking their token up needs the request's app context
+    access_token = sp.auth_manager.get_cached_token()['access_token']
+    page_sp = spotipy.Spotify(auth=access_token, requests_session=spotify_requests)
+
+    def get_page(offset):
+        return page_sp.current_user_playlists(limit=MAX_PLAYLISTS_PER_REQUEST, offset=offset)['items']
+
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    pending = deque()
+    try:
+        for offset in range(MAX_PLAYLISTS_PER_REQUEST, total, MAX_PLAYLISTS_PER_REQUEST):
+            pending.append(executor.submit(get_page, offset))
+
+            # Only get further ahead than the pages being fetched once
+            # the oldest one has been yielded
+            if len(pending) >= max_concurrency:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # If the caller stopped early, drop the pages that haven't started
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
 
 
 def _get_sp_instance():
@@ -165,15 +333,23 @@ def _get_sp_instance():
     are authenticated -- return their spotipy instance. If the user does not have
     a token, then they are not authenticated -- raise an exception
     """
-    auth_manager = _get_auth_manager()
+    session_id = _get_session_id()
+    if session_id is not None:
+        # Reuse the user's pooled spotipy instance, if they have one
+        sp = user_client_pool.get(session_id)
+        if sp is None:
+            sp = spotipy.Spotify(auth_manager=_get_auth_manager(), requests_session=spotify_requests)
+
+        if sp.auth_manager.get_cached_token():
+            user_client_pool.put(session_id, sp)
+            return sp
+
+        user_client_pool.discard(session_id)
 
-    if auth_manager.get_cached_token():
-        return spotipy.Spotify(auth_manager=auth_manager)
-    else:
-        raise SpotifyUserAuthFailure(get_auth_url(show_dialog=True))
+    raise SpotifyUserAuthFailure(get_auth_url(show_dialog=True))
 
 
 def _get_auth_manager(show_dialog=False):
-    return SpotifyOAuth(scope=SCOPE,
-                        cache_path=_session_cache_path(),
-                        show_dialog=show_dialog)
+    return _StoredTokenOAuth(_get_session_id(create=True),
+                             scope=SCOPE,
+                             show_dialog=show_dialog)
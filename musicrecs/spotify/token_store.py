@@ -0,0 +1,70 @@
+"""Store of the spotify authorization tokens of users' browser sessions.
+
+Tokens are kept in a shared backend (the database, see
+`musicrecs.database.spotify_tokens`), so every host sees the same tokens,
+with an in-process LRU cache in front of it, so that checking a user's
+token is usually a memory read.
+
+A token that was refreshed or deleted on another host can be stale in
+this host's LRU cache for up to its timeout. A stale token is still
+refreshed (with its refresh token) if it's expired, so the timeout mostly
+bounds how long a logout takes to reach the other hosts.
+"""
+
+import json
+
+from .lru_cache import LRUCache
+
+
+"""Default size, and timeout (in seconds), of the in-process token cache"""
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TIMEOUT = 60 * 5
+
+
+class SpotifyTokenStore:
+    """Spotify token infos (the dicts that spotipy saves) by session id.
+
+    The `backend` is anything with `get(session_id)` (returning the token
+    info json, or None), `set(session_id, token_info_json)` and
+    `delete(session_id)`.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, timeout=DEFAULT_CACHE_TIMEOUT):
+        self._backend = None
+        self._tokens = LRUCache(size, timeout)
+
+    """Public Functions"""
+
+    def init_app(self, app, backend):
+        self._backend = backend
+        self._tokens = LRUCache(app.config["SPOTIFY_TOKEN_CACHE_SIZE"], app.config["SPOTIFY_TOKEN_CACHE_TIMEOUT"])
+
+    def get(self, session_id):
+        """Get the session's token info, or None if it doesn't have one"""
+        token_info = self._tokens.get(session_id)
+        if token_info is None:
+            token_info_json = self._backend.get(session_id)
+            if token_info_json is None:
+                return None
+
+            token_info = json.loads(token_info_json)
+            self._tokens.set(session_id, token_info)
+
+        # Callers (spotipy) can change the dict they're given
+        return dict(token_info)
+
+    def set(self, session_id, token_info):
+        self._backend.set(session_id, json.dumps(token_info))
+        self._tokens.set(session_id, dict(token_info))
+
+    def delete(self, session_id):
+        self._backend.delete(session_id)
+        self._tokens.delete(session_id)
+
+    def stats(self):
+        """Get usage statistics of the in-process token cache"""
+        return self._tokens.stats()
+
+
+# The token store used by this process
+token_store = SpotifyTokenStore()
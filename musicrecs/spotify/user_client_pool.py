@@ -0,0 +1,53 @@
+"""Pool of the spotipy instances of logged in users, by session id.
+
+Users' spotipy instances (and their auth managers) are made once and then
+reused by the user's following requests, rather than made for every call
+to spotify. The pool is bounded, and instances are dropped once they've
+been in it for its timeout, so users that have left don't stay in it.
+
+The pool is also how the background task knows whose tokens to refresh
+before they expire (see `spotify_user.refresh_expiring_tokens`).
+"""
+
+from .lru_cache import LRUCache
+
+
+"""Default size of the pool, and how long (in seconds) instances stay in it"""
+DEFAULT_POOL_SIZE = 1024
+DEFAULT_POOL_TIMEOUT = 60 * 60
+
+
+class UserClientPool:
+    def __init__(self, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT):
+        self._clients = LRUCache(size, timeout)
+
+    """Public Functions"""
+
+    def init_app(self, app):
+        self._clients = LRUCache(app.config["SPOTIFY_USER_CLIENT_POOL_SIZE"],
+                                 app.config["SPOTIFY_USER_CLIENT_POOL_TIMEOUT"])
+
+    def get(self, session_id):
+        """Get the session's spotipy instance, or None if it isn't pooled"""
+        return self._clients.get(session_id)
+
+    def put(self, session_id, sp):
+        self._clients.set(session_id, sp)
+
+    def discard(self, session_id):
+        self._clients.delete(session_id)
+
+    def clients(self):
+        """Get a snapshot of the pooled (session id, spotipy instance) pairs,
+        without marking them as used
+        """
+        clients = ((session_id, self._clients.peek(session_id)) for session_id in self._clients.keys())
+        return [(session_id, sp) for session_id, sp in clients if sp is not None]
+
+    def stats(self):
+        """Get usage statistics of the pool"""
+        return self._clients.stats()
+
+
+# The pool of user spotipy instances of this process
+user_client_pool = UserClientPool()
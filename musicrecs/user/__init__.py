@@ -12,7 +12,7 @@ The following keys names are used in the 'session' object to enable this:
 - "user_retry_func"
 """
 
-from flask import Blueprint
+from flask import Blueprint, g
 
 from .helpers import is_user_logged_in, get_user_display_name
 
@@ -28,4 +28,10 @@ def inject_user_vars():
     )
 
 
+@bp.before_app_request
+def clear_memoized_user_identity():
+    """The user's identity is only memoized for one request at a time"""
+    g.pop("user_identity", None)
+
+
 from musicrecs.user import handlers
@@ -1,5 +1,6 @@
+from datetime import datetime
 from importlib import import_module
-from typing import Dict
+from typing import Dict, Tuple, Union
 from urllib.parse import urlparse
 
 from flask import redirect, render_template, url_for, flash
@@ -7,23 +8,37 @@ from flask.globals import request, session
 
 from musicrecs.spotify import spotify_user
 from musicrecs.database.models import Round
-from musicrecs.database.helpers import lookup_user_in_db
+from musicrecs.database.helpers import lookup_user_in_db, get_submissions_music, get_user_rounds
+from musicrecs.database.replica import read_from_replica, reads_from_replica
+from musicrecs.database.stats import get_user_stats
 from musicrecs.enums import MusicType
 from musicrecs.spotify.spotify_user import SpotifyUserAuthFailure
 from musicrecs.errors.exceptions import MusicrecsError
 
-from musicrecs import spotify_iface
-
 from . import bp
-from .helpers import login_or_register_user
+from .helpers import current_user_id, forget_user_identity, login_or_register_user
+
+
+"""CONSTANTS"""
+
+
+# Number of rounds shown on each page of a user's rounds
+ROUNDS_PAGE_SIZE = 20
 
 
 """USER INTERFACE ROUTES"""
 
 
 @bp.route('/user/profile', methods=['GET', 'POST'])
+@reads_from_replica
 def profile():
-    return render_template('user/profile.html')
+    # Get the user's stats (if they've played yet)
+    user_stats = None
+    user_id = current_user_id()
+    if user_id is not None:
+        user_stats = get_user_stats(user_id)
+
+    return render_template('user/profile.html', user_stats=user_stats)
 
 
 @bp.route('/user/login', methods=['GET', 'POST'])
@@ -43,6 +58,7 @@ def login():
 @bp.route('/user/logout', methods=['POST'])
 def logout():
     spotify_user.logout()
+    forget_user_identity()
 
     flash("You are now logged out.", "warning")
 
@@ -57,32 +73,42 @@ def logout():
 
 
 @bp.route('/user/rounds')
+@reads_from_replica
 def rounds():
-    def created_datetime(round_music_subs):
-        return round_music_subs[0].created
-
     # Get music type from args
     music_type = request.args.get("music_type")
     if music_type not in ['track', 'album']:
         raise MusicrecsError(f'{music_type} is not a valid music type.')
 
-    user = lookup_user_in_db(spotify_user.get_user_id())
+    # (Asking spotify who a user that isn't logged in is sends them to log in)
+    user_id = current_user_id()
+    if user_id is None:
+        spotify_user_id = spotify_user.get_user_id()
+        with read_from_replica(False):
+            user_id = lookup_user_in_db(spotify_user_id).id
+
+    # Get a page of the rounds of the music type that the user has submitted
+    # to (newest first), with the submission that they made to that round.
+    # One more round than fits on the page is asked for, to tell whether
+    # there's another page.
+    round_subs = get_user_rounds(user_id, MusicType[music_type], ROUNDS_PAGE_SIZE + 1,
+                                 before=_parse_rounds_cursor(request.args.get("before")))
+    next_cursor = None
+    if len(round_subs) > ROUNDS_PAGE_SIZE:
+        round_subs = round_subs[:ROUNDS_PAGE_SIZE]
+        next_cursor = _make_rounds_cursor(round_subs[-1][0])
 
     # Construct list of tuples with the rounds the user has submitted to,
     # with the music that they submitted to that round
-    round_music_subs = set()
-    for submission in user.submissions:
-        round = Round.query.filter_by(id=submission.round_id).first()
-
-        if round.music_type == MusicType[music_type]:
-            round_music_subs.add((
-                round,
-                spotify_iface.get_music_from_link(round.music_type, submission.spotify_link)
-            ))
+    musics = get_submissions_music(MusicType[music_type], [submission for _, submission in round_subs])
+    round_music_subs = [
+        (round, music) for (round, _), music in zip(round_subs, musics) if music is not None
+    ]
 
     return render_template('user/rounds.html',
                            music_type=music_type,
-                           round_music_subs=reversed(sorted(list(round_music_subs), key=created_datetime)))
+                           round_music_subs=round_music_subs,
+                           next_cursor=next_cursor)
 
 
 """EXTERNAL AUTHENTICATION CALLBACK ROUTES"""
@@ -141,6 +167,23 @@ def handle_external_auth_exception(e):
 """PRIVATE FUNCTIONS"""
 
 
+def _make_rounds_cursor(round: Round) -> str:
+    """Make the cursor of the page of rounds after `round`"""
+    return f"{round.created.isoformat()}_{round.id}"
+
+
+def _parse_rounds_cursor(cursor: Union[str, None]) -> Union[Tuple[datetime, int], None]:
+    """Get the (created, id) of the round that a cursor comes after"""
+    if cursor is None:
+        return None
+
+    try:
+        created, round_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created), int(round_id)
+    except ValueError:
+        raise MusicrecsError(f'{cursor} is not a valid page of rounds.')
+
+
 def _call_retry_func(func_info: Dict):
     """Get the function that needs to be retried and then call it
     """
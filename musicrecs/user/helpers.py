@@ -1,7 +1,24 @@
-from typing import Union
+import time
+from typing import NamedTuple, Union
+
+from flask import current_app, g, session
 
 from musicrecs.spotify import spotify_user
 from musicrecs.database.helpers import lookup_user_in_db, add_user_to_db
+from musicrecs.database.replica import read_from_replica
+
+
+"""CONSTANTS"""
+
+
+# Key of the logged in user's identity in the session
+USER_IDENTITY_SESSION_KEY = "user_identity"
+
+
+class UserIdentity(NamedTuple):
+    spotify_user_id: str
+    user_id: int
+    display_name: str
 
 
 """PUBLIC FUNCTIONS"""
@@ -18,29 +35,94 @@ def login_or_register_user() -> None:
     if user is None:
         add_user_to_db(spotify_user_id, spotify_user.get_user_display_name())
 
+    # Whoever was logged in before (if anyone) isn't any more
+    forget_user_identity()
 
-def is_user_logged_in() -> bool:
-    # Check if user is currently authenticated with spotify
-    if spotify_user.is_authenticated():
-        # Look up user by spotify user id
-        user = lookup_user_in_db(spotify_user.get_user_id())
 
-        # If user is in the database, return True
-        if user is not None:
-            return True
+def get_user_identity() -> Union[UserIdentity, None]:
+    """Get the spotify user id, user id and display name of the logged in
+    user, or None if no one is logged in.
+
+    Spotify is only asked who the user is when their spotify authorization
+    changes, or once every `USER_IDENTITY_TTL` seconds: in between, the
+    identity is cached in the session (and memoized for the rest of the
+    request).
+    """
+    if "user_identity" not in g:
+        g.user_identity = _load_user_identity()
+
+    return g.user_identity
 
-    return False
+
+def forget_user_identity() -> None:
+    """Forget the cached identity of the logged in user, for when
+    they log in or out
+    """
+    g.pop("user_identity", None)
+    session.pop(USER_IDENTITY_SESSION_KEY, None)
+
+
+def is_user_logged_in() -> bool:
+    return get_user_identity() is not None
 
 
 def current_user_id() -> Union[int, None]:
-    if is_user_logged_in():
-        return lookup_user_in_db(spotify_user.get_user_id()).id
+    identity = get_user_identity()
+    if identity is not None:
+        return identity.user_id
 
     return None
 
 
 def get_user_display_name() -> str:
-    if is_user_logged_in():
-        return lookup_user_in_db(spotify_user.get_user_id()).display_name
+    identity = get_user_identity()
+    if identity is not None:
+        return identity.display_name
 
     return None
+
+
+"""PRIVATE FUNCTIONS"""
+
+
+def _load_user_identity() -> Union[UserIdentity, None]:
+    # The user isn't logged in without a spotify authorization
+    token_fingerprint = spotify_user.get_token_fingerprint()
+    if token_fingerprint is None:
+        session.pop(USER_IDENTITY_SESSION_KEY, None)
+        return None
+
+    # Use the identity cached in the session if it's for the same
+    # authorization and hasn't expired
+    cached = session.get(USER_IDENTITY_SESSION_KEY)
+    if cached is not None and cached["token_fingerprint"] == token_fingerprint and cached["expires"] > time.time():
+        return UserIdentity(**cached["identity"])
+
+    # Ask spotify who the user is, and look them up. Users that are
+    # authorized with spotify but aren't registered aren't logged in.
+    # The user may have only just been registered, so look them up in
+    # the primary (a replica may not have them yet). A user whose
+    # authorization doesn't work any more (e.g. it lacks a scope that was
+    # added) isn't logged in, rather than being sent to authorize again
+    # from every page.
+    try:
+        spotify_user_id = spotify_user.get_user_id()
+    except spotify_user.SpotifyUserAuthFailure:
+        session.pop(USER_IDENTITY_SESSION_KEY, None)
+        return None
+
+    with read_from_replica(False):
+        user = lookup_user_in_db(spotify_user_id)
+
+    if user is None:
+        session.pop(USER_IDENTITY_SESSION_KEY, None)
+        return None
+
+    identity = UserIdentity(user.spotify_user_id, user.id, user.display_name)
+    session[USER_IDENTITY_SESSION_KEY] = dict(
+        token_fingerprint=token_fingerprint,
+        expires=time.time() + current_app.config["USER_IDENTITY_TTL"],
+        identity=identity._asdict()
+    )
+
+    return identity
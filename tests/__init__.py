@@ -1,3 +1,7 @@
+import atexit
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import Mock
 from flask.helpers import url_for
@@ -5,7 +9,8 @@ from flask.helpers import url_for
 import flask_testing
 
 from musicrecs.config import Config
-from musicrecs.spotify.item.spotify_music import SpotifyMusic
+from musicrecs.enums import MusicType
+from musicrecs.spotify.item.spotify_music import SpotifyAlbum, SpotifyTrack
 import musicrecs.spotify.spotify_user as sp_user
 
 from musicrecs import spotify_iface
@@ -13,9 +18,54 @@ from musicrecs import spotify_iface
 from musicrecs import create_app, db, scheduler
 
 
+def fake_spotify_album(album_id, name="Dummy Album"):
+    """Make a dictionary shaped like a spotify api album item"""
+    return {
+        "name": name,
+        "id": album_id,
+        "external_urls": {"spotify": f"https://open.spotify.com/album/{album_id}"},
+        "album_type": "album",
+        "artists": [{
+            "name": "Dummy Artist",
+            "id": "0000000000000000artist",
+            "external_urls": {"spotify": "https://open.spotify.com/artist/0000000000000000artist"}
+        }],
+        "images": [
+            {"height": 300, "width": 300, "url": f"https://i.scdn.co/image/{album_id}_300"},
+            {"height": 64, "width": 64, "url": f"https://i.scdn.co/image/{album_id}_64"}
+        ],
+        "release_date": "2021-01-01"
+    }
+
+
+def fake_spotify_track(track_id, name="Dummy Track"):
+    """Make a dictionary shaped like a spotify api track item"""
+    return {
+        "name": name,
+        "id": track_id,
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        "type": "track",
+        "artists": [{
+            "name": "Dummy Artist",
+            "id": "0000000000000000artist",
+            "external_urls": {"spotify": "https://open.spotify.com/artist/0000000000000000artist"}
+        }],
+        "album": fake_spotify_album(track_id[::-1])
+    }
+
+
+# Session and cache files written during the tests are kept out of the repo
+TEST_FILES_DIR = tempfile.mkdtemp(prefix="musicrecs-tests-")
+atexit.register(shutil.rmtree, TEST_FILES_DIR, ignore_errors=True)
+
+
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    CACHE_TYPE = 'SimpleCache'
+    CACHE_DIR = os.path.join(TEST_FILES_DIR, "flask_caching")
+    SESSION_FILE_DIR = os.path.join(TEST_FILES_DIR, "flask_session")
+    SPOTIFY_MUSIC_CACHE_DIR = os.path.join(TEST_FILES_DIR, "spotify_music_cache")
     PRESERVE_CONTEXT_ON_EXCEPTION = False
     WTF_CSRF_ENABLED = False
 
@@ -35,8 +85,9 @@ class MusicrecsTestCase(flask_testing.TestCase, unittest.TestCase):
         # Mock the user being logged out
         self.unauth_dummy_user()
 
-        # Mock get_music_from_link
+        # Mock get_music_from_link and get_musics_from_links
         spotify_iface.get_music_from_link = Mock(side_effect=self._mock_get_music_from_link)
+        spotify_iface.get_musics_from_links = Mock(side_effect=self._mock_get_musics_from_links)
 
     def tearDown(self):
         db.session.remove()
@@ -47,6 +98,7 @@ class MusicrecsTestCase(flask_testing.TestCase, unittest.TestCase):
 
     DUMMY_USER_SP_ID = "12345ABC"
     DUMMY_USER_DISPLAY_NAME = "Dummy User"
+    DUMMY_USER_TOKEN_FINGERPRINT = "dummy_token_fingerprint"
 
     def _raise_sp_test_exception(self, *args):
         """Raises an exception to authorize at the fake sp auth route"""
@@ -54,12 +106,14 @@ class MusicrecsTestCase(flask_testing.TestCase, unittest.TestCase):
 
     def auth_dummy_user(self, *args):
         sp_user.get_user_id = Mock(side_effect=lambda *args: self.DUMMY_USER_SP_ID)
+        sp_user.get_token_fingerprint = Mock(side_effect=lambda *args: self.DUMMY_USER_TOKEN_FINGERPRINT)
         sp_user.is_authenticated = Mock(side_effect=lambda *args: True)
         sp_user.get_user_display_name = Mock(side_effect=lambda *args: self.DUMMY_USER_DISPLAY_NAME)
         sp_user.logout = Mock(side_effect=self.unauth_dummy_user)
 
     def unauth_dummy_user(self, *args):
         sp_user.get_user_id = Mock(side_effect=self._raise_sp_test_exception)
+        sp_user.get_token_fingerprint = Mock(side_effect=lambda *args: None)
         sp_user.is_authenticated = Mock(side_effect=lambda *args: False)
         sp_user.get_user_display_name = Mock(side_effect=self._raise_sp_test_exception)
         sp_user.auth_new_user = Mock(side_effect=self.auth_dummy_user)
@@ -70,7 +124,19 @@ class MusicrecsTestCase(flask_testing.TestCase, unittest.TestCase):
         """Return a spotify music object whose link attribute
         is equal to the link passed in and that has a dummy img url
         """
-        music_mock = Mock(spec=SpotifyMusic)
-        music_mock.link = args[1]
-        music_mock.img_url = ""
-        return music_mock
+        return self.make_dummy_music(*args)
+
+    def make_dummy_music(self, music_type, link):
+        """Make a spotify music object of the music type at the given link"""
+        if music_type == MusicType.album:
+            spotify_music = fake_spotify_album(link.split("/")[-1])
+            spotify_music["external_urls"]["spotify"] = link
+            return SpotifyAlbum(spotify_music)
+        else:
+            spotify_music = fake_spotify_track(link.split("/")[-1])
+            spotify_music["external_urls"]["spotify"] = link
+            return SpotifyTrack(spotify_music)
+
+    def _mock_get_musics_from_links(self, music_type, links):
+        """Return a list of mocked spotify music objects for the links"""
+        return [self._mock_get_music_from_link(music_type, link) for link in links]
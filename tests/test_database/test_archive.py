@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+
+from flask import url_for
+
+from musicrecs import db
+from musicrecs.database.archive import archive_rounds
+from musicrecs.database.helpers import (
+    add_guesses_to_db, add_round_to_db, add_submission_to_db, add_user_to_db, get_round, get_user_rounds)
+from musicrecs.database.models import ArchivedRound, Guess, MusicSnapshot, Round, Submission, UserNameStats
+from musicrecs.database.stats import backfill_player_stats
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+from musicrecs.round.helpers import get_shuffled_user_name_list
+
+from tests.test_database import DatabaseTestCase
+
+
+class ArchiveTestCase(DatabaseTestCase):
+    """Test that old revealed rounds are moved to the archive, and are
+    read back from it just like the rounds that aren't archived
+    """
+    NUM_ROUNDS = 6
+
+    def setUp(self):
+        super().setUp()
+
+        self.user = add_user_to_db(self.DUMMY_USER_SP_ID, self.DUMMY_USER_DISPLAY_NAME)
+
+        # Add revealed rounds (created a day apart) that the user and
+        # someone else submitted to and guessed
+        self.start = datetime(2021, 1, 1)
+        self.rounds = []
+        for i in range(self.NUM_ROUNDS):
+            round = add_round_to_db(
+                description=f"Round {i}",
+                music_type=MusicType.album,
+                snoozin_rec_type=SnoozinRecType.random,
+                status=RoundStatus.revealed
+            )
+            round.created = self.start + timedelta(days=i)
+            db.session.commit()
+
+            user_submission = add_submission_to_db(
+                round.id, self.user.id, "Nick Jones", f"https://open.spotify.com/album/N{i:021d}",
+                music=self.make_dummy_music(MusicType.album, f"https://open.spotify.com/album/N{i:021d}"))
+            add_submission_to_db(round.id, None, "John Doe", f"https://open.spotify.com/album/J{i:021d}")
+
+            shuffled_user_names = get_shuffled_user_name_list(round)
+            add_guesses_to_db(user_submission.id, {
+                "Nick Jones": (shuffled_user_names.index("Nick Jones"), True),
+                "John Doe": (shuffled_user_names.index("Nick Jones"), False),
+            })
+
+            self.rounds.append(round)
+
+        # A round that is old, but isn't revealed yet
+        self.listen_round = add_round_to_db(
+            description="Listen round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.listen
+        )
+        self.listen_round.created = self.start
+        db.session.commit()
+
+        self.long_ids = [round.long_id for round in self.rounds]
+
+    def test_archive_old_revealed_rounds(self):
+        num_archived = archive_rounds(self.start + timedelta(days=4), batch_size=3)
+
+        # Verify that only the old revealed rounds were moved out of the round tables
+        self.assertEqual(num_archived, 4)
+        self.assertEqual(ArchivedRound.query.count(), 4)
+        self.assertEqual(sorted(round.description for round in Round.query),
+                         ["Listen round", "Round 4", "Round 5"])
+        self.assertEqual(Submission.query.count(), 4)
+        self.assertEqual(Guess.query.count(), 4)
+        self.assertEqual(MusicSnapshot.query.count(), 2)
+
+    def test_max_rounds(self):
+        self.assertEqual(archive_rounds(self.start + timedelta(days=10), batch_size=2, max_rounds=3), 3)
+        self.assertEqual(ArchivedRound.query.count(), 3)
+
+    def test_newest_round_not_archived(self):
+        db.session.delete(self.listen_round)
+        db.session.commit()
+
+        archive_rounds(self.start + timedelta(days=10), batch_size=10)
+
+        self.assertEqual([round.description for round in Round.query], ["Round 5"])
+
+    def test_get_archived_round(self):
+        round = get_round(self.long_ids[0])
+        expected = [
+            (submission.user_name, submission.shuffled_pos, submission.spotify_link,
+             sorted((guess.user_name, guess.music_num, guess.correct) for guess in submission.guesses))
+            for submission in round.submissions
+        ]
+
+        archive_rounds(self.start + timedelta(days=1), batch_size=10)
+        db.session.expire_all()
+
+        archived_round = get_round(self.long_ids[0])
+        self.assertNotIn(archived_round, db.session)
+        self.assertEqual(archived_round.description, "Round 0")
+        self.assertEqual(archived_round.status, RoundStatus.revealed)
+        self.assertEqual(archived_round.created, self.start)
+        self.assertEqual([
+            (submission.user_name, submission.shuffled_pos, submission.spotify_link,
+             sorted((guess.user_name, guess.music_num, guess.correct) for guess in submission.guesses))
+            for submission in archived_round.submissions
+        ], expected)
+        user_submission = next(sub for sub in archived_round.submissions if sub.user_id == self.user.id)
+        self.assertEqual(user_submission.music_snapshot.music.link,
+                         "https://open.spotify.com/album/N000000000000000000000")
+
+    def test_revealed_page_of_archived_round(self):
+        archive_rounds(self.start + timedelta(days=1), batch_size=10)
+
+        response = self.client.get(url_for('round.revealed', long_id=self.long_ids[0]))
+        self.assert_200(response)
+        self.assertIn(b"Round 0", response.data)
+        self.assertIn(b"p_round_revealed_correct_guess", response.data)
+
+    def test_user_rounds_include_archived_rounds(self):
+        archive_rounds(self.start + timedelta(days=3), batch_size=10)
+
+        # Page through the user's rounds, which are half archived
+        long_ids = []
+        before = None
+        while True:
+            round_subs = get_user_rounds(self.user.id, MusicType.album, 2, before=before)
+            if not round_subs:
+                break
+
+            for round, submission in round_subs:
+                self.assertEqual(submission.user_name, "Nick Jones")
+                long_ids.append(round.long_id)
+
+            before = (round_subs[-1][0].created, round_subs[-1][0].id)
+
+        self.assertEqual(long_ids, self.long_ids[::-1])
+
+    def test_backfill_counts_archived_rounds(self):
+        # The rounds were added as revealed, so count their stats up first
+        backfill_player_stats()
+        totals = sorted(
+            (stats.user_name, stats.rounds_played, stats.guesses_made, stats.guesses_correct, stats.times_fooled)
+            for stats in UserNameStats.query)
+
+        archive_rounds(self.start + timedelta(days=3), batch_size=10)
+        backfill_player_stats()
+        db.session.expire_all()
+
+        self.assertEqual(sorted(
+            (stats.user_name, stats.rounds_played, stats.guesses_made, stats.guesses_correct, stats.times_fooled)
+            for stats in UserNameStats.query), totals)
@@ -0,0 +1,56 @@
+from sqlalchemy import event
+
+from musicrecs import db
+from musicrecs.database.helpers import add_guesses_to_db, add_round_to_db, add_submission_to_db
+from musicrecs.database.models import Guess
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+
+from tests.test_database import DatabaseTestCase
+
+
+class GuessesTestCase(DatabaseTestCase):
+    """Test adding all of a guesser's guesses at once"""
+    NUM_USERS = 20
+
+    def setUp(self):
+        super().setUp()
+
+        round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.listen
+        )
+        self.submissions = [
+            add_submission_to_db(round.id, None, f"user{i}", f"https://open.spotify.com/album/{i:022d}")
+            for i in range(self.NUM_USERS)
+        ]
+        self.guesses = {f"user{i}": (i, i % 2 == 0) for i in range(self.NUM_USERS)}
+
+    def test_one_insert_statement(self):
+        inserts = []
+
+        def count_insert(conn, cursor, statement, *args):
+            if statement.startswith("INSERT INTO guess"):
+                inserts.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count_insert)
+        try:
+            num_added = add_guesses_to_db(self.submissions[0].id, self.guesses)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_insert)
+
+        self.assertEqual(num_added, self.NUM_USERS)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Guess.query.filter_by(submission_id=self.submissions[0].id).count(), self.NUM_USERS)
+
+    def test_double_submit(self):
+        add_guesses_to_db(self.submissions[0].id, self.guesses)
+
+        # Verify that adding the same guesses again doesn't duplicate them
+        self.assertEqual(add_guesses_to_db(self.submissions[0].id, self.guesses), 0)
+        self.assertEqual(Guess.query.count(), self.NUM_USERS)
+
+        guess = Guess.query.filter_by(submission_id=self.submissions[0].id, user_name="user2").first()
+        self.assertEqual(guess.music_num, 2)
+        self.assertTrue(guess.correct)
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from flask.helpers import url_for
+
+from musicrecs import db, spotify_iface
+from musicrecs.database.helpers import add_round_to_db, add_submission_to_db
+from musicrecs.database.models import MusicSnapshot, Submission
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+from musicrecs.main import background_tasks
+from musicrecs.main.background_tasks import MUSIC_SNAPSHOT_MAX_AGE, refresh_music_snapshots
+
+from tests.test_database import DatabaseTestCase
+
+
+class MusicSnapshotsTestCase(DatabaseTestCase):
+    """Test that submissions keep a snapshot of their music,
+    so that rounds can be shown without asking spotify
+    """
+    def test_snapshot_saved_on_submit(self):
+        round = add_round_to_db(
+            description="Trackrecs random round",
+            music_type=MusicType.track,
+            snoozin_rec_type=SnoozinRecType.random,
+        )
+
+        # Submit a rec through the round page
+        self.client.post(
+            url_for('round.submit', long_id=round.long_id),
+            data=dict(name="John Doe", spotify_link="http://open.spotify.com/track/6rqhFgbbKwnb9MLmUQDhG6"),
+            follow_redirects=False
+        )
+
+        # Verify that the submission has a snapshot of the track
+        submission = Submission.query.first()
+        self.assertIsNotNone(submission.music_snapshot)
+        self.assertEqual(submission.music_snapshot.music.link, "http://open.spotify.com/track/6rqhFgbbKwnb9MLmUQDhG6")
+        self.assertEqual(submission.music_snapshot.music.name, "Dummy Track")
+
+        # Verify that the listen phase is shown without resolving any links
+        round.status = RoundStatus.listen
+        db.session.commit()
+        spotify_iface.get_musics_from_links.reset_mock()
+
+        response = self.client.get(url_for('round.listen', long_id=round.long_id))
+        self.assert_200(response)
+        self.assertIn(b"Dummy Track", response.data)
+        spotify_iface.get_musics_from_links.assert_not_called()
+
+    def test_refresh_missing_and_stale_snapshots(self):
+        round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.revealed
+        )
+
+        # Add a submission without a snapshot, and one with a stale snapshot
+        link = "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz"
+        stale_link = "https://open.spotify.com/album/5Z9iiGl2FcIfa3BMiv6OIw"
+        add_submission_to_db(round.id, None, "Nick Jones", link)
+        stale_submission = add_submission_to_db(
+            round.id, None, "snoozin", stale_link, music=self.make_dummy_music(MusicType.album, stale_link))
+        stale_updated = datetime.utcnow() - MUSIC_SNAPSHOT_MAX_AGE - timedelta(days=1)
+        stale_submission.music_snapshot.updated = stale_updated
+        db.session.commit()
+
+        refresh_music_snapshots()
+
+        # Verify that both submissions now have fresh snapshots
+        self.assertEqual(MusicSnapshot.query.count(), 2)
+        for submission in Submission.query.all():
+            self.assertEqual(submission.music_snapshot.music.link, submission.spotify_link)
+            self.assertGreater(submission.music_snapshot.updated, stale_updated)
+
+    def test_unavailable_music_doesnt_block_refreshes(self):
+        round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.revealed
+        )
+
+        # Add more submissions of music that's gone from spotify than are
+        # refreshed in a run, and one with a stale snapshot
+        for i in range(4):
+            add_submission_to_db(round.id, None, f"user{i}", f"https://open.spotify.com/album/removed{i}")
+        stale_link = "https://open.spotify.com/album/5Z9iiGl2FcIfa3BMiv6OIw"
+        stale_submission = add_submission_to_db(
+            round.id, None, "snoozin", stale_link, music=self.make_dummy_music(MusicType.album, stale_link))
+        stale_updated = datetime.utcnow() - MUSIC_SNAPSHOT_MAX_AGE - timedelta(days=1)
+        stale_submission.music_snapshot.updated = stale_updated
+        db.session.commit()
+
+        spotify_iface.get_musics_from_links.side_effect = lambda music_type, links: [
+            None if "removed" in link else self.make_dummy_music(music_type, link) for link in links]
+
+        with mock.patch.object(background_tasks, "MAX_MUSIC_SNAPSHOT_REFRESHES", 3):
+            refresh_music_snapshots()
+            refresh_music_snapshots()
+
+        # Verify that the missing music was recorded as unavailable, and
+        # that the stale snapshot was still refreshed
+        unavailable = MusicSnapshot.query.filter_by(unavailable=True).all()
+        self.assertEqual(len(unavailable), 4)
+        self.assertTrue(all(snapshot.music is None for snapshot in unavailable))
+
+        stale_snapshot = Submission.query.filter_by(user_name="snoozin").first().music_snapshot
+        self.assertGreater(stale_snapshot.updated, stale_updated)
+        self.assertFalse(stale_snapshot.unavailable)
@@ -0,0 +1,105 @@
+from musicrecs import db
+from musicrecs.database.helpers import (
+    add_guesses_to_db, add_round_to_db, add_submission_to_db, add_user_to_db, transition_round)
+from musicrecs.database.models import UserNameStats, UserStats
+from musicrecs.database.stats import backfill_player_stats, get_leaderboard, get_user_stats
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+
+from tests.test_database import DatabaseTestCase
+
+
+class PlayerStatsTestCase(DatabaseTestCase):
+    """Test that the players' stats are kept up to date as guesses are
+    made and rounds are revealed, and match a recount from scratch
+    """
+    def setUp(self):
+        super().setUp()
+
+        self.user = add_user_to_db("alice_sp_id", "Alice")
+
+        self.round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.listen
+        )
+        self.alice = add_submission_to_db(self.round.id, self.user.id, "alice", "https://open.spotify.com/album/0")
+        self.bob = add_submission_to_db(self.round.id, None, "bob", "https://open.spotify.com/album/1")
+        self.carol = add_submission_to_db(self.round.id, None, "carol", "https://open.spotify.com/album/2")
+
+    def test_guesses_and_reveal(self):
+        # Alice gets herself and bob right, carol gets everyone wrong
+        add_guesses_to_db(self.alice.id, {"alice": (0, True), "bob": (1, True), "carol": (1, False)})
+        add_guesses_to_db(self.carol.id, {"alice": (1, False), "bob": (2, False), "carol": (0, False)})
+
+        self.assertEqual(self._user_name_stats("alice"), (0, 3, 2, 1))
+        self.assertEqual(self._user_name_stats("bob"), (0, 0, 0, 1))
+        self.assertEqual(self._user_name_stats("carol"), (0, 3, 0, 1))
+
+        self.assertTrue(transition_round(self.round.id, RoundStatus.listen, RoundStatus.revealed))
+
+        self.assertEqual(self._user_name_stats("alice"), (1, 3, 2, 1))
+        self.assertEqual(self._user_name_stats("bob"), (1, 0, 0, 1))
+
+        # Alice's stats are also kept by her user
+        user_stats = get_user_stats(self.user.id)
+        self.assertEqual(user_stats.guesses_correct, 2)
+        self.assertEqual(user_stats.rounds_played, 1)
+        self.assertEqual(UserStats.query.count(), 1)
+
+        self.assertEqual([stats.user_name for stats in get_leaderboard(2)], ["alice", "bob"])
+
+    def test_double_submitted_guesses_counted_once(self):
+        guesses = {"alice": (0, True), "bob": (1, True), "carol": (1, False)}
+        add_guesses_to_db(self.alice.id, guesses)
+        add_guesses_to_db(self.alice.id, guesses)
+
+        self.assertEqual(self._user_name_stats("alice"), (0, 3, 2, 0))
+
+    def test_failed_reveal_not_counted(self):
+        transition_round(self.round.id, RoundStatus.listen, RoundStatus.revealed)
+        self.assertFalse(transition_round(self.round.id, RoundStatus.listen, RoundStatus.revealed))
+
+        self.assertEqual(self._user_name_stats("alice"), (1, 0, 0, 0))
+
+    def test_backfill_matches_running_totals(self):
+        add_guesses_to_db(self.alice.id, {"alice": (0, True), "bob": (2, False), "carol": (1, False)})
+        add_guesses_to_db(self.bob.id, {"alice": (0, True), "bob": (1, True), "carol": (2, True)})
+        transition_round(self.round.id, RoundStatus.listen, RoundStatus.revealed)
+
+        running_totals = self._all_stats()
+
+        # Recount from scratch, after the totals have been lost
+        db.session.query(UserNameStats).delete()
+        db.session.query(UserStats).delete()
+        db.session.commit()
+
+        self.assertEqual(backfill_player_stats(), 3)
+        self.assertEqual(self._all_stats(), running_totals)
+
+    def test_snoozin_not_a_player(self):
+        add_submission_to_db(self.round.id, None, "snoozin", "https://open.spotify.com/album/3")
+        add_guesses_to_db(self.alice.id, {"alice": (0, True), "bob": (1, True), "carol": (3, False),
+                                          "snoozin": (2, False)})
+        transition_round(self.round.id, RoundStatus.listen, RoundStatus.revealed)
+
+        self.assertEqual(self._user_name_stats("alice"), (1, 4, 2, 0))
+        self.assertIsNone(UserNameStats.query.filter_by(user_name="snoozin").first())
+
+        # Snoozin isn't counted from scratch either
+        running_totals = self._all_stats()
+        self.assertEqual(backfill_player_stats(), 3)
+        self.assertEqual(self._all_stats(), running_totals)
+
+    def _user_name_stats(self, user_name):
+        stats = UserNameStats.query.filter_by(user_name=user_name).first()
+        return (stats.rounds_played, stats.guesses_made, stats.guesses_correct, stats.times_fooled)
+
+    def _all_stats(self):
+        db.session.expire_all()
+        return (
+            sorted((stats.user_id, stats.rounds_played, stats.guesses_made, stats.guesses_correct, stats.times_fooled)
+                   for stats in UserStats.query),
+            sorted((stats.user_name, stats.rounds_played, stats.guesses_made, stats.guesses_correct,
+                    stats.times_fooled) for stats in UserNameStats.query),
+        )
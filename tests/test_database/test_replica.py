@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+
+from flask.helpers import url_for
+
+from musicrecs import create_app, db
+from musicrecs.database.helpers import add_round_to_db, add_submission_to_db
+from musicrecs.database.models import Round, Submission, User
+from musicrecs.database.replica import REPLICA_BIND, read_from_replica
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+
+from tests import TestingConfig
+from tests.test_database import DatabaseTestCase
+
+
+class ReplicaTestCase(DatabaseTestCase):
+    """Test that GET pages read from the replica, and that
+    writes go to the primary, using two sqlite files
+    """
+    def create_app(self):
+        self.db_dir = tempfile.mkdtemp()
+
+        class ReplicaTestingConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.db_dir, 'primary.db')}"
+            SQLALCHEMY_REPLICA_URI = f"sqlite:///{os.path.join(self.db_dir, 'replica.db')}"
+
+        return create_app(ReplicaTestingConfig)
+
+    def setUp(self):
+        super().setUp()
+        self.replica_engine = db.get_engine(self.app, bind=REPLICA_BIND)
+        db.metadata.create_all(self.replica_engine)
+
+        # Add a round to the primary, and copy it to the replica
+        # with a different description
+        round = add_round_to_db(
+            description="Primary round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+        )
+        self.long_id = round.long_id
+        with self.replica_engine.begin() as conn:
+            conn.execute(Round.__table__.insert().values(
+                id=round.id, long_id=round.long_id, description="Replica round", music_type=round.music_type,
+                status=round.status, snoozin_rec_type=round.snoozin_rec_type, created=round.created))
+        db.session.remove()
+
+    def tearDown(self):
+        super().tearDown()
+        db.metadata.drop_all(self.replica_engine)
+        db.get_engine(self.app).dispose()
+        self.replica_engine.dispose()
+        shutil.rmtree(self.db_dir)
+
+    def test_get_reads_from_replica(self):
+        response = self.client.get(url_for('round.submit', long_id=self.long_id))
+
+        self.assert200(response)
+        self.assertIn(b"Replica round", response.data)
+
+    def test_post_writes_to_primary(self):
+        self.client.post(
+            url_for('round.submit', long_id=self.long_id),
+            data=dict(name="John Doe", spotify_link="https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz"),
+            follow_redirects=False
+        )
+
+        # Verify that the submission is only in the primary
+        self.assertEqual(Submission.query.count(), 1)
+        with read_from_replica():
+            self.assertEqual(Submission.query.count(), 0)
+
+    def test_read_from_replica_block(self):
+        with read_from_replica():
+            self.assertEqual(Round.query.first().description, "Replica round")
+        db.session.remove()
+        self.assertEqual(Round.query.first().description, "Primary round")
+
+    def test_shuffle_with_lagging_replica(self):
+        """The first listen page of a round shuffles it, and then reads the
+        shuffled positions from the primary rather than the lagging replica
+        """
+        round = Round.query.filter_by(long_id=self.long_id).first()
+        for user_name, link in [("John Doe", "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz"),
+                                ("Jane Doe", "https://open.spotify.com/album/1gIC63gC3B7o7FfpPACZQJ")]:
+            add_submission_to_db(round.id, None, user_name, link)
+        round.status = RoundStatus.listen
+        db.session.commit()
+
+        # Copy the round, and its submissions before they're shuffled, to the replica
+        with self.replica_engine.begin() as conn:
+            conn.execute(Round.__table__.update().values(status=RoundStatus.listen))
+            conn.execute(Submission.__table__.insert(), [
+                {column.name: getattr(submission, column.key) for column in Submission.__table__.columns}
+                for submission in round.submissions])
+        db.session.remove()
+
+        response = self.client.get(url_for('round.listen', long_id=self.long_id))
+
+        self.assert200(response)
+        self.assertIn(b"Jane Doe", response.data)
+        self.assertEqual(Submission.query.filter(Submission.shuffled_pos.is_(None)).count(), 0)
+        with read_from_replica():
+            self.assertEqual(Submission.query.filter(Submission.shuffled_pos.is_(None)).count(), 2)
+
+    def test_login_with_lagging_replica(self):
+        """A user that was just registered is logged in, even though the
+        replica doesn't have them yet
+        """
+        self.auth_dummy_user()
+        response = self.client.get(url_for('user.login', next=url_for('user.profile')))
+        self.assertRedirects(response, url_for('user.profile'))
+
+        with read_from_replica():
+            self.assertEqual(User.query.count(), 0)
+
+        response = self.client.get(url_for('user.profile'))
+        self.assert200(response)
+        self.assertIn(bytes(self.DUMMY_USER_DISPLAY_NAME, 'utf-8'), response.data)
+
+        response = self.client.get(url_for('user.rounds', music_type="album"))
+        self.assert200(response)
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+from musicrecs import db
+from musicrecs.database.helpers import add_round_to_db
+from musicrecs.database.models import Submission
+from musicrecs.database import upgrade
+from musicrecs.database.upgrade import upgrade_db
+from musicrecs.enums import MusicType, SnoozinRecType
+
+from tests.test_database import DatabaseTestCase
+
+
+SPOTIFY_LINK = "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz"
+
+
+class UpgradeTestCase(DatabaseTestCase):
+    """Test that databases made before the models' indexes
+    were added are upgraded to have them
+    """
+    def setUp(self):
+        super().setUp()
+        self.round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+        )
+
+    def test_missing_indexes_created(self):
+        # Make the database look like it was made before the indexes
+        for index in Submission.__table__.indexes:
+            index.drop(db.engine)
+
+        created = upgrade_db(self.app)
+
+        self.assertEqual(set(created), set(index.name for index in Submission.__table__.indexes))
+        self.assertEqual(set(created), set(index["name"] for index in inspect(db.engine).get_indexes("submission")))
+
+        # Verify that nothing is left to upgrade
+        self.assertEqual(upgrade_db(self.app), [])
+
+    def test_missing_column_added(self):
+        # Make the database look like it was made before rounds had transition claims
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE round DROP COLUMN transition_started")
+
+        self.assertIn("round.transition_started", upgrade_db(self.app))
+        self.assertIn("transition_started", set(column["name"] for column in inspect(db.engine).get_columns("round")))
+
+    def test_upgraded_by_another_worker(self):
+        """A worker that finds a column and indexes missing, but then loses
+        the race to create them to another worker, carries on
+        """
+        real_inspector = inspect(db.engine)
+        stale_inspector = mock.Mock()
+        stale_inspector.get_columns.side_effect = lambda table_name: [
+            column for column in real_inspector.get_columns(table_name)
+            if (table_name, column["name"]) != ("round", "transition_started")]
+        stale_inspector.get_indexes.side_effect = lambda table_name: \
+            [] if table_name == "submission" else real_inspector.get_indexes(table_name)
+
+        # Only the first inspection is from before the other worker's upgrade
+        inspectors = iter([stale_inspector])
+        with mock.patch.object(upgrade, "inspect",
+                               side_effect=lambda engine: next(inspectors, None) or inspect(engine)):
+            self.assertEqual(upgrade_db(self.app), [])
+
+    def test_duplicates_reported(self):
+        # Make a database with a duplicate submission, from before the unique indexes
+        for index in Submission.__table__.indexes:
+            index.drop(db.engine)
+        for _ in range(2):
+            db.session.execute(Submission.__table__.insert().values(
+                spotify_link=SPOTIFY_LINK, user_name="the_user", round_id=self.round.id))
+        db.session.commit()
+
+        with self.assertLogs(self.app.logger, level="ERROR"):
+            created = upgrade_db(self.app)
+
+        # Verify that only the index that the duplicate breaks wasn't created
+        self.assertNotIn("ix_submission_round_id_user_name", created)
+        self.assertIn("ix_submission_round_id_user_id", created)
+
+    def test_unique_round_user_name(self):
+        for _ in range(2):
+            db.session.add(Submission(spotify_link=SPOTIFY_LINK, user_name="the_user", round_id=self.round.id))
+
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
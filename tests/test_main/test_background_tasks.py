@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from musicrecs import cache, db
+from musicrecs.database.helpers import add_round_to_db, add_submission_to_db
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+from musicrecs.main.background_tasks import BG_IMG_ROUND_BATCH_SIZE, MAX_BG_IMGS, update_bg_imgs
+
+from tests import MusicrecsTestCase
+
+
+class UpdateBgImgsTestCase(MusicrecsTestCase):
+    """Test that the background images come from the newest revealed
+    rounds, without fetching the rest of the round history
+    """
+    NUM_ROUNDS = 100
+
+    def setUp(self):
+        super().setUp()
+
+        # Add revealed rounds (created a day apart) with two submissions each
+        created = datetime(2021, 1, 1)
+        for i in range(self.NUM_ROUNDS):
+            round = add_round_to_db(
+                description="Albumrecs random round",
+                music_type=MusicType.album,
+                snoozin_rec_type=SnoozinRecType.random,
+                status=RoundStatus.revealed
+            )
+            round.created = created + timedelta(days=i)
+            for user_name in ["Nick Jones", "John Doe"]:
+                link = f"https://open.spotify.com/album/{user_name[0]}{i:021d}"
+                add_submission_to_db(round.id, None, user_name, link)
+        db.session.commit()
+
+    def test_newest_rounds(self):
+        submission_queries = []
+
+        def count_submission_query(conn, cursor, statement, *args):
+            if statement.startswith("SELECT") and "FROM submission" in statement:
+                submission_queries.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count_submission_query)
+        try:
+            update_bg_imgs()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_submission_query)
+
+        # Verify that the images are from the newest rounds
+        num_rounds = MAX_BG_IMGS // 2
+        newest_ids = set(f"{i:021d}" for i in range(self.NUM_ROUNDS - num_rounds, self.NUM_ROUNDS))
+        music_bg_imgs = cache.get("main_music_bg_imgs")
+        self.assertEqual(len(music_bg_imgs), MAX_BG_IMGS)
+        self.assertTrue(all(img_url.split("/")[-1][1:22] in newest_ids for img_url in music_bg_imgs))
+
+        # Verify that only the batches of rounds that were needed had their submissions loaded
+        self.assertEqual(len(submission_queries), -(-num_rounds // BG_IMG_ROUND_BATCH_SIZE))
+
+    def test_rounds_sharing_music(self):
+        # Add newer rounds that were all recommended the same two albums
+        for i in range(30):
+            round = add_round_to_db(
+                description="Albumrecs random round",
+                music_type=MusicType.album,
+                snoozin_rec_type=SnoozinRecType.random,
+                status=RoundStatus.revealed
+            )
+            round.created = datetime(2022, 1, 1) + timedelta(days=i)
+            for user_name in ["Nick Jones", "John Doe"]:
+                link = f"https://open.spotify.com/album/{user_name[0]}{0:021d}"
+                add_submission_to_db(round.id, None, user_name, link)
+        db.session.commit()
+
+        update_bg_imgs()
+
+        # Verify that older rounds were sampled to make up enough different images
+        music_bg_imgs = cache.get("main_music_bg_imgs")
+        self.assertEqual(len(music_bg_imgs), MAX_BG_IMGS)
+        self.assertEqual(len(set(music_bg_imgs)), MAX_BG_IMGS)
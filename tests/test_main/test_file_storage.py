@@ -0,0 +1,175 @@
+import os
+import struct
+import tempfile
+import time
+
+from cachelib.file import FileSystemCache
+from flask import request
+
+from musicrecs import cache, create_app, spotify_iface
+from musicrecs.file_storage import (
+    SHARD_DEPTH, ShardedFileSystemCache, ShardedFileSystemSessionInterface, modified_before, session_file_expired,
+    sharded_path, sweep_files)
+
+from tests import MusicrecsTestCase, TestingConfig
+
+
+class FileStorageTestCase(MusicrecsTestCase):
+    """Test that files are kept in hash prefix subdirectories, and that
+    sweeping removes the expired ones and moves the flat layout's files
+    """
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def test_sharded_path(self):
+        self.assertEqual(sharded_path(self.root, "abcdef0123"), os.path.join(self.root, "ab", "cd", "abcdef0123"))
+
+        # Names that aren't hashes are hashed to pick the subdirectories
+        path = sharded_path(self.root, "1b4e28ba-2fa1-11d2-883f-0016d3cca427")
+        self.assertEqual(len(os.path.relpath(path, self.root).split(os.sep)), SHARD_DEPTH + 1)
+        self.assertEqual(path, sharded_path(self.root, "1b4e28ba-2fa1-11d2-883f-0016d3cca427"))
+
+    def test_sharded_cache(self):
+        cache = ShardedFileSystemCache(self.root)
+        cache.set("session:1234", {"uuid": "abc"})
+
+        self.assertEqual(cache.get("session:1234"), {"uuid": "abc"})
+        self.assertEqual([entry.name for entry in os.scandir(self.root) if entry.is_file()], [])
+
+        files = [os.path.join(dir_path, name) for dir_path, _, names in os.walk(self.root) for name in names]
+        self.assertEqual(files, [cache._get_filename("session:1234")])
+
+        cache.delete("session:1234")
+        self.assertIsNone(cache.get("session:1234"))
+
+    def test_flat_file_read(self):
+        """A file written in the flat layout (before the files were sharded)
+        can still be read, and is moved into its subdirectory
+        """
+        FileSystemCache(self.root).set("session:1234", {"uuid": "abc"})
+
+        cache = ShardedFileSystemCache(self.root)
+        flat_path = cache._get_flat_filename("session:1234")
+        self.assertTrue(os.path.exists(flat_path))
+        self.assertEqual(cache.get("session:1234"), {"uuid": "abc"})
+        self.assertFalse(os.path.exists(flat_path))
+        self.assertTrue(os.path.exists(cache._get_filename("session:1234")))
+
+        # Writing and sweeping keep the moved file
+        cache.set("session:1234", {"uuid": "abc", "next": "/"})
+        sweep_files(self.root, session_file_expired)
+        self.assertEqual(cache.get("session:1234"), {"uuid": "abc", "next": "/"})
+
+    def test_flat_file_deleted(self):
+        FileSystemCache(self.root).set("session:1234", {"uuid": "abc"})
+
+        cache = ShardedFileSystemCache(self.root)
+        cache.delete("session:1234")
+
+        sweep_files(self.root, session_file_expired)
+        self.assertIsNone(cache.get("session:1234"))
+
+    def test_flat_session_read(self):
+        FileSystemCache(self.root).set("session:1234", {"uuid": "abc"})
+
+        session_interface = ShardedFileSystemSessionInterface(self.root, 0o600, "session:")
+        cookie = f"{self.app.session_cookie_name}=1234"
+        with self.app.test_request_context(headers={"Cookie": cookie}):
+            session = session_interface.open_session(self.app, request)
+
+        self.assertEqual(session.get("uuid"), "abc")
+
+    def test_sweep_session_files(self):
+        now = time.time()
+        expired = self._write_session_file(sharded_path(self.root, "aa" * 32), now - 60)
+        current = self._write_session_file(sharded_path(self.root, "bb" * 32), now + 60)
+        flat_expired = self._write_session_file(os.path.join(self.root, "cc" * 32), now - 60)
+        flat_current = self._write_session_file(os.path.join(self.root, "dd" * 32), now + 60)
+
+        stats = sweep_files(self.root, session_file_expired)
+
+        self.assertEqual(stats["files"], 2)
+        self.assertEqual(stats["files_removed"], 2)
+        self.assertEqual(stats["bytes_removed"], 2 * os.path.getsize(current))
+        self.assertEqual(stats["files_moved"], 1)
+
+        self.assertFalse(os.path.exists(expired))
+        self.assertFalse(os.path.exists(flat_expired))
+        self.assertTrue(os.path.exists(current))
+        self.assertFalse(os.path.exists(flat_current))
+        self.assertTrue(os.path.exists(sharded_path(self.root, "dd" * 32)))
+
+    def test_sweep_unused_files(self):
+        unused = sharded_path(self.root, "unused")
+        used = sharded_path(self.root, "used")
+        for path in [unused, used]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("{}")
+
+        an_hour_ago = time.time() - 60 * 60
+        os.utime(unused, (an_hour_ago, an_hour_ago))
+
+        stats = sweep_files(self.root, modified_before(60))
+
+        self.assertEqual((stats["files"], stats["files_removed"], stats["bytes_removed"]), (1, 1, 2))
+        self.assertFalse(os.path.exists(unused))
+        self.assertTrue(os.path.exists(used))
+
+    def test_sweep_flat_files(self):
+        now = time.time()
+        expired = self._write_session_file(os.path.join(self.root, "aa" * 32), now - 60)
+        current = self._write_session_file(os.path.join(self.root, "bb" * 32), now + 60)
+
+        stats = sweep_files(self.root, session_file_expired, shard=False)
+
+        self.assertEqual((stats["files"], stats["files_removed"], stats["files_moved"]), (1, 1, 0))
+        self.assertFalse(os.path.exists(expired))
+        self.assertTrue(os.path.exists(current))
+
+    def _write_session_file(self, path, expires):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(struct.pack("I", int(expires)) + b"session data")
+        return path
+
+
+class FileSystemCacheTestCase(MusicrecsTestCase):
+    """Test that, with file system caches, the music cache is kept apart
+    from the app's cache, and the app's cache keeps its keys that never
+    expire however many files it has
+    """
+    def create_app(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        class FileSystemCacheTestingConfig(TestingConfig):
+            CACHE_TYPE = "FileSystemCache"
+            CACHE_DIR = os.path.join(self.tmp_dir.name, "flask_caching")
+            SPOTIFY_MUSIC_CACHE_DIR = os.path.join(self.tmp_dir.name, "spotify_music_cache")
+
+        return create_app(FileSystemCacheTestingConfig)
+
+    def tearDown(self):
+        super().tearDown()
+        self.tmp_dir.cleanup()
+
+    def test_music_cache_apart(self):
+        music_cache = spotify_iface._shared_music_cache
+        self.assertIsInstance(music_cache, ShardedFileSystemCache)
+
+        # Music is cached in its own folder, in subdirectories
+        music_cache.set("spotify_music/album/3a0UOgDWw2pTajw85QPMiz", "album")
+        self.assertEqual(music_cache.get("spotify_music/album/3a0UOgDWw2pTajw85QPMiz"), "album")
+        self.assertTrue(music_cache._get_filename("spotify_music/album/3a0UOgDWw2pTajw85QPMiz").startswith(
+            self.app.config["SPOTIFY_MUSIC_CACHE_DIR"]))
+
+        # Neither cache is pruned (which would throw away the keys that
+        # never expire first)
+        self.assertEqual(music_cache._threshold, 0)
+        self.assertEqual(cache.cache._threshold, 0)
@@ -3,7 +3,8 @@ from urllib.parse import urlparse
 
 from flask import url_for
 
-from musicrecs.database.models import Round
+from musicrecs import db
+from musicrecs.database.models import Round, UserNameStats
 from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
 
 from tests.test_main import MainTestCase
@@ -90,3 +91,18 @@ class MainCreateRoundTestCase(MainTestCase):
         self.assertEqual(round.music_type, music_type)
         self.assertEqual(round.snoozin_rec_type, snoozin_rec_type)
         self.assertEqual(round.status, RoundStatus.submit)
+
+
+class MainLeaderboardTestCase(MainTestCase):
+    """Test GET on main leaderboard route."""
+    def test_get_leaderboard(self):
+        db.session.add_all([
+            UserNameStats(user_name="alice", guesses_made=4, guesses_correct=3),
+            UserNameStats(user_name="bob", guesses_made=4, guesses_correct=1),
+        ])
+        db.session.commit()
+
+        response = self.client.get(url_for("main.leaderboard"))
+        self.assert_200(response)
+        self.assertEqual(response.data.count(b"leaderboard_row"), 2)
+        self.assertLess(response.data.index(b"alice"), response.data.index(b"bob"))
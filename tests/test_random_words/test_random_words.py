@@ -0,0 +1,23 @@
+from musicrecs.random_words.random_words import DICTIONARY_FILE, RandomWords, load_dictionary
+
+from tests import MusicrecsTestCase
+
+
+class RandomWordsTestCase(MusicrecsTestCase):
+    """Test getting random words from the dictionary"""
+    def test_dictionary_matches_file(self):
+        with open(DICTIONARY_FILE, 'r') as dictionary:
+            word_list = [line.strip() for line in dictionary.readlines()]
+
+        dictionary = load_dictionary()
+        self.assertEqual(len(dictionary), len(word_list))
+        self.assertEqual([dictionary[i] for i in range(len(dictionary))], word_list)
+
+    def test_dictionary_loaded_once(self):
+        self.assertIs(RandomWords().word_list, RandomWords().word_list)
+
+    def test_get_random_words(self):
+        words = RandomWords().get_random_words(2)
+
+        self.assertEqual(len(words), 2)
+        self.assertTrue(all(words))
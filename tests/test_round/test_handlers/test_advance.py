@@ -4,9 +4,8 @@ from flask.helpers import url_for
 
 from musicrecs import spotify_iface
 from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
-from musicrecs.spotify.item.spotify_music import SpotifyAlbum, SpotifyTrack
 from musicrecs.database.models import Round, Submission
-from musicrecs.database.helpers import add_round_to_db, add_submission_to_db
+from musicrecs.database.helpers import add_round_to_db, add_submission_to_db, claim_round_transition
 
 from tests.test_round import RoundTestCase
 
@@ -32,8 +31,7 @@ class RoundAdvanceTestCase(RoundTestCase):
 
         # Mock the search_for_music spotify interface
         def _mock_search_for_music(*args, **kwargs):
-            track_mock = Mock(spec=SpotifyTrack)
-            track_mock.link = "http://open.spotify.com/track/7GhIk7Il098yCjg4BQjzvb"
+            track_mock = self.make_dummy_music(MusicType.track, "http://open.spotify.com/track/7GhIk7Il098yCjg4BQjzvb")
 
             return [track_mock]
 
@@ -56,8 +54,7 @@ class RoundAdvanceTestCase(RoundTestCase):
 
         # Mock the recommend_music spotify interface
         def _mock_recommend_music(*args):
-            track_mock = Mock(spec=SpotifyTrack)
-            track_mock.link = "http://open.spotify.com/track/7GhIk7Il098yCjg4BQjzvb"
+            track_mock = self.make_dummy_music(MusicType.track, "http://open.spotify.com/track/7GhIk7Il098yCjg4BQjzvb")
 
             return track_mock
 
@@ -80,8 +77,7 @@ class RoundAdvanceTestCase(RoundTestCase):
 
         # Mock the search_for_music spotify interface
         def _mock_search_for_music(*args, **kwargs):
-            album_mock = Mock(spec=SpotifyAlbum)
-            album_mock.link = "https://open.spotify.com/album/5Z9iiGl2FcIfa3BMiv6OIw"
+            album_mock = self.make_dummy_music(MusicType.album, "https://open.spotify.com/album/5Z9iiGl2FcIfa3BMiv6OIw")
 
             return [album_mock]
 
@@ -104,8 +100,7 @@ class RoundAdvanceTestCase(RoundTestCase):
 
         # Mock the recommend_music spotify interface
         def _mock_recommend_music(*args):
-            album_mock = Mock(spec=SpotifyAlbum)
-            album_mock.link = "https://open.spotify.com/album/5Z9iiGl2FcIfa3BMiv6OIw"
+            album_mock = self.make_dummy_music(MusicType.album, "https://open.spotify.com/album/5Z9iiGl2FcIfa3BMiv6OIw")
 
             return album_mock
 
@@ -144,6 +139,74 @@ class RoundAdvanceTestCase(RoundTestCase):
         # Run the advance to revealed test
         self._test_advance_to_revealed(round)
 
+    def test_concurrent_advance_to_listen(self):
+        """Test that a request to advance a round while another request is
+        advancing it returns without getting a snoozin rec
+        """
+        round = add_round_to_db(
+            description="Albumrecs similar round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.similar,
+            status=RoundStatus.submit
+        )
+        add_submission_to_db(round.id, None, "Jonie Nixon", "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz")
+        spotify_iface.recommend_music = Mock()
+
+        # Another request claims the transition first
+        self.assertTrue(claim_round_transition(round.id, RoundStatus.submit))
+
+        response = self.client.post(
+            url_for('round.advance', long_id=round.long_id),
+            data=dict(advance_to_listen="Advance to listen"),
+            follow_redirects=False
+        )
+
+        # Verify that this request did nothing
+        self.assertRedirects(response, url_for('round.index', long_id=round.long_id))
+        spotify_iface.recommend_music.assert_not_called()
+        self.assertEqual(Round.query.get(round.id).status, RoundStatus.submit)
+        self.assertIsNone(Submission.query.filter_by(user_name="snoozin").first())
+
+    def test_failed_advance_to_listen_released(self):
+        """Test that if getting snoozin's rec fails, the round can be advanced again"""
+        round = add_round_to_db(
+            description="Albumrecs similar round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.similar,
+            status=RoundStatus.submit
+        )
+        add_submission_to_db(round.id, None, "Jonie Nixon", "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz")
+        spotify_iface.recommend_music = Mock(side_effect=RuntimeError("spotify is down"))
+
+        with self.assertRaises(RuntimeError):
+            self.client.post(
+                url_for('round.advance', long_id=round.long_id),
+                data=dict(advance_to_listen="Advance to listen"),
+                follow_redirects=False
+            )
+
+        # Verify that the round is still in the submit phase, and unclaimed
+        round = Round.query.get(round.id)
+        self.assertEqual(round.status, RoundStatus.submit)
+        self.assertIsNone(round.transition_started)
+
+        # Verify that advancing works now
+        snoozin_link = "https://open.spotify.com/album/5Z9iiGl2FcIfa3BMiv6OIw"
+        spotify_iface.recommend_music = Mock(return_value=self.make_dummy_music(MusicType.album, snoozin_link))
+        self._test_advance_to_listen(round, snoozin_link)
+
+    def test_double_advance_to_revealed(self):
+        round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.listen
+        )
+        add_submission_to_db(round.id, None, "Nick Jones", "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz")
+
+        self._test_advance_to_revealed(round)
+        self._test_advance_to_revealed(round)
+
     def _test_advance_to_listen(self, round: Round, snoozin_spotify_link: str):
         # post 'round.advance'
         response = self.client.post(
@@ -155,6 +218,10 @@ class RoundAdvanceTestCase(RoundTestCase):
         # Verify that post was successfull, and redirected
         self.assertRedirects(response, url_for('round.index', long_id=round.long_id))
 
+        # Verify that the submissions were shuffled along with the transition
+        shuffled_positions = [submission.shuffled_pos for submission in Submission.query.filter_by(round_id=round.id)]
+        self.assertEqual(sorted(shuffled_positions), list(range(len(shuffled_positions))))
+
         # Verify that GET the round.listen is successful
         response = self.client.get(url_for('round.listen', long_id=round.long_id))
         self.assert_200(response)
@@ -0,0 +1,75 @@
+from flask import g
+from flask.helpers import url_for
+from sqlalchemy import event
+
+from musicrecs import cache, db
+from musicrecs.database.helpers import add_guess_to_db, add_round_to_db, add_submission_to_db
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+from musicrecs.round.helpers import get_shuffled_music_list
+
+from tests.test_round import RoundTestCase
+
+
+"""Most queries that showing a round page can take"""
+ROUND_PAGE_QUERY_BUDGET = 4
+
+
+class QueryBudgetTestCase(RoundTestCase):
+    """Test that the round pages take a fixed number of queries,
+    no matter how many submissions and guesses the round has
+    """
+    def test_submit_page(self):
+        self._assert_query_budget(RoundStatus.submit, 'round.submit')
+
+    def test_listen_page(self):
+        self._assert_query_budget(RoundStatus.listen, 'round.listen')
+
+    def test_revealed_page(self):
+        self._assert_query_budget(RoundStatus.revealed, 'round.revealed')
+
+    def _assert_query_budget(self, status, endpoint):
+        num_queries = [self._count_page_queries(status, endpoint, num_users) for num_users in [2, 10]]
+
+        self.assertEqual(num_queries[0], num_queries[1])
+        self.assertLessEqual(num_queries[1], ROUND_PAGE_QUERY_BUDGET)
+
+    def _count_page_queries(self, status, endpoint, num_users) -> int:
+        round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=status
+        )
+        submissions = [
+            add_submission_to_db(round.id, None, f"user{i}", f"https://open.spotify.com/album/{i:022d}")
+            for i in range(num_users)
+        ]
+
+        # Everyone guesses
+        if status != RoundStatus.submit:
+            get_shuffled_music_list(round)
+            for guesser in submissions:
+                for submission in submissions:
+                    add_guess_to_db(guesser.id, submission.user_name, submission.shuffled_pos, True)
+
+        # Start from nothing loaded or cached, like a new request
+        long_id = round.long_id
+        db.session.remove()
+        g.pop("round_versions", None)
+        g.pop("round_views", None)
+        cache.clear()
+
+        queries = []
+
+        def count_query(*args):
+            queries.append(args[2])
+
+        event.listen(db.engine, "before_cursor_execute", count_query)
+        try:
+            response = self.client.get(url_for(endpoint, long_id=long_id))
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_query)
+
+        self.assert200(response)
+
+        return len(queries)
@@ -0,0 +1,101 @@
+from flask import g
+from flask.helpers import url_for
+
+from musicrecs import db
+from musicrecs import spotify_iface
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+from musicrecs.database.models import Guess, Submission
+from musicrecs.database.helpers import add_round_to_db, add_submission_to_db, bump_round_version, get_round_version
+from musicrecs.round.helpers import get_guesser_names, get_shuffled_user_name_list
+from musicrecs.round.round_view import get_round_view
+
+from tests.test_round import RoundTestCase
+
+
+class RoundViewTestCase(RoundTestCase):
+    """Test that the view of a round is built once, reused across
+    requests, and rebuilt when the round changes
+    """
+    USER_NAMES = ["John Doe", "Dory Johnson", "Nick Jones", "Jonie Nixon", "snoozin"]
+
+    def setUp(self):
+        super().setUp()
+
+        self.round = add_round_to_db(
+            description="Trackrecs random round",
+            music_type=MusicType.track,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.listen
+        )
+        for i, user_name in enumerate(self.USER_NAMES):
+            add_submission_to_db(self.round.id, None, user_name, f"http://open.spotify.com/track/{i:022d}")
+
+    def test_view_reused_across_requests(self):
+        get_round_view(self.round)
+
+        # Forget the views of this 'request'
+        g.pop("round_views")
+
+        # Verify that the view comes from the cache instead of being rebuilt
+        spotify_iface.get_musics_from_links.reset_mock()
+        view = get_round_view(self.round)
+        self.assertEqual(sorted(view.shuffled_user_names), sorted(self.USER_NAMES))
+        spotify_iface.get_musics_from_links.assert_not_called()
+
+    def test_bump_version_rebuilds_view(self):
+        view = get_round_view(self.round)
+        bump_round_version(self.round.id)
+        self.assertIsNot(get_round_view(self.round), view)
+
+    def test_shuffle_bumps_version(self):
+        version = get_round_version(self.round.id)
+        view = get_round_view(self.round)
+
+        # Verify that the view is cached under the version given by the shuffle
+        self.assertNotEqual(get_round_version(self.round.id), version)
+        g.pop("round_views")
+        spotify_iface.get_musics_from_links.reset_mock()
+        self.assertEqual(get_round_view(self.round).shuffled_user_names, view.shuffled_user_names)
+        spotify_iface.get_musics_from_links.assert_not_called()
+
+    def test_shuffled_by_another_request(self):
+        """A request that shuffles a round that another request already
+        shuffled keeps the other request's shuffle
+        """
+        submissions = list(self.round.submissions)
+
+        # Another request shuffles the round after this one loaded it
+        with db.engine.begin() as conn:
+            for shuffled_pos, submission in enumerate(reversed(submissions)):
+                conn.execute(Submission.__table__.update().where(Submission.__table__.c.id == submission.id)
+                             .values(shuffled_pos=shuffled_pos))
+        self.assertIsNone(submissions[0].shuffled_pos)
+
+        version = get_round_version(self.round.id)
+        view = get_round_view(self.round)
+
+        self.assertEqual(view.shuffled_user_names, list(reversed(self.USER_NAMES)))
+        self.assertEqual(get_round_version(self.round.id), version)
+
+    def test_guess_resolves_music_once(self):
+        shuffled_user_names = get_shuffled_user_name_list(self.round)
+        spotify_iface.get_musics_from_links.reset_mock()
+
+        # Submit a correct guess
+        guess_field = "\n".join(f"{user_name}: {shuffled_user_names.index(user_name)}"
+                                for user_name in self.USER_NAMES)
+        response = self.client.post(
+            url_for('round.listen', long_id=self.round.long_id),
+            data=dict(name="John Doe", guess_field=guess_field, submit_guess="Submit"),
+            follow_redirects=False
+        )
+        self.assertRedirects(response, url_for('round.listen', long_id=self.round.long_id))
+
+        # Verify that the guesses are correct, and that the guess didn't
+        # resolve the round's music per submission
+        self.assertEqual(Guess.query.count(), len(self.USER_NAMES))
+        self.assertTrue(all(guess.correct for guess in Guess.query.all()))
+        self.assertLessEqual(spotify_iface.get_musics_from_links.call_count, 1)
+
+        # Verify that the guess invalidated the view
+        self.assertEqual(get_guesser_names(self.round), {"John Doe"})
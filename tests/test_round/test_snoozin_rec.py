@@ -0,0 +1,106 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from musicrecs import spotify_iface
+from musicrecs.enums import MusicType, RoundStatus, SnoozinRecType
+from musicrecs.errors.exceptions import MusicrecsAlert
+from musicrecs.database.helpers import add_round_to_db
+from musicrecs.database.models import Round
+from musicrecs.round.helpers import get_snoozin_rec
+from musicrecs.round.snoozin_rec_pool import snoozin_rec_pool
+from musicrecs.main.background_tasks import refill_snoozin_rec_pools
+
+from tests.test_round import RoundTestCase
+
+
+class SnoozinRandomRecTestCase(RoundTestCase):
+    """Test the concurrent search for snoozin's random recs"""
+    def setUp(self):
+        super().setUp()
+
+        self.round = add_round_to_db(
+            description="Trackrecs random round",
+            music_type=MusicType.track,
+            snoozin_rec_type=SnoozinRecType.random,
+            status=RoundStatus.submit
+        )
+
+        snoozin_rec_pool.clear()
+
+    def tearDown(self):
+        snoozin_rec_pool.clear()
+        super().tearDown()
+
+    def test_first_found_wins(self):
+        lock = threading.Lock()
+        search_terms = []
+
+        # Only the third search finds anything
+        def _mock_search_for_music(music_type, search_term, **kwargs):
+            with lock:
+                search_terms.append(search_term)
+                if len(search_terms) != 3:
+                    return []
+            return [self.make_dummy_music(music_type, "http://open.spotify.com/track/7GhIk7Il098yCjg4BQjzvb")]
+
+        spotify_iface.search_for_music = Mock(side_effect=_mock_search_for_music)
+
+        snoozin_rec = get_snoozin_rec(self.round)
+
+        # Verify that the rec and its search term were kept
+        self.assertEqual(snoozin_rec.link, "http://open.spotify.com/track/7GhIk7Il098yCjg4BQjzvb")
+        self.assertEqual(self.round.snoozin_rec_search_term, search_terms[2])
+
+    def test_search_timeout(self):
+        self.app.config["SNOOZIN_REC_SEARCH_TIMEOUT"] = 0.2
+
+        # Searches are slow and never find anything
+        def _mock_search_for_music(*args, **kwargs):
+            time.sleep(0.05)
+            return []
+
+        spotify_iface.search_for_music = Mock(side_effect=_mock_search_for_music)
+
+        start = time.monotonic()
+        self.assertRaises(MusicrecsAlert, get_snoozin_rec, self.round)
+
+        # Verify that searching gave up around the timeout, before running out of attempts
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertLess(spotify_iface.search_for_music.call_count, 50)
+
+    def test_rec_taken_from_pool(self):
+        # Fill the pool with the background task
+        def _mock_search_for_music(music_type, search_term, **kwargs):
+            return [self.make_dummy_music(music_type, f"http://open.spotify.com/track/{search_term}")]
+
+        spotify_iface.search_for_music = Mock(side_effect=_mock_search_for_music)
+
+        round_id = self.round.id
+        refill_snoozin_rec_pools()
+        self.assertEqual(snoozin_rec_pool.count(MusicType.track), snoozin_rec_pool.size)
+        self.assertEqual(snoozin_rec_pool.count(MusicType.album), snoozin_rec_pool.size)
+
+        # Verify that the rec comes from the pool without searching (the round
+        # is looked up again since the task ended the db session)
+        spotify_iface.search_for_music.reset_mock()
+        round = Round.query.get(round_id)
+        snoozin_rec = get_snoozin_rec(round)
+
+        spotify_iface.search_for_music.assert_not_called()
+        self.assertEqual(snoozin_rec.link, f"http://open.spotify.com/track/{round.snoozin_rec_search_term}")
+        self.assertEqual(snoozin_rec_pool.count(MusicType.track), snoozin_rec_pool.size - 1)
+
+        # Verify that the pool isn't refilled until it's below the low watermark
+        refill_snoozin_rec_pools()
+        spotify_iface.search_for_music.assert_not_called()
+
+    def test_expired_recs_not_used(self):
+        snoozin_rec_pool.add(
+            MusicType.track,
+            self.make_dummy_music(MusicType.track, "http://open.spotify.com/track/6rqhFgbbKwnb9MLmUQDhG6"),
+            "old search"
+        )
+        snoozin_rec_pool.timeout = 0
+
+        self.assertIsNone(snoozin_rec_pool.pop(MusicType.track))
@@ -0,0 +1,47 @@
+import os
+import time
+from contextlib import contextmanager
+from unittest.mock import Mock, patch
+
+from flask import session
+
+from musicrecs.spotify import spotify_user
+from musicrecs.spotify.spotify import Spotify
+
+from tests import MusicrecsTestCase, fake_spotify_album, fake_spotify_track
+
+
+# Spotify app settings, for making user auth managers
+SPOTIPY_ENVIRON = dict(SPOTIPY_CLIENT_ID="id", SPOTIPY_CLIENT_SECRET="secret",
+                       SPOTIPY_REDIRECT_URI="http://localhost/callback")
+
+
+def fake_token_info(access_token="access", expires_in=3600):
+    return dict(access_token=access_token, refresh_token="refresh", scope=spotify_user.SCOPE,
+                expires_in=expires_in, expires_at=int(time.time()) + expires_in, token_type="Bearer")
+
+
+class SpotifyTestCase(MusicrecsTestCase):
+    def make_spotify_iface(self):
+        """Make a client credentials spotify interface whose spotipy
+        instance is mocked to return fake albums and tracks
+        """
+        spotify_iface = Spotify()
+        spotify_iface.sp = Mock()
+        spotify_iface.sp.album = Mock(side_effect=lambda link: fake_spotify_album(link.split("/")[-1]))
+        spotify_iface.sp.track = Mock(side_effect=lambda link: fake_spotify_track(link.split("/")[-1]))
+        spotify_iface.sp.albums = Mock(
+            side_effect=lambda ids: {"albums": [fake_spotify_album(album_id) for album_id in ids]})
+        spotify_iface.sp.tracks = Mock(
+            side_effect=lambda ids: {"tracks": [fake_spotify_track(track_id) for track_id in ids]})
+
+        return spotify_iface
+
+    @contextmanager
+    def user_request_context(self, session_id):
+        """Make a request context for the session with the id, in which
+        spotify user auth managers can be made
+        """
+        with self.app.test_request_context(), patch.dict(os.environ, SPOTIPY_ENVIRON):
+            session["uuid"] = session_id
+            yield
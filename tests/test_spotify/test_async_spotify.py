@@ -0,0 +1,62 @@
+import threading
+import time
+
+from musicrecs.enums import MusicType
+from musicrecs.spotify.async_spotify import AsyncSpotify
+from musicrecs.spotify.spotify import MAX_ALBUMS_PER_REQUEST
+
+from tests.test_spotify import SpotifyTestCase
+
+
+ALBUM_LINK_PREFIX = "https://open.spotify.com/album/"
+
+
+class AsyncSpotifyTestCase(SpotifyTestCase):
+    """Test that the asyncio spotify interface makes its calls at the
+    same time, in bounded numbers, and keeps the results in order.
+    """
+    def setUp(self):
+        super().setUp()
+        self.async_spotify_iface = AsyncSpotify(self.make_spotify_iface(), max_concurrency=4)
+
+    def tearDown(self):
+        self.async_spotify_iface.shutdown()
+        super().tearDown()
+
+    def test_get_musics_from_links(self):
+        links = [ALBUM_LINK_PREFIX + f"{i:022d}" for i in range(MAX_ALBUMS_PER_REQUEST * 2 + 1)]
+
+        albums = self.async_spotify_iface.run(
+            self.async_spotify_iface.get_musics_from_links(MusicType.album, links))
+
+        # Verify that the albums are in order, and were requested in batches
+        self.assertEqual([album.id for album in albums], [link.split("/")[-1] for link in links])
+        self.assertEqual(self.async_spotify_iface.spotify.sp.albums.call_count, 3)
+
+    def test_calls_are_concurrent(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def call():
+            # Only returns once all three calls are in flight at the same time
+            return barrier.wait()
+
+        results = self.async_spotify_iface.run(self.async_spotify_iface.gather([call] * 3))
+
+        self.assertEqual(sorted(results), [0, 1, 2])
+
+    def test_call_site_max_concurrency(self):
+        lock = threading.Lock()
+        in_flight = []
+        max_in_flight = []
+
+        def call():
+            with lock:
+                in_flight.append(None)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.pop()
+
+        self.async_spotify_iface.run(self.async_spotify_iface.gather([call] * 10, max_concurrency=2))
+
+        self.assertEqual(max(max_in_flight), 2)
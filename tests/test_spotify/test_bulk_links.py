@@ -0,0 +1,66 @@
+from unittest.mock import Mock
+
+from spotipy.exceptions import SpotifyException
+
+from musicrecs.enums import MusicType
+
+from tests import fake_spotify_track
+from tests.test_spotify import SpotifyTestCase
+
+
+def _track_link(i):
+    return f"https://open.spotify.com/track/{i:022d}"
+
+
+class BulkLinksTestCase(SpotifyTestCase):
+    """Test resolving lists of links with spotify's multi-get endpoints"""
+    def test_batches_preserve_order(self):
+        spotify_iface = self.make_spotify_iface()
+        links = [_track_link(i) for i in range(60)]
+
+        tracks = spotify_iface.get_musics_from_links(MusicType.track, links)
+
+        # Verify that 60 tracks took two requests, and came back in order
+        self.assertEqual(spotify_iface.sp.tracks.call_count, 2)
+        self.assertEqual([track.link for track in tracks], links)
+
+    def test_albums_batch_size(self):
+        spotify_iface = self.make_spotify_iface()
+        links = [f"https://open.spotify.com/album/{i:022d}" for i in range(21)]
+
+        albums = spotify_iface.get_musics_from_links(MusicType.album, links)
+
+        self.assertEqual(spotify_iface.sp.albums.call_count, 2)
+        self.assertEqual([album.link for album in albums], links)
+
+    def test_cached_music_not_requested(self):
+        spotify_iface = self.make_spotify_iface()
+        spotify_iface.get_music_from_link(MusicType.track, _track_link(1))
+
+        spotify_iface.get_musics_from_links(MusicType.track, [_track_link(0), _track_link(1), _track_link(0)])
+
+        # Verify that only the uncached track was requested, and only once
+        spotify_iface.sp.tracks.assert_called_once_with([_track_link(0).split("/")[-1]])
+
+    def test_failures_reported_per_link(self):
+        spotify_iface = self.make_spotify_iface()
+
+        # Spotify rejects the whole batch because of one bad id
+        bad_id = "0000000000000000000bad"
+
+        def _mock_track(track_id):
+            if track_id in (bad_id, "not a link"):
+                raise SpotifyException(400, -1, "invalid id")
+            return fake_spotify_track(track_id)
+
+        spotify_iface.sp.tracks = Mock(side_effect=SpotifyException(400, -1, "invalid id"))
+        spotify_iface.sp.track = Mock(side_effect=_mock_track)
+
+        links = [_track_link(0), f"https://open.spotify.com/track/{bad_id}", "not a link", _track_link(1)]
+        tracks = spotify_iface.get_musics_from_links(MusicType.track, links)
+
+        # Verify that only the bad links failed
+        self.assertEqual(tracks[0].link, _track_link(0))
+        self.assertIsNone(tracks[1])
+        self.assertIsNone(tracks[2])
+        self.assertEqual(tracks[3].link, _track_link(1))
@@ -0,0 +1,61 @@
+from unittest import mock
+
+from musicrecs.spotify import spotify_user
+from musicrecs.spotify.item.spotify_music import SpotifyTrack
+
+from tests import fake_spotify_track
+from tests.test_spotify import SpotifyTestCase
+
+
+PLAYLIST_ID = "32O0SSXDNWDrMievPkV0Im"
+
+# The test cases mock the playlist being created, so keep the real function
+spotify_user_create_playlist = spotify_user.create_playlist
+
+
+class CreatePlaylistTestCase(SpotifyTestCase):
+    """Test that a playlist is created with as few calls as possible, with
+    its tracks added in order, however many there are
+    """
+    def setUp(self):
+        super().setUp()
+        self.sp = mock.Mock()
+        self.sp.me.return_value = {"id": self.DUMMY_USER_SP_ID}
+        self.sp.user_playlist_create.side_effect = lambda user, name: {
+            "id": PLAYLIST_ID, "name": name, "images": [],
+            "external_urls": {"spotify": f"https://open.spotify.com/playlist/{PLAYLIST_ID}"}}
+
+    def test_few_tracks(self):
+        tracks = self._make_tracks(12)
+
+        playlist = self._create_playlist("round playlist", tracks, spotify_user_id=self.DUMMY_USER_SP_ID)
+
+        self.assertEqual((playlist.id, playlist.name), (PLAYLIST_ID, "round playlist"))
+        self.sp.me.assert_not_called()
+        self.sp.user_playlist_create.assert_called_once_with(self.DUMMY_USER_SP_ID, "round playlist")
+        self.sp.playlist_add_items.assert_called_once_with(PLAYLIST_ID, [track.id for track in tracks])
+        self.sp.current_user_playlists.assert_not_called()
+
+    def test_many_tracks(self):
+        tracks = self._make_tracks(250)
+
+        self._create_playlist("big round playlist", tracks)
+
+        self.sp.me.assert_called_once()
+        self.assertEqual([call.args for call in self.sp.playlist_add_items.call_args_list], [
+            (PLAYLIST_ID, [track.id for track in tracks[:100]]),
+            (PLAYLIST_ID, [track.id for track in tracks[100:200]]),
+            (PLAYLIST_ID, [track.id for track in tracks[200:]]),
+        ])
+
+    def test_no_tracks(self):
+        self._create_playlist("empty playlist", [], spotify_user_id=self.DUMMY_USER_SP_ID)
+
+        self.sp.playlist_add_items.assert_not_called()
+
+    def _create_playlist(self, *args, **kwargs):
+        with mock.patch.object(spotify_user, "_get_sp_instance", return_value=self.sp):
+            return spotify_user_create_playlist(*args, **kwargs)
+
+    def _make_tracks(self, num_tracks):
+        return [SpotifyTrack(fake_spotify_track(f"track{i}")) for i in range(num_tracks)]
@@ -0,0 +1,106 @@
+import threading
+
+from cachelib import SimpleCache
+
+from musicrecs.enums import MusicType
+
+from tests.test_spotify import SpotifyTestCase
+
+
+ALBUM_LINK = "https://open.spotify.com/album/3a0UOgDWw2pTajw85QPMiz"
+TRACK_LINK = "http://open.spotify.com/track/6rqhFgbbKwnb9MLmUQDhG6?si=abc123"
+
+
+class MusicCacheTestCase(SpotifyTestCase):
+    """Test that music resolved from spotify links is cached
+    in the local and shared tiers of the music cache.
+    """
+    def test_local_cache_hit(self):
+        spotify_iface = self.make_spotify_iface()
+
+        # Resolve the same links a few times
+        for _ in range(3):
+            album = spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+            track = spotify_iface.get_music_from_link(MusicType.track, TRACK_LINK)
+
+        # Verify that spotify was only asked once per link
+        self.assertEqual(spotify_iface.sp.album.call_count, 1)
+        self.assertEqual(spotify_iface.sp.track.call_count, 1)
+        self.assertEqual(album.id, "3a0UOgDWw2pTajw85QPMiz")
+        self.assertEqual(track.id, "6rqhFgbbKwnb9MLmUQDhG6")
+        self.assertEqual(spotify_iface.get_music_cache_stats()["hits"], 4)
+
+    def test_shared_cache_hit(self):
+        shared_cache = SimpleCache()
+
+        # Resolve a link with one interface to fill the shared cache
+        spotify_iface = self.make_spotify_iface()
+        spotify_iface.init_music_cache(shared_cache=shared_cache)
+        spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+
+        # Verify that another interface (another process) gets it from the shared cache
+        other_spotify_iface = self.make_spotify_iface()
+        other_spotify_iface.init_music_cache(shared_cache=shared_cache)
+        album = other_spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+
+        self.assertEqual(album.id, "3a0UOgDWw2pTajw85QPMiz")
+        self.assertEqual(other_spotify_iface.sp.album.call_count, 0)
+        self.assertEqual(other_spotify_iface.get_music_cache_stats()["shared_hits"], 1)
+
+    def test_shared_cache_stats_threads(self):
+        shared_cache = SimpleCache()
+        spotify_iface = self.make_spotify_iface()
+        spotify_iface.init_music_cache(shared_cache=shared_cache, size=1)
+        spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+        spotify_iface.get_music_from_link(MusicType.track, TRACK_LINK)
+
+        # Look the links up from several threads at once, missing the
+        # (one entry) local cache and hitting the shared one every time
+        def get_music():
+            for _ in range(200):
+                spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+                spotify_iface.get_music_from_link(MusicType.track, TRACK_LINK)
+
+        threads = [threading.Thread(target=get_music) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = spotify_iface.get_music_cache_stats()
+        self.assertEqual(stats["shared_misses"], 2)
+        self.assertEqual(stats["hits"] + stats["shared_hits"], 8 * 200 * 2)
+
+    def test_eviction(self):
+        spotify_iface = self.make_spotify_iface()
+        spotify_iface.init_music_cache(size=1)
+
+        spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+        spotify_iface.get_music_from_link(MusicType.track, TRACK_LINK)
+        spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+
+        # Verify that the album had to be re-requested after being evicted
+        self.assertEqual(spotify_iface.sp.album.call_count, 2)
+        self.assertEqual(spotify_iface.get_music_cache_stats()["evictions"], 2)
+
+    def test_invalidate(self):
+        shared_cache = SimpleCache()
+        spotify_iface = self.make_spotify_iface()
+        spotify_iface.init_music_cache(shared_cache=shared_cache)
+
+        spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+        spotify_iface.invalidate_music(MusicType.album, ALBUM_LINK)
+        spotify_iface.get_music_from_link(MusicType.album, ALBUM_LINK)
+
+        self.assertEqual(spotify_iface.sp.album.call_count, 2)
+
+    def test_mismatched_link_not_cached(self):
+        """A track link in an album round is passed through to spotify
+        (which rejects it), rather than being looked up in the cache
+        """
+        spotify_iface = self.make_spotify_iface()
+
+        spotify_iface.get_music_from_link(MusicType.track, TRACK_LINK)
+        spotify_iface.get_music_from_link(MusicType.album, TRACK_LINK)
+
+        spotify_iface.sp.album.assert_called_once_with(TRACK_LINK)
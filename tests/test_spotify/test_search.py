@@ -0,0 +1,53 @@
+from unittest.mock import Mock
+
+from musicrecs.enums import MusicType
+
+from tests import fake_spotify_album
+from tests.test_spotify import SpotifyTestCase
+
+
+def _fake_artist(artist_id, popularity):
+    return {
+        "name": f"Artist {artist_id}",
+        "id": artist_id,
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+        "popularity": popularity
+    }
+
+
+class SearchTestCase(SpotifyTestCase):
+    """Test searching for music with a popularity threshold"""
+    ARTIST_POPULARITIES = {"popular": 80, "unpopular": 5, "middling": 40}
+
+    def setUp(self):
+        super().setUp()
+
+        self.spotify_iface = self.make_spotify_iface()
+
+        # Search results with a few albums, some sharing artists
+        album_artists = [["unpopular"], ["unpopular", "middling"], ["popular"], ["middling", "popular"]]
+        albums = []
+        for i, artist_ids in enumerate(album_artists):
+            album = fake_spotify_album(f"{i:022d}")
+            album["artists"] = [_fake_artist(artist_id, 0) for artist_id in artist_ids]
+            albums.append(album)
+
+        self.spotify_iface.sp.search = Mock(return_value={"albums": {"items": albums}})
+        self.spotify_iface.sp.artists = Mock(side_effect=lambda ids: {"artists": [
+            _fake_artist(artist_id, self.ARTIST_POPULARITIES[artist_id]) for artist_id in ids
+        ]})
+
+    def test_popularity_threshold(self):
+        albums = self.spotify_iface.search_for_music(MusicType.album, "some words", popularity_threshold=30)
+
+        # Verify that only albums with an artist above the threshold were kept
+        self.assertEqual([album.id for album in albums], [f"{i:022d}" for i in [1, 2, 3]])
+
+        # Verify that each artist's popularity was requested once, in one request
+        self.spotify_iface.sp.artists.assert_called_once_with(["unpopular", "middling", "popular"])
+
+    def test_popularity_cached(self):
+        self.spotify_iface.search_for_music(MusicType.album, "some words", popularity_threshold=30)
+        self.spotify_iface.search_for_music(MusicType.album, "other words", popularity_threshold=30)
+
+        self.assertEqual(self.spotify_iface.sp.artists.call_count, 1)
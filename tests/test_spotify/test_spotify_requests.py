@@ -0,0 +1,96 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import requests
+from spotipy.exceptions import SpotifyException
+
+from musicrecs.spotify.spotify_requests import SpotifyRequests, TokenBucket
+
+from tests import MusicrecsTestCase
+
+
+ALBUM_URL = "https://api.spotify.com/v1/albums/3a0UOgDWw2pTajw85QPMiz"
+
+
+def make_response(status_code=200, headers=None):
+    response = Mock(spec=requests.Response)
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.content = b"{}"
+    return response
+
+
+class TokenBucketTestCase(MusicrecsTestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=100, burst=2)
+
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+
+        # Two tokens were in the bucket, the other two took 1/100s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.015)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=100, burst=2)
+        bucket.pause(60)
+
+        self.assertFalse(bucket.acquire(max_wait=1))
+        self.assertGreater(bucket.paused_for(), 59)
+
+
+class SpotifyRequestsTestCase(MusicrecsTestCase):
+    """Test the request layer shared by the spotipy instances"""
+    def test_retry_after(self):
+        spotify_requests = SpotifyRequests()
+        responses = [make_response(429, {"Retry-After": "0.05"}), make_response()]
+
+        with patch.object(requests.Session, "request", side_effect=responses) as request:
+            start = time.monotonic()
+            response = spotify_requests.request("GET", ALBUM_URL)
+
+        # Verify that the request was retried once the Retry-After had passed
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(request.call_count, 2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(spotify_requests.stats()["rate_limited"], 1)
+
+    def test_rate_limited_past_max_wait(self):
+        spotify_requests = SpotifyRequests(max_wait=1)
+
+        with patch.object(requests.Session, "request", return_value=make_response(429, {"Retry-After": "60"})):
+            with self.assertRaises(SpotifyException) as cm:
+                spotify_requests.request("GET", ALBUM_URL)
+
+        self.assertEqual(cm.exception.http_status, 429)
+
+    def test_single_flight(self):
+        spotify_requests = SpotifyRequests()
+        release = threading.Event()
+
+        def slow_request(*args, **kwargs):
+            release.wait(5)
+            return make_response()
+
+        with patch.object(requests.Session, "request", side_effect=slow_request) as request:
+            # Make the same request from several threads at once
+            responses = []
+            threads = [
+                threading.Thread(target=lambda: responses.append(spotify_requests.request("GET", ALBUM_URL)))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+
+            # Let the request finish once the others are waiting on it
+            while spotify_requests.stats()["coalesced"] < 4:
+                time.sleep(0.001)
+            release.set()
+
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(len(responses), 5)
+        self.assertTrue(all(response is responses[0] for response in responses))
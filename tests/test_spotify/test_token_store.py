@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from flask import session
+from sqlalchemy import event
+
+from musicrecs import db
+from musicrecs.database.helpers import add_round_to_db
+from musicrecs.database.models import Round, SpotifyToken
+from musicrecs.enums import MusicType, SnoozinRecType
+from musicrecs.database.spotify_tokens import SpotifyTokenTable
+from musicrecs.file_storage import sharded_path
+from musicrecs.spotify import spotify_user
+from musicrecs.spotify.token_store import SpotifyTokenStore, token_store
+
+from tests.test_spotify import SpotifyTestCase, fake_token_info
+
+
+SESSION_ID = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
+
+class TokenStoreTestCase(SpotifyTestCase):
+    """Test that spotify user tokens are kept in the database, and read
+    from memory once they've been read (or saved) by a process
+    """
+    def setUp(self):
+        super().setUp()
+        self.queries = []
+        event.listen(db.engine, "before_cursor_execute", self._count_query)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self._count_query)
+        super().tearDown()
+
+    def test_memory_hit(self):
+        store = self._make_store()
+        store.set(SESSION_ID, fake_token_info())
+
+        del self.queries[:]
+        for _ in range(3):
+            self.assertEqual(store.get(SESSION_ID)["access_token"], "access")
+
+        self.assertEqual(self.queries, [])
+        self.assertEqual(store.stats()["hits"], 3)
+
+    def test_shared_between_stores(self):
+        self._make_store().set(SESSION_ID, fake_token_info())
+
+        # Another process finds the token in the database
+        other_store = self._make_store()
+        self.assertEqual(other_store.get(SESSION_ID)["access_token"], "access")
+
+        # And sees it when it's refreshed (once it's not in memory any more)
+        self._make_store().set(SESSION_ID, fake_token_info("refreshed"))
+        self.assertEqual(self._make_store().get(SESSION_ID)["access_token"], "refreshed")
+        self.assertEqual(SpotifyToken.query.count(), 1)
+
+    def test_delete(self):
+        store = self._make_store()
+        store.set(SESSION_ID, fake_token_info())
+
+        del self.queries[:]
+        store.delete(SESSION_ID)
+
+        self.assertEqual(len(self.queries), 1)
+        self.assertIsNone(store.get(SESSION_ID))
+        self.assertIsNone(self._make_store().get(SESSION_ID))
+
+    def test_request_changes_left_alone(self):
+        """Saving or deleting a token in the middle of a request doesn't
+        commit (or throw away) the request's own changes
+        """
+        round = add_round_to_db(
+            description="Albumrecs random round",
+            music_type=MusicType.album,
+            snoozin_rec_type=SnoozinRecType.random,
+        )
+        round.description = "Changed description"
+
+        store = self._make_store()
+        store.set(SESSION_ID, fake_token_info())
+        store.set(SESSION_ID, fake_token_info("refreshed"))
+        self.assertIn(round, db.session.dirty)
+
+        store.delete(SESSION_ID)
+        self.assertIn(round, db.session.dirty)
+
+        db.session.rollback()
+        self.assertEqual(Round.query.first().description, "Albumrecs random round")
+
+    def test_refreshed_token_saved(self):
+        token_store.set(SESSION_ID, fake_token_info(expires_in=-60))
+
+        with self.user_request_context(SESSION_ID):
+            auth_manager = spotify_user._get_auth_manager()
+            with mock.patch.object(auth_manager._session, "post") as mock_post:
+                mock_post.return_value.status_code = 200
+                mock_post.return_value.json.return_value = dict(
+                    access_token="refreshed", scope=spotify_user.SCOPE, expires_in=3600, token_type="Bearer")
+
+                self.assertEqual(auth_manager.get_cached_token()["access_token"], "refreshed")
+
+        self.assertEqual(json.loads(SpotifyTokenTable().get(SESSION_ID))["access_token"], "refreshed")
+        self.assertEqual(token_store.get(SESSION_ID)["refresh_token"], "refresh")
+
+    def test_token_file_imported(self):
+        with tempfile.TemporaryDirectory() as cache_folder, \
+                mock.patch.object(spotify_user, "CACHE_FOLDER", cache_folder), \
+                self.app.test_request_context():
+            cache_path = sharded_path(cache_folder, SESSION_ID)
+            os.makedirs(os.path.dirname(cache_path))
+            with open(cache_path, "w") as f:
+                json.dump(fake_token_info(), f)
+
+            session["uuid"] = SESSION_ID
+            self.assertEqual(spotify_user._read_cached_token()["access_token"], "access")
+
+            self.assertFalse(os.path.exists(cache_path))
+            self.assertEqual(json.loads(SpotifyTokenTable().get(SESSION_ID))["access_token"], "access")
+
+    def test_no_session_id(self):
+        with self.app.test_request_context():
+            self.assertIsNone(spotify_user._read_cached_token())
+            self.assertNotIn("uuid", session)
+
+        self.assertEqual(self.queries, [])
+
+    def _make_store(self):
+        store = SpotifyTokenStore()
+        store.init_app(self.app, SpotifyTokenTable())
+        return store
+
+    def _count_query(self, *args):
+        self.queries.append(args[2])
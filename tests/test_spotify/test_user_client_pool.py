@@ -0,0 +1,74 @@
+from unittest import mock
+
+from spotipy.oauth2 import SpotifyOauthError
+
+from musicrecs.spotify import spotify_user
+from musicrecs.spotify.token_store import token_store
+from musicrecs.spotify.user_client_pool import user_client_pool
+
+from tests.test_spotify import SpotifyTestCase, fake_token_info
+
+
+SESSION_ID = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
+# The test cases mock the user logging out, so keep the real logout
+spotify_user_logout = spotify_user.logout
+
+
+class UserClientPoolTestCase(SpotifyTestCase):
+    """Test that logged in users' spotipy instances are reused, and that
+    their tokens are refreshed before they expire
+    """
+    def test_instance_reused(self):
+        token_store.set(SESSION_ID, fake_token_info())
+
+        with self.user_request_context(SESSION_ID):
+            sp = spotify_user._get_sp_instance()
+        with self.user_request_context(SESSION_ID):
+            self.assertIs(spotify_user._get_sp_instance(), sp)
+
+        self.assertEqual(user_client_pool.stats()["size"], 1)
+
+    def test_logout(self):
+        token_store.set(SESSION_ID, fake_token_info())
+
+        with self.user_request_context(SESSION_ID):
+            spotify_user._get_sp_instance()
+            spotify_user_logout()
+
+            self.assertIsNone(user_client_pool.get(SESSION_ID))
+            with self.assertRaises(spotify_user.SpotifyUserAuthFailure):
+                spotify_user._get_sp_instance()
+
+    def test_refresh_expiring_tokens(self):
+        token_store.set(SESSION_ID, fake_token_info(expires_in=60))
+        token_store.set("fresh", fake_token_info(expires_in=3600))
+        for session_id in [SESSION_ID, "fresh"]:
+            with self.user_request_context(session_id):
+                spotify_user._get_sp_instance()
+
+        with mock.patch("spotipy.oauth2.SpotifyOAuth.refresh_access_token",
+                        autospec=True, side_effect=self._refresh_access_token) as mock_refresh:
+            num_refreshed = spotify_user.refresh_expiring_tokens(margin=300)
+
+        self.assertEqual(num_refreshed, 1)
+        self.assertEqual(mock_refresh.call_count, 1)
+        self.assertEqual(token_store.get(SESSION_ID)["access_token"], "refreshed")
+        self.assertEqual(token_store.get("fresh")["access_token"], "access")
+
+    def test_revoked_token_discarded(self):
+        token_store.set(SESSION_ID, fake_token_info(expires_in=60))
+        with self.user_request_context(SESSION_ID):
+            spotify_user._get_sp_instance()
+
+        with mock.patch("spotipy.oauth2.SpotifyOAuth.refresh_access_token",
+                        side_effect=SpotifyOauthError("invalid_grant")):
+            self.assertEqual(spotify_user.refresh_expiring_tokens(margin=300), 0)
+
+        self.assertIsNone(user_client_pool.get(SESSION_ID))
+
+    @staticmethod
+    def _refresh_access_token(auth_manager, refresh_token):
+        token_info = fake_token_info("refreshed")
+        auth_manager._save_token_info(token_info)
+        return token_info
@@ -0,0 +1,73 @@
+import threading
+from unittest import mock
+
+from musicrecs.spotify import spotify_user
+
+from tests.test_spotify import SpotifyTestCase
+
+
+NUM_PLAYLISTS = 180
+
+
+class UserPlaylistsTestCase(SpotifyTestCase):
+    """Test that the user's playlists are yielded in order, whether the
+    pages are fetched one after another or at the same time
+    """
+    def setUp(self):
+        super().setUp()
+        self.playlists = [{"id": str(i)} for i in range(NUM_PLAYLISTS)]
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        self.sp = mock.Mock()
+        self.sp.current_user_playlists = mock.Mock(side_effect=self._current_user_playlists)
+        self.sp.next = mock.Mock(side_effect=lambda page: self._current_user_playlists(page["limit"], page["next"]))
+        self.sp.auth_manager.get_cached_token.return_value = {"access_token": "access"}
+
+    def test_serial(self):
+        with mock.patch.object(spotify_user, "_get_sp_instance", return_value=self.sp):
+            playlists = spotify_user.get_user_playlists()
+
+            # Nothing is fetched until the playlists are asked for
+            self.sp.current_user_playlists.assert_not_called()
+
+            self.assertEqual(list(playlists), self.playlists)
+
+        self.assertEqual(self.sp.next.call_count, 3)
+
+    def test_concurrent(self):
+        with mock.patch.object(spotify_user, "_get_sp_instance", return_value=self.sp), \
+                mock.patch.object(spotify_user.spotipy, "Spotify", return_value=self.sp):
+            playlists = list(spotify_user.get_user_playlists(max_concurrency=2))
+
+        self.assertEqual(playlists, self.playlists)
+        self.assertEqual(self.sp.current_user_playlists.call_count, 4)
+        self.assertLessEqual(self.max_in_flight, 2)
+
+    def test_stop_early(self):
+        with mock.patch.object(spotify_user, "_get_sp_instance", return_value=self.sp), \
+                mock.patch.object(spotify_user.spotipy, "Spotify", return_value=self.sp):
+            playlists = spotify_user.get_user_playlists(max_concurrency=2)
+            first_playlists = [next(playlists) for _ in range(60)]
+            playlists.close()
+
+        self.assertEqual(first_playlists, self.playlists[:60])
+        self.assertLess(self.sp.current_user_playlists.call_count, 4)
+
+    def _current_user_playlists(self, limit=50, offset=0):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            next_offset = offset + limit
+            return {
+                "items": self.playlists[offset:next_offset],
+                "limit": limit,
+                "next": next_offset if next_offset < NUM_PLAYLISTS else None,
+                "total": NUM_PLAYLISTS,
+            }
+        finally:
+            with self.lock:
+                self.in_flight -= 1
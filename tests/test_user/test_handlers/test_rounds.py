@@ -1,7 +1,13 @@
+import re
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+
 from flask import url_for
 
+from musicrecs import db
 from musicrecs.database.helpers import add_round_to_db, add_submission_to_db, add_user_to_db
 from musicrecs.enums import MusicType, SnoozinRecType
+from musicrecs.user.handlers import ROUNDS_PAGE_SIZE
 
 from tests.test_user import UserTestCase
 
@@ -72,3 +78,38 @@ class UserRoundsTestCase(UserTestCase):
         self.assert_200(response)
         self.assertIn(bytes('Your albumrecs', 'utf-8'), response.data)
         self.assertEqual(response.data.count(bytes("user_round_block", 'utf-8')), 2)
+
+    def test_get_user_rounds_pages(self):
+        # Add a fake user to the database
+        add_user_to_db(self.DUMMY_USER_SP_ID, self.DUMMY_USER_DISPLAY_NAME)
+
+        # Mock authentication of the fake user
+        self.auth_dummy_user()
+
+        # Add more than a page of rounds with submissions from the dummy user,
+        # with pairs of rounds created at the same time
+        num_rounds = ROUNDS_PAGE_SIZE + 5
+        created = datetime(2021, 1, 1)
+        for i in range(num_rounds):
+            round = add_round_to_db(
+                description=f"Round {i}",
+                music_type=MusicType.album,
+                snoozin_rec_type=SnoozinRecType.random,
+            )
+            round.created = created + timedelta(days=i // 2)
+            add_submission_to_db(round.id, 1, "Nick Jones", f"https://open.spotify.com/album/{i:022d}")
+        db.session.commit()
+
+        # Follow the pages of rounds
+        descriptions = []
+        query_string = {'music_type': 'album'}
+        while query_string:
+            response = self.client.get(url_for('user.rounds'), query_string=query_string)
+            self.assert_200(response)
+            descriptions.extend(re.findall(r'Round \d+', response.data.decode()))
+
+            next_page = re.search(r'before=([^"&]+)', response.data.decode())
+            query_string = {'music_type': 'album', 'before': unquote(next_page.group(1))} if next_page else None
+
+        # Verify that every round is shown once, newest first
+        self.assertEqual(descriptions, [f"Round {i}" for i in reversed(range(num_rounds))])
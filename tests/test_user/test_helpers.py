@@ -0,0 +1,57 @@
+from flask import url_for
+
+import musicrecs.spotify.spotify_user as sp_user
+from musicrecs.database.helpers import add_user_to_db
+
+from tests.test_user import UserTestCase
+
+
+class UserIdentityTestCase(UserTestCase):
+    """Test that spotify is only asked who the logged in user is once,
+    rather than on every page, until their authorization changes or
+    the cached identity expires
+    """
+    def setUp(self):
+        super().setUp()
+
+        add_user_to_db(self.DUMMY_USER_SP_ID, self.DUMMY_USER_DISPLAY_NAME)
+        self.auth_dummy_user()
+
+    def test_identity_cached(self):
+        for _ in range(3):
+            response = self.client.get(url_for('main.index'))
+            self.assert_200(response)
+            self.assertIn(bytes(self.DUMMY_USER_DISPLAY_NAME, 'utf-8'), response.data)
+
+        self.assertEqual(sp_user.get_user_id.call_count, 1)
+
+    def test_authorization_changed(self):
+        self.client.get(url_for('main.index'))
+
+        # Log in as someone else
+        add_user_to_db("67890DEF", "Someone Else")
+        sp_user.get_user_id.side_effect = lambda *args: "67890DEF"
+        sp_user.get_token_fingerprint.side_effect = lambda *args: "someone_elses_token_fingerprint"
+
+        response = self.client.get(url_for('main.index'))
+        self.assertIn(b"Someone Else", response.data)
+        self.assertEqual(sp_user.get_user_id.call_count, 2)
+
+    def test_identity_expired(self):
+        self.app.config["USER_IDENTITY_TTL"] = 0
+
+        self.client.get(url_for('main.index'))
+        self.client.get(url_for('main.index'))
+
+        self.assertEqual(sp_user.get_user_id.call_count, 2)
+
+    def test_authorization_failed(self):
+        """A user whose authorization fails (e.g. it's missing a scope) can
+        still see the pages that don't need them to be logged in
+        """
+        sp_user.get_user_id.side_effect = sp_user.SpotifyUserAuthFailure("https://accounts.spotify.com/authorize")
+
+        response = self.client.get(url_for('main.index'))
+
+        self.assert_200(response)
+        self.assertNotIn(bytes(self.DUMMY_USER_DISPLAY_NAME, 'utf-8'), response.data)